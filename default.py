@@ -50,12 +50,23 @@ class Service(xbmc.Player):
         self.monitor = xbmc.Monitor()
         self.abortRequested = False
         self.lgtv = LGTV(KodiKeyManager(), log=tools.simpleLog)
+        # encoded once, toasts reuse it
+        success, self.icon_kodi = self.lgtv.register_icon(__IconKodi__)
+        if not success:
+            tools.notifyLog("Could not load toast icon: %s" % self.icon_kodi, level=xbmc.LOGWARNING)
+            self.icon_kodi = None
 
         self.isPlaying3D = None
         self.mode3D = Display3dMode.OFF
 
         self.readSettings()
 
+        if not self.abortRequested and self.lg_host is not None:
+            # connect as soon as the TV is switched on (again), also if
+            # it could not be connected to above
+            if not self.lgtv.start_listening(self.lg_host, __addonname__):
+                tools.notifyLog("Not listening for the TV coming online", level=xbmc.LOGWARNING)
+
     def readSettings(self):
         self.lg_host = __addon__.getSetting('lg_host')
         self.lg_host = None if self.lg_host == '' else self.lg_host
@@ -65,6 +76,8 @@ class Service(xbmc.Player):
         self.switch_on_pause = __addon__.getSetting('lg_switch_on_pause') == 'true'
         self.switch_on_resume = __addon__.getSetting('lg_switch_on_resume') == 'true'
         self.pause_while_switching = __addon__.getSetting('lg_pause_while_switching') == 'true'
+        self.lgtv.planner.menu_from_3D = __addon__.getSetting('lg_menu_from_3d') == 'true'
+        self.lgtv.planner.wrap_around = __addon__.getSetting('lg_menu_wrap_around') == 'true'
 
         host_was_empty = self.lg_host is None or self.force_discovery
         if host_was_empty and self.enable_discovery:
@@ -83,36 +96,47 @@ class Service(xbmc.Player):
                 raise Exception("LGTV.connect() failed")
             tools.notifyLog("Connected to TV at %s" % self.lg_host)
             #tools.notifyOSD(__addonname__, __LS__(30102) % self.lg_host, icon=__IconConnected__)
-            self.lgtv.toast(__LS__(30103), icon_file=__IconKodi__)
+            self.lgtv.toast(__LS__(30103), icon=self.icon_kodi)
         except Exception as e:
             # try new discovery
             if not host_was_empty and self.enable_discovery:
                 # we didn't discover before
+                configured_host = self.lg_host
                 self.discover()
 
-                # try this newly discovered host
-                if self.lg_host is not None:
+                if self.lg_host == configured_host:
+                    # no other TV found, it is probably switched off
+                    self.connectFailed(e)
+                else:
+                    # try this newly discovered host
                     try:
                         success = self.lgtv.connect(self.lg_host, __addonname__)
                         if not success:
                             raise Exception("LGTV.connect() failed")
                         tools.notifyLog("Connected to TV at %s" % self.lg_host)
                         #tools.notifyOSD(__addonname__, __LS__(30102) % self.lg_host, icon=__IconConnected__)
-                        self.lgtv.toast(__LS__(30103), icon_file=__IconKodi__)
+                        self.lgtv.toast(__LS__(30103), icon=self.icon_kodi)
                     except Exception as e:
-                        tools.notifyLog("Could not connect to TV at %s: %s" % (self.lg_host, str(e)), level=xbmc.LOGERROR)
-                        tools.notifyOSD(__addonname__, __LS__(30100) % self.lg_host, icon=__IconError__)
-                        self.abortRequested = True
+                        self.connectFailed(e)
             else:
                 # host found via recovery could not be connected to
-                tools.notifyLog("Could not connect to TV at %s: %s" % (self.lg_host, str(e)), level=xbmc.LOGERROR)
-                tools.notifyOSD(__addonname__, __LS__(30100) % self.lg_host, icon=__IconError__)
-                self.abortRequested = True
+                self.connectFailed(e)
+
+    def connectFailed(self, e):
+        # the TV is probably switched off. Keep running, the listener
+        # connects as soon as it comes online.
+        tools.notifyLog("Could not connect to TV at %s: %s" % (self.lg_host, str(e)), level=xbmc.LOGERROR)
+        tools.notifyLog("Waiting for the TV at %s to come online" % self.lg_host)
+        tools.notifyOSD(__addonname__, __LS__(30100) % self.lg_host, icon=__IconError__)
 
 
     def discover(self):
-        # try to discover host
-        self.lg_host = self.lgtv.discover_ip(tries=5, timeout=3)
+        # try to discover host, preferring the configured one, which is
+        # kept if no TV is found
+        host = self.lgtv.discover_ip(tries=5, timeout=3, host=self.lg_host)
+        if host is None:
+            return
+        self.lg_host = host
         __addon__.setSetting('lg_host', self.lg_host)
 
 
@@ -185,12 +209,12 @@ class Service(xbmc.Player):
 
                     tools.notifyLog("Reconnected to TV at %s" % self.lg_host)
                     #tools.notifyOSD(__addonname__, __LS__(30102) % self.lg_host, icon=__IconConnected__)
-                    self.lgtv.toast(__LS__(30104), icon_file=__IconKodi__)
+                    self.lgtv.toast(__LS__(30104), icon=self.icon_kodi)
 
                 success, msg = self.lgtv.set_3D_Mode(self.mode3D)
                 if not success:
                     tools.notifyLog(msg)
-                    if not self.lgtv.toast(msg, icon_file=__IconKodi__):
+                    if not self.lgtv.toast(msg, icon=self.icon_kodi):
                         tools.notifyOSD(__addonname__, msg, icon=__IconError__)
             finally:
                 if auto_pause:
@@ -202,7 +226,7 @@ class Service(xbmc.Player):
 
         if mode == Display3dMode.ERROR:
             tools.notifyLog("Could not get current 3D mode")
-            if not self.lgtv.toast("Could not get current 3D mode", icon_file=__IconKodi__):
+            if not self.lgtv.toast("Could not get current 3D mode", icon=self.icon_kodi):
                 tools.notifyOSD(__addonname__, "Could not get current 3D mode", icon=__IconError__)
 
         if mode == self.mode3D:
@@ -214,7 +238,7 @@ class Service(xbmc.Player):
         success, msg = self.lgtv.set_3D_Mode(self.mode3D)
         if not success:
             tools.notifyLog(msg)
-            if not self.lgtv.toast(msg, icon_file=__IconKodi__):
+            if not self.lgtv.toast(msg, icon=self.icon_kodi):
                 tools.notifyOSD(__addonname__, msg, icon=__IconError__)
         if auto_pause:
             # resume
@@ -235,6 +259,7 @@ if __name__ == '__main__':
         # after 5 minutes)
         service.keepConnectionAlive()
 
+    service.lgtv.stop_listening()
     if service.lgtv.is_connected():
         service.lgtv.disable_3D()
 
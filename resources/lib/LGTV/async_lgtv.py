@@ -0,0 +1,685 @@
+################################################################################
+# BUILTIN MODULES
+################################################################################
+# Python 3 only, import this module only if asyncio is available.
+import asyncio
+import json
+import time
+
+################################################################################
+# SHIPPED MODULES
+################################################################################
+from . import websocket  # LGPL
+
+################################################################################
+# HELPER MODULES
+################################################################################
+from .enums import *
+from .lgtv import LGTVBase, DIRECT_3D_PROBE_TIMEOUT, MODE_POLL_INTERVAL
+from .state import StateCache
+
+################################################################################
+# ACTUAL CODE
+################################################################################
+
+class AsyncLGTV(LGTVBase):
+    # Same operations as LGTV, but everything talking to the TV is a
+    # coroutine. Many commands and TVs can be handled from one event loop,
+    # and e.g. a set_3D_Mode() task can be cancelled while it waits.
+    # Responses are received by a reader task and handed to the waiting
+    # requests by message id.
+
+    def __init__(self, *args, **kwargs):
+        LGTVBase.__init__(self, *args, **kwargs)
+        self.wsocket = None             # type: websocket.AsyncWebSocket
+        self.pointer_socket = None      # type: websocket.AsyncWebSocket
+        self._reader = None             # type: asyncio.Task
+        # set and replaced whenever the TV pushes a 3D status update
+        self._3D_Mode_changed = None    # type: asyncio.Event
+        # created in the event loop on first use
+        self._connect_lock = None       # type: asyncio.Lock
+        # task holding _connect_lock
+        self._connecting_task = None    # type: asyncio.Task
+        # runs the SSDP listener's callbacks, see start_listening()
+        self._loop = None               # type: asyncio.AbstractEventLoop
+
+    async def discover_ip(self, tries=5, timeout=3, host=None, probe_timeout=1.0, progress=None):
+        # type: (int, float, str, float, (int, int) -> bool) -> str
+        # probing and SSDP discovery block, run them in the default
+        # executor. progress is called in the executor thread.
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._discover_ip, tries, timeout, host, probe_timeout, progress)
+
+    async def discover_tvs(self, tries=5, timeout=3, stop_at=None, limit=None):
+        # type: (int, float, list, int) -> list
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._discover_tvs, tries, timeout, stop_at, limit)
+
+    async def sweep_tvs(self, timeout=0.5, concurrency=64, progress=None):
+        # type: (float, int, (int, int) -> bool) -> list
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._sweep_tvs, timeout, concurrency, progress)
+
+    async def connect(self, host, app_name="Python Remote", connect_input_pointer=True):
+        # type: (str) -> bool
+        if self._connecting_task is asyncio.current_task():
+            # reconnecting while connecting, asyncio.Lock is not reentrant
+            return await self._connect(host, app_name, connect_input_pointer)
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            self._connecting_task = asyncio.current_task()
+            try:
+                return await self._connect(host, app_name, connect_input_pointer)
+            finally:
+                self._connecting_task = None
+
+    async def _connect(self, host, app_name, connect_input_pointer):
+        # type: (str, str, bool) -> bool
+        if self.is_connected():
+            return True
+
+        await self._close_wsocket()
+        await self._disconnect_input_pointer()
+
+        host = self._begin_session(host)
+        if host is None:
+            return False
+        msg_id = self._next_msg_id()
+
+        self.wsocket = await websocket.create_async_connection(host, enable_compression=self.enable_compression)
+
+        pairing_request = self._prepare_pairing_request(host, msg_id, app_name)
+        await self.wsocket.send(pairing_request)
+
+        try:
+            received = await self.wsocket.recv()
+        except Exception as e:
+            self.log("Could not receive response after sending pairing request:", str(e))
+            return False
+        response = self._decode_pairing_response(received, msg_id, "received after sending pairing request")
+        if response is None:
+            return False
+
+        if 'pairingType' in response['payload']:
+            # not paired yet, next message will be pairing status
+            # so load another message
+            try:
+                received = await self.wsocket.recv()
+            except Exception as e:
+                self.log("Could not receive second message after sending pairing request:", str(e))
+                return False
+            response = self._decode_pairing_response(received, msg_id, "received as second message after sending pairing request")
+            if response is None:
+                return False
+
+        if not self._finish_pairing(host, response):
+            return False
+        self._start_reader()
+        if self._needs_mac(host):
+            await asyncio.get_event_loop().run_in_executor(None, self._record_mac, host)
+
+        if connect_input_pointer:
+            # finally connect to InputPointer socket
+            await self._connect_input_pointer()
+
+        return True
+
+    async def disconnect(self):
+        # type: () -> ()
+        await self._disconnect_input_pointer()
+
+        self.is_paired = False
+        await self._close_wsocket()
+
+    async def start_listening(self, host, app_name="Python Remote"):
+        # type: (str, str) -> bool
+        # see LGTV.start_listening, the TV is connected to in this event loop
+        self._loop = asyncio.get_event_loop()
+        return self._start_listener(host, app_name)
+
+    def _on_tv_alive(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # runs in the listener thread
+        if self._is_announced_tv(tv):
+            asyncio.run_coroutine_threadsafe(self._connect_announced_tv(tv), self._loop)
+
+    def _on_tv_byebye(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # runs in the listener thread
+        if self._is_announced_tv(tv):
+            asyncio.run_coroutine_threadsafe(self._drop_connection(tv), self._loop)
+
+    async def _connect_announced_tv(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # see LGTV._connect_announced_tv
+        if self.is_connected():
+            return
+        self.log("TV at", tv.ip, "came online, connecting")
+        try:
+            if not await self.connect(self._announced_host, self._announced_app_name):
+                self.log("Connecting to TV at", tv.ip, "after it came online failed")
+                return
+        except Exception as e:
+            self.log("Connecting to TV at", tv.ip, "after it came online failed:", str(e))
+            return
+        await self._watch_3D_Mode()
+
+    async def _drop_connection(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # see LGTV._drop_connection, the reader task ends with the stream
+        if self.wsocket is None and self.pointer_socket is None:
+            return
+        self.log("TV at", tv.ip, "went offline, dropping connection")
+        wsocket, self.wsocket = self.wsocket, None
+        pointer_socket, self.pointer_socket = self.pointer_socket, None
+        self._reader = None
+        self.is_paired = False
+        self.state.clear()
+        for sock in (wsocket, pointer_socket):
+            if sock is not None:
+                await sock.shutdown()
+
+    def _start_reader(self):
+        # type: () -> ()
+        # subscriptions end with the connection
+        self._pending = {}
+        self._subscriptions = {}
+        self._3D_Mode_subscription = None
+        self._reader = asyncio.ensure_future(
+            self._read_responses(self.wsocket, self._pending, self._subscriptions))
+
+    async def _read_responses(self, wsocket, pending, subscriptions):
+        # type: (websocket.AsyncWebSocket, dict, dict) -> ()
+        # runs as reader task until the connection is closed
+        try:
+            while True:
+                try:
+                    received = await wsocket.recv()
+                except Exception as e:
+                    if wsocket.connected:
+                        self.log("Receiving from TV failed:", str(e))
+                    received = ""
+                if len(received) == 0:
+                    # connection closed
+                    break
+                self._dispatch_response(received, pending, subscriptions)
+        finally:
+            wsocket.connected = False
+            self._fail_pending(pending)
+
+    async def _close_wsocket(self):
+        # type: () -> ()
+        wsocket, self.wsocket = self.wsocket, None
+        reader, self._reader = self._reader, None
+        if wsocket is None:
+            return
+        if reader is None or reader is asyncio.current_task():
+            await wsocket.close()
+            return
+
+        # the reader task receives the TV's close frame and terminates
+        try:
+            await wsocket.send_close()
+        except Exception:
+            pass
+        done, _ = await asyncio.wait([reader], timeout=3)
+        if not done:
+            # no close frame from the TV
+            reader.cancel()
+        await wsocket.shutdown()
+
+    async def _connect_input_pointer(self):
+        # type: () -> bool
+        if self._is_pointer_connected():
+            return True
+
+        # get address of input pointer socket
+        socket_path = self._parse_pointer_socket_path(
+            *await self._send_command("ssap://com.webos.service.networkinput/getPointerInputSocket"))
+        if socket_path is None:
+            return False
+
+        try:
+            self.log("Connecting to InputPointer socket at", socket_path)
+            self.pointer_socket = await websocket.create_async_connection(socket_path)
+        except Exception as e:
+            self.log("Connection to InputPointer socket failed:", str(e))
+            return False
+
+        return True
+
+    async def _disconnect_input_pointer(self):
+        # type: () -> ()
+        if not self._is_pointer_connected():
+            return
+
+        await self.pointer_socket.close()
+        self.pointer_socket = None
+
+    async def _ensure_connected(self):
+        # type: () -> (bool, str)
+        if not self.is_connected():
+            if self.last_host is None:
+                return (False, "Not connected")
+            if not await self.connect(self.last_host):
+                return (False, "Not connected, reconnect failed")
+            if not self.is_connected():
+                return (False, "is_connected() returned False after successful reconnect")
+            self.log("Successfully reconnected")
+        return (True, "")
+
+    async def _send_command(self, uri, payload=None, resending=False, timeout=None):
+        # type: (str, Any, bool, float) -> (bool, Any)
+        # Tuple's second component is dict if first component is True.
+        # timeout defaults to response_timeout.
+        success, reason = await self._ensure_connected()
+        if not success:
+            return (False, reason)
+
+        response = (await self._exchange([self._make_request(uri, payload)], timeout))[0]
+        if response is None:
+            if self.is_connected():
+                return (False, "No response from TV within " + str(timeout or self.response_timeout) + " seconds")
+            if not resending:
+                self.log("Connection closed by server, probably timed out.")
+                # try connecting one more time
+                return await self._send_command(uri, payload, resending=True, timeout=timeout)
+            self.log("Connection closed by server, probably timed out  (second time, not trying again).")
+            return (False, "Connection closed by server, probably timed out (second time, not trying again).")
+
+        return self._parse_response(response)
+
+    async def _send_commands(self, commands):
+        # type: (list) -> list
+        # see LGTV._send_commands
+        success, reason = await self._ensure_connected()
+        if not success:
+            return [(False, reason)] * len(commands)
+
+        return self._parse_responses(await self._exchange([self._make_request(uri, payload) for uri, payload in commands]))
+
+    async def _exchange(self, requests, timeout=None):
+        # type: (list, float) -> list
+        # see LGTV._exchange
+        loop = asyncio.get_event_loop()
+        waiters = [loop.create_future() for _ in requests]
+        pending = self._pending
+        for (msg_id, _), waiter in zip(requests, waiters):
+            pending[msg_id] = waiter
+        try:
+            wsocket = self.wsocket
+            if wsocket is None or not wsocket.connected:
+                # reader has terminated in the meantime
+                return [None] * len(requests)
+            await wsocket.send_many([msg for _, msg in requests])
+            await asyncio.wait(waiters, timeout=timeout or self.response_timeout)
+            return [waiter.result() if waiter.done() else None for waiter in waiters]
+        finally:
+            for msg_id, _ in requests:
+                pending.pop(msg_id, None)
+
+    async def subscribe(self, uri, callback, payload=None):
+        # type: (str, (bool, Any) -> (), Any) -> (bool, Any)
+        # see LGTV.subscribe, callback is a plain function called from the
+        # reader task.
+        success, reason = await self._ensure_connected()
+        if not success:
+            return (False, reason)
+
+        subscriptions = self._subscriptions
+        msg_id, msg = self._make_request(uri, payload, 'subscribe')
+        subscriptions[msg_id] = callback
+        response = (await self._exchange([(msg_id, msg)]))[0]
+        if response is None:
+            subscriptions.pop(msg_id, None)
+            return (False, "Subscribing to " + uri + " failed, no response from TV")
+
+        success, result = self._parse_response(response)
+        if not success:
+            subscriptions.pop(msg_id, None)
+            return (False, result)
+        return (True, msg_id)
+
+    async def unsubscribe(self, subscription_id):
+        # type: (str) -> (bool, Any)
+        if self._subscriptions.pop(subscription_id, None) is None:
+            return (False, "Unknown subscription " + str(subscription_id))
+        if self.is_connected():
+            await self.wsocket.send(json.dumps({'id': subscription_id, 'type': 'unsubscribe'}))
+        return (True, "")
+
+    async def toast(self, msg, icon_file=None, file_extension=None, icon_base64=None, icon=None):
+        # type: (str, str, str, str, Icon) -> (bool, Any)
+        success, payload = self._toast_payload(msg, icon_file, file_extension, icon_base64, icon)
+        if not success:
+            return (False, payload)
+        return await self._send_command("ssap://system.notifications/createToast", payload)
+
+    async def disable_3D(self):
+        # type: () -> (bool, Any)
+        self.state.invalidate(StateCache.MODE_3D)
+        return await self._send_command("ssap://com.webos.service.tv.display/set3DOff")
+
+    async def enable_3D(self):
+        # type: () -> (bool, Any)
+        self.state.invalidate(StateCache.MODE_3D)
+        return await self._send_command("ssap://com.webos.service.tv.display/set3DOn")
+
+    async def get_3D_Mode(self):
+        # type: () -> Display3dMode
+        # see LGTV.get_3D_Mode
+        mode = self.state.get(StateCache.MODE_3D)
+        if mode is not None:
+            return mode
+        return await self._query_3D_Mode()
+
+    async def _query_3D_Mode(self):
+        # type: () -> Display3dMode
+        return self._parse_3D_Mode(*await self._send_command("ssap://com.webos.service.tv.display/get3DStatus"))
+
+    async def _watch_3D_Mode(self):
+        # type: () -> bool
+        # see LGTV._watch_3D_Mode
+        if self._3D_Mode_subscription is not None and self.is_connected():
+            return True
+        success, result = await self.subscribe("ssap://com.webos.service.tv.display/get3DStatus", self._on_3D_status)
+        if not success:
+            self.log("Could not subscribe to 3D status, polling instead:", result)
+            return False
+        self._3D_Mode_subscription = result
+        return True
+
+    def _on_3D_status(self, success, payload):
+        # type: (bool, Any) -> ()
+        self._reported_3D_Mode = self._parse_3D_Mode(success, payload)
+        self._3D_Mode_reports += 1
+        if self._3D_Mode_changed is not None:
+            self._3D_Mode_changed.set()
+        self._3D_Mode_changed = asyncio.Event()
+
+    async def _wait_for_3D_Mode(self, accept, timeout, since):
+        # type: ((Display3dMode) -> bool, float, int) -> Display3dMode
+        # see LGTV._wait_for_3D_Mode
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        if self._3D_Mode_subscription is not None and self.is_connected():
+            while True:
+                if self._3D_Mode_reports > since and accept(self._reported_3D_Mode):
+                    return self._reported_3D_Mode
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._3D_Mode_changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            return await self._query_3D_Mode()
+
+        while True:
+            mode = await self._query_3D_Mode()
+            remaining = deadline - loop.time()
+            if accept(mode) or remaining <= 0 or mode == Display3dMode.ERROR:
+                return mode
+            await asyncio.sleep(min(MODE_POLL_INTERVAL, remaining))
+
+    async def send_enter_key(self):
+        # type: () -> (bool, Any)
+        return await self._send_command("ssap://com.webos.service.ime/sendEnterKey")
+
+    async def set_3D_Mode(self, mode, button_delay=None, arrow_delay=None):
+        # type: (Display3dMode, float, float) -> (bool, Any)
+        # see LGTV.set_3D_Mode. If the task is cancelled while the 3D menu
+        # is open, the menu is closed before the cancellation propagates.
+        if mode < Display3dMode.OFF or mode > Display3dMode.LINE_INTERLEAVE_HALF:
+            return (False, "Invalid 3D mode")
+        await self._watch_3D_Mode()
+
+        current_mode = await self.get_3D_Mode()
+        if current_mode == mode:
+            # already correct mode
+            return (True, "")
+        if current_mode == Display3dMode.ERROR:
+            return (False, "set_3D_Mode: Could not get current 3D mode. Something went wrong.")
+
+        if mode == Display3dMode.OFF:
+            # easiest variant: simply disable 3D.
+            return await self.disable_3D()
+
+        if button_delay is None:
+            button_delay = self.timings.menu_delay()
+
+        try:
+            reported = await self._set_3D_Mode_directly(mode, current_mode, button_delay)
+            if reported == mode:
+                return (True, "")
+            if reported is not None and reported != current_mode:
+                current_mode = reported if reported != Display3dMode.ERROR else await self._query_3D_Mode()
+                if current_mode == Display3dMode.ERROR:
+                    return (False, "set_3D_Mode: Could not get current 3D mode. Something went wrong.")
+            return await self._follow_3D_plan(mode, current_mode, button_delay, arrow_delay)
+        finally:
+            self._save_timings()
+
+    async def _set_3D_Mode_directly(self, mode, current_mode, timeout):
+        # type: (Display3dMode, Display3dMode, float) -> Display3dMode
+        # see LGTV._set_3D_Mode_directly
+        endpoints = self._direct_3D_endpoints(mode, current_mode)
+        if not endpoints:
+            return None
+        probing = self.timings.direct_3D_uri is None
+        if probing:
+            timeout = min(timeout, DIRECT_3D_PROBE_TIMEOUT)
+
+        for uri, payload in endpoints:
+            since = self._3D_Mode_reports
+            start = time.time()
+            self.state.invalidate(StateCache.MODE_3D)
+            success, result = await self._send_command(uri, payload(Display3dMode.to_pattern(mode)),
+                                                       timeout=timeout if probing else None)
+            if not success and not self.is_connected():
+                return current_mode
+            if success:
+                current_mode = await self._wait_for_3D_Mode(lambda m: m == mode, timeout, since)
+                if current_mode == mode:
+                    self._record_direct_3D_result(uri, time.time() - start)
+                    return current_mode
+            if probing:
+                self.timings.record_direct_3D_failure(uri)
+            if current_mode == Display3dMode.ERROR:
+                break
+
+        self._record_direct_3D_result(None)
+        return current_mode
+
+    async def _follow_3D_plan(self, mode, current_mode, button_delay, arrow_delay):
+        # type: (Display3dMode, Display3dMode, float, float) -> (bool, Any)
+        # see LGTV._follow_3D_plan
+        actions = self._3D_plan_actions(mode, current_mode)
+        action, argument, menu_open = next(actions)
+        try:
+            while action != self._PLAN_DONE:
+                if action == TransitionStep.CLOSE_MENU:
+                    outcome = await self.send_click()
+                elif action == TransitionStep.DISABLE_3D:
+                    outcome = await self._change_3D_Mode(self.disable_3D, lambda m: m == Display3dMode.OFF, button_delay)
+                elif action == TransitionStep.ENABLE_3D:
+                    outcome = await self._change_3D_Mode(self.enable_3D, lambda m: m != Display3dMode.OFF, button_delay)
+                elif action == TransitionStep.OPEN_MENU:
+                    outcome = await self._open_3D_menu(argument, button_delay)
+                elif action == self._PRESS_ARROWS:
+                    outcome = await self._press_3D_Mode_arrows(argument[0], argument[1], argument[2], argument[3],
+                                                               arrow_delay)
+                elif action == self._STEP_ARROWS:
+                    outcome = await self._step_3D_Mode(argument[0], argument[1], argument[2], arrow_delay)
+                else:
+                    await self._disconnect_input_pointer()
+                    outcome = await self._connect_input_pointer()
+                action, argument, menu_open = actions.send(outcome)
+            return argument
+        except asyncio.CancelledError:
+            if menu_open:
+                try:
+                    await self.send_click() # close menu
+                except Exception:
+                    pass
+            raise
+
+    async def _change_3D_Mode(self, command, accept, timeout):
+        # type: (() -> (bool, Any), (Display3dMode) -> bool, float) -> (bool, Any)
+        # see LGTV._change_3D_Mode, command is a coroutine function
+        since = self._3D_Mode_reports
+        start = time.time()
+        result = await command()
+        if not result[0]:
+            return result
+        current_mode = await self._wait_for_3D_Mode(accept, timeout, since)
+        if accept(current_mode):
+            self.timings.record_mode_switch(time.time() - start)
+        return (True, current_mode)
+
+    async def _press_for_3D_Mode(self, buttons, accept, timeout, pacing=0):
+        # type: (list, (Display3dMode) -> bool, float, float) -> Display3dMode
+        # see LGTV._press_for_3D_Mode
+        since = self._3D_Mode_reports
+        await self.send_buttons(buttons, pacing)
+        return await self._wait_for_3D_Mode(accept, timeout, since)
+
+    async def _open_3D_menu(self, current_mode, button_delay):
+        # type: (Display3dMode, float) -> Display3dMode
+        # see LGTV._open_3D_menu
+        if current_mode != Display3dMode.OFF:
+            await self.send_button(RemoteButton.MODE_3D)
+            await asyncio.sleep(self.timings.menu_open)
+            return current_mode
+        start = time.time()
+        current_mode = await self._press_for_3D_Mode([RemoteButton.MODE_3D], lambda m: m != Display3dMode.OFF, button_delay)
+        if current_mode not in (Display3dMode.OFF, Display3dMode.ERROR):
+            self.timings.record_menu_open(time.time() - start)
+        return current_mode
+
+    async def _press_3D_Mode_arrows(self, presses, current_mode, mode, settling, arrow_delay):
+        # type: (list, Display3dMode, Display3dMode, bool, float) -> Display3dMode
+        # see LGTV._press_3D_Mode_arrows
+        timeout = (arrow_delay or self.timings.arrow_delay()) * len(presses)
+        if settling:
+            await asyncio.sleep(self.timings.menu_settle)
+        start = time.time()
+        reported = await self._press_for_3D_Mode(presses, lambda m: m == mode, timeout, self.timings.arrow_pacing)
+        if reported == mode:
+            self.timings.record_arrow_press((time.time() - start) / len(presses))
+        self._record_3D_Mode_arrows(current_mode, mode, reported, settling)
+        return reported
+
+    async def _step_3D_Mode(self, presses, current_mode, settling, arrow_delay):
+        # type: (list, Display3dMode, bool, float) -> Display3dMode
+        # see LGTV._step_3D_Mode
+        if settling:
+            await asyncio.sleep(self.timings.menu_settle)
+        lost_presses = 0
+        i = 0
+        while i < len(presses):
+            previous_mode = current_mode
+            start = time.time()
+            current_mode = await self._press_for_3D_Mode([presses[i]], lambda m: m != previous_mode,
+                                                         arrow_delay or self.timings.arrow_delay())
+            if current_mode in (Display3dMode.OFF, Display3dMode.ERROR):
+                break
+            if current_mode != previous_mode:
+                self.timings.record_arrow_press(time.time() - start)
+                lost_presses = 0
+                i += 1
+                continue
+            self.timings.record_lost_press()
+            lost_presses += 1
+            if lost_presses == 2:
+                # TV does not react any more, give up
+                break
+        return current_mode
+
+    async def _send_input_command(self, cmd):
+        # type: (str) -> (bool, str)
+        return await self._send_input_commands([cmd])
+
+    async def _send_input_commands(self, cmds):
+        # type: (list) -> (bool, str)
+        # all commands are sent with a single write
+        if not self._is_pointer_connected() and not await self._connect_input_pointer():
+            return (False, "Could not connect to InputPointer socket")
+
+        await self.pointer_socket.send_many(cmds)
+        # unfortunately, we cannot check whether the socket timed out...
+        return (True, "")
+
+    async def send_button(self, button):
+        # type: (RemoteButton) -> (bool, str)
+        self.state.invalidate(StateCache.MODE_3D)
+        return await self._send_input_command(self._button_command(button))
+
+    async def send_buttons(self, sequence, pacing=0):
+        # type: (list, float) -> (bool, str)
+        # see LGTV.send_buttons
+        self.state.invalidate(StateCache.MODE_3D)
+        for i, step in enumerate(self._button_steps(sequence, pacing)):
+            if i > 0:
+                await asyncio.sleep(pacing)
+            result = await self._send_input_commands(step)
+            if not result[0]:
+                return result
+        return (True, "")
+
+    async def send_click(self):
+        # type: () -> (bool, str)
+        return await self._send_input_command("type:click\n\n")
+
+    async def get_inputs(self):
+        # type: () -> (bool, Any)
+        return self._parse_inputs(*await self._send_command("ssap://tv/getExternalInputList"))
+
+    async def set_input(self, input):
+        # type: (str) -> (bool, Any)
+        # input can be HDMI_1, HDMI_2 etc.
+        self.state.invalidate(StateCache.INPUT, StateCache.MODE_3D)
+        result = await self._send_command("ssap://tv/switchInput", {'inputId': input})
+        if result[0]:
+            self.state.set(StateCache.INPUT, input)
+        return result
+
+    async def get_channel(self):
+        # type: () -> (bool, Any)
+        return await self._send_command("ssap://tv/getCurrentChannel")
+
+    async def get_volume(self):
+        # type: () -> (bool, int)
+        # see LGTV.get_volume
+        volume = self.state.get(StateCache.VOLUME)
+        if volume is not None:
+            return (True, volume)
+        return self._parse_volume(*await self._send_command("ssap://audio/getVolume"))
+
+    async def set_volume(self, volume):
+        # type: (int) -> (bool, Any)
+        if volume < 0 or volume > 100:
+            return (False, "0 <= volume <= 100 must hold.")
+        self.state.invalidate(StateCache.VOLUME)
+        result = await self._send_command("ssap://audio/setVolume", {'volume': volume})
+        if result[0]:
+            self.state.set(StateCache.VOLUME, volume)
+        return result
+
+    async def get_audio_status(self):
+        # type: () -> (bool, Any)
+        result = await self._send_command("ssap://audio/getStatus")
+        if result[0] and 'volume' in result[1]:
+            self.state.set(StateCache.VOLUME, result[1]['volume'])
+        return result
+
+    async def send_pong(self):
+        # type: () -> bool
+        if not self.is_connected():
+            return False
+        await self.wsocket.pong(b"")
+        if self._is_pointer_connected():
+            # also pong pointer socket.
+            await self.pointer_socket.pong(b"")
+        return True
@@ -0,0 +1,640 @@
+from __future__ import print_function
+import collections
+import errno
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+try:
+    # Unix only, used to list the addresses of all interfaces
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import websocket  # LGPL
+
+
+# a TV that answered an SSDP search. response_time is the time in seconds
+# from the first M-SEARCH to the response.
+DiscoveredTV = collections.namedtuple('DiscoveredTV', ['ip', 'usn', 'server', 'response_time'])
+
+SSDP_HOST = "239.255.255.250"
+SSDP_PORT = 1900
+# the TV's WebSocket API
+WEBOS_PORT = 3000
+
+# ioctl to get an interface's IPv4 address (Linux)
+SIOCGIFADDR = 0x8915
+
+# the kernel's IPv4 neighbor (ARP) table on Linux
+PROC_NET_ARP = "/proc/net/arp"
+# UDP discard service, datagrams sent to fill the neighbor table
+DISCARD_PORT = 9
+
+
+def local_ipv4_addresses():
+    # type: () -> list
+    # IPv4 addresses of all local interfaces except loopback. Only
+    # standard library means are used, so this is best effort: interfaces
+    # are listed where the platform supports it, the address of the
+    # default route is always included.
+    addresses = []
+
+    if fcntl is not None and hasattr(socket, "if_nameindex"):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for _, name in socket.if_nameindex():
+                try:
+                    request = struct.pack("256s", name.encode("utf8")[:15])
+                    addresses.append(socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)[20:24]))
+                except (IOError, OSError):
+                    # no IPv4 address
+                    pass
+        finally:
+            sock.close()
+
+    try:
+        addresses.extend(socket.gethostbyname_ex(socket.gethostname())[2])
+    except (socket.error, UnicodeError):
+        pass
+
+    # the address used for the default route, no packet is sent
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((SSDP_HOST, SSDP_PORT))
+        addresses.append(sock.getsockname()[0])
+    except socket.error:
+        pass
+    finally:
+        sock.close()
+
+    result = []
+    for address in addresses:
+        if address not in result and not address.startswith("127.") and address != "0.0.0.0":
+            result.append(address)
+    return result
+
+
+def neighbor_table():
+    # type: () -> dict
+    # MAC addresses (lower case) by IP of the hosts in the local neighbor
+    # table, read from /proc/net/arp or "ip neigh". Empty if neither is
+    # available.
+    table = {}
+    try:
+        f = open(PROC_NET_ARP, "r")
+        try:
+            lines = f.readlines()[1:]
+        finally:
+            f.close()
+        for line in lines:
+            # IP address, HW type, flags, HW address, mask, device
+            fields = line.split()
+            if len(fields) >= 4 and int(fields[2], 16) & 0x2:
+                # ATF_COM: resolved
+                table[fields[0]] = fields[3].lower()
+        return table
+    except (IOError, OSError, ValueError):
+        pass
+
+    try:
+        output = subprocess.check_output(["ip", "-4", "neigh", "show"])
+    except (OSError, subprocess.CalledProcessError):
+        return table
+    for line in output.decode("utf8", "replace").splitlines():
+        # 192.168.1.5 dev eth0 lladdr aa:bb:cc:dd:ee:ff REACHABLE
+        fields = line.split()
+        if "lladdr" in fields[:-1] and "FAILED" not in fields and "INCOMPLETE" not in fields:
+            table[fields[0]] = fields[fields.index("lladdr") + 1].lower()
+    return table
+
+
+def subnet_hosts(address):
+    # type: (str) -> list
+    # all other host addresses in the /24 network of address
+    prefix = address.rsplit(".", 1)[0] + "."
+    return [prefix + str(i) for i in range(1, 255) if prefix + str(i) != address]
+
+
+def find_ips_by_mac(macs, exclude=(), timeout=2.0):
+    # type: (list, list, float) -> dict
+    # IPs of the hosts with the given MAC addresses, by MAC, ignoring the
+    # IPs in exclude. MACs not in the neighbor table are searched for by
+    # sending a datagram to every host in the /24 networks of all local
+    # interfaces at once and waiting at most timeout seconds for them
+    # to show up in the table.
+    macs = [mac.lower() for mac in macs]
+    found = {}
+
+    def look_up():
+        for ip, mac in neighbor_table().items():
+            if mac in macs and mac not in found and ip not in exclude:
+                found[mac] = ip
+
+    look_up()
+    if len(found) == len(macs):
+        return found
+
+    # the kernel resolves the MAC address of every host a datagram is sent
+    # to, whether the host answers or not
+    deadline = time.time() + timeout
+    for address in local_ipv4_addresses():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(0)
+            for ip in subnet_hosts(address):
+                try:
+                    sock.sendto(b"", (ip, DISCARD_PORT))
+                except socket.error:
+                    pass
+        finally:
+            sock.close()
+
+    while len(found) < len(macs) and time.time() < deadline:
+        time.sleep(0.1)
+        look_up()
+    return found
+
+
+class SSDPDiscovery(object):
+    # Finds TVs with SSDP M-SEARCH on all local IPv4 interfaces at once and
+    # collects every response within a single window.
+
+    def __init__(self, log=print):
+        # type: ((...) -> ()) -> None
+        self.log = log
+
+    def discover(self, timeout=3, tries=2, stop_at=None, limit=None):
+        # type: (float, int, list, int) -> list
+        # Returns a DiscoveredTV per responding TV, in order of response.
+        # M-SEARCH is sent tries times spread over the first half of the
+        # window, as UDP might get lost. Returns as soon as a TV with an IP
+        # in stop_at answers or limit TVs answered.
+        stop_at = set(stop_at or [])
+        # TVs should answer within MX seconds, leave a second for the network
+        mx = max(1, min(int(timeout) - 1, 120))
+        sockets = self._open_sockets()
+        if not sockets:
+            self.log("No network interface to send SSDP search message on")
+            return []
+
+        found = []
+        try:
+            start = time.time()
+            deadline = start + timeout
+            interval = timeout / 2.0 / tries
+            sent = 0
+            while True:
+                now = time.time()
+                if sent < tries and now >= start + sent * interval:
+                    sent += 1
+                    self._send_search(sockets, mx, sent)
+                if now >= deadline:
+                    break
+                wait = deadline - now
+                if sent < tries:
+                    wait = min(wait, start + sent * interval - now)
+                readable = select.select(sockets, [], [], max(0, wait))[0]
+                for sock in readable:
+                    tv = self._receive(sock, time.time() - start)
+                    if tv is None or tv.ip in [f.ip for f in found]:
+                        continue
+                    self.log("Found TV at", tv.ip, "(" + tv.server + ")")
+                    found.append(tv)
+                    if tv.ip in stop_at or len(found) == limit:
+                        return found
+        finally:
+            for sock in sockets:
+                sock.close()
+        return found
+
+    def _open_sockets(self):
+        # type: () -> list
+        # one socket per interface, so the search goes out on all of them
+        sockets = []
+        for address in local_ipv4_addresses():
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(address))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+                sock.bind((address, 0)) # bind to random free port
+            except socket.error as e:
+                self.log("Cannot send SSDP search message from", address + ":", str(e))
+                sock.close()
+                continue
+            sockets.append(sock)
+        if not sockets:
+            # fall back to the default interface
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("", 0))
+            sockets.append(sock)
+        return sockets
+
+    def _send_search(self, sockets, mx, try_no):
+        # type: (list, int, int) -> ()
+        # see http://developer.lgappstv.com/TV_HELP/index.jsp?topic=%2Flge.tvsdk.references.book%2Fhtml%2FUDAP%2FUDAP%2FM+SEARCH+Request.htm
+        # for M-SEARCH request description
+        #
+        # according to above document, 1 <= MX <= 4 should hold.
+        # however, UPnP spec says
+        # "MX: Maximum wait time in seconds. Should be between 1 and 120 inclusive. Device responses should be delayed a
+        #      random duration between 0 and this many seconds to balance load for the control point when it processes responses.
+        #      This value may be increased if a large number of devices are expected to respond."
+        # (source: http://www.upnp.org/specs/arch/UPnP-arch-DeviceArchitecture-v1.0-20080424.pdf)
+        message = (
+            "M-SEARCH * HTTP/1.1\r\n" +
+            "HOST: 239.255.255.250:1900\r\n" +
+            'MAN: "ssdp:discover"\r\n' +
+            "MX: " + str(mx) + "\r\n" +
+            "ST: urn:dial-multiscreen-org:service:dial:1\r\n" +
+            "USER-AGENT: UDAP/2.0\r\n\r\n") # close with double \r\n
+        # according to LG, USER-AGENT is required (everything except UDAP/2.0 can be omitted)
+        # (although my TV responds even when USER-AGENT is missing completely...)
+
+        self.log("Sending SSDP search message, try", try_no)
+        for sock in sockets:
+            try:
+                sock.sendto(message.encode("utf8"), (SSDP_HOST, SSDP_PORT))
+            except socket.error as e:
+                self.log("Sending SSDP search message failed:", str(e))
+
+    @staticmethod
+    def _receive(sock, response_time):
+        # type: (socket.socket, float) -> DiscoveredTV
+        # returns None if the response is not from an LG TV
+        try:
+            data, addr = sock.recvfrom(2048)
+        except socket.error:
+            return None
+        if b"WebOS" not in data and b"LG Smart TV" not in data:
+            return None
+        headers = parse_ssdp_headers(data)
+        return DiscoveredTV(addr[0], headers.get('usn', ''), headers.get('server', ''), response_time)
+
+
+class SSDPListener(object):
+    # Listens for the NOTIFY messages devices multicast when they come
+    # online (ssdp:alive) or go offline (ssdp:byebye) and calls
+    # on_alive(tv) for LG TVs and on_byebye(tv) for all devices with a
+    # DiscoveredTV (response_time 0) in a background thread. A device sends
+    # several NOTIFY messages at once, repeated ones are ignored for
+    # HOLDOFF seconds unless the device changed its state in between.
+
+    HOLDOFF = 5.0
+
+    def __init__(self, on_alive, on_byebye, log=print):
+        # type: ((DiscoveredTV) -> (), (DiscoveredTV) -> (), (...) -> ()) -> None
+        self.on_alive = on_alive
+        self.on_byebye = on_byebye
+        self.log = log
+        self._thread = None                 # type: threading.Thread
+        # set to end the current listener thread
+        self._stop = None                   # type: threading.Event
+        # ip -> (NTS, time) of the last callback
+        self._last_notify = {}              # type: dict
+
+    def start(self):
+        # type: () -> bool
+        # False if the SSDP port cannot be listened on
+        if self._thread is not None:
+            return True
+        try:
+            sock = self._open_socket()
+        except socket.error as e:
+            self.log("Cannot listen for SSDP announcements:", str(e))
+            return False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, args=(sock, self._stop))
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def stop(self):
+        # type: () -> ()
+        # does not wait, the thread ends within a second
+        if self._thread is not None:
+            self._stop.set()
+            self._thread = None
+
+    @staticmethod
+    def _open_socket():
+        # type: () -> socket.socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # other UPnP software (like Kodi itself) might listen as well
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                except socket.error:
+                    pass
+            sock.bind(("", SSDP_PORT))
+            joined = False
+            for address in local_ipv4_addresses():
+                try:
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                    socket.inet_aton(SSDP_HOST) + socket.inet_aton(address))
+                    joined = True
+                except socket.error:
+                    pass
+            if not joined:
+                # default interface
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                struct.pack("4sL", socket.inet_aton(SSDP_HOST), socket.INADDR_ANY))
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _listen(self, sock, stop):
+        # type: (socket.socket, threading.Event) -> ()
+        # runs in the listener thread until stop()
+        try:
+            while not stop.is_set():
+                try:
+                    if not select.select([sock], [], [], 1)[0]:
+                        continue
+                    data, addr = sock.recvfrom(2048)
+                except socket.error as e:
+                    self.log("Listening for SSDP announcements failed:", str(e))
+                    break
+                if stop.is_set():
+                    break
+                try:
+                    self._handle(data, addr[0])
+                except Exception as e:
+                    self.log("Handling SSDP announcement from", addr[0], "failed:", str(e))
+        finally:
+            sock.close()
+
+    def _handle(self, data, ip):
+        # type: (bytes, str) -> ()
+        if not data.startswith(b"NOTIFY"):
+            # searches and responses
+            return
+        headers = parse_ssdp_headers(data)
+        nts = headers.get('nts')
+        if nts == "ssdp:alive":
+            # byebye messages do not name the server
+            if b"WebOS" not in data and b"LG Smart TV" not in data:
+                return
+            callback = self.on_alive
+        elif nts == "ssdp:byebye":
+            callback = self.on_byebye
+        else:
+            return
+
+        now = time.time()
+        last_nts, last_time = self._last_notify.get(ip, (None, 0))
+        if last_nts == nts and now - last_time < self.HOLDOFF:
+            return
+        self._last_notify[ip] = (nts, now)
+        callback(DiscoveredTV(ip, headers.get('usn', ''), headers.get('server', ''), 0))
+
+
+class DiscoveryCache(object):
+    # TVs found before, most recently seen first, so they can be probed
+    # (see probe_webos()) instead of searching with SSDP. A TV is
+    # identified by its USN or MAC address, so it is only listed at its
+    # latest IP. The MAC address allows finding the TV again after its IP
+    # changed (see find_ips_by_mac()).
+
+    # entries not seen for this many seconds are dropped
+    MAX_AGE = 30 * 24 * 3600
+    MAX_ENTRIES = 8
+    # set_mac() refreshes unchanged entries at most this often
+    REFRESH_INTERVAL = 24 * 3600
+
+    def __init__(self):
+        # type: () -> None
+        # dicts with ip, usn, server, mac ('' if unknown) and seen
+        # (time.time())
+        self.entries = []       # type: list
+        self.changed = False    # type: bool
+
+    @classmethod
+    def from_list(cls, entries):
+        # type: (list) -> DiscoveryCache
+        # tolerates broken entries
+        cache = cls()
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                cache.entries.append({
+                    'ip': str(entry['ip']),
+                    'usn': entry.get('usn') or '',
+                    'server': entry.get('server') or '',
+                    'mac': entry.get('mac') or '',
+                    'seen': float(entry['seen'])
+                })
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+        cache.entries.sort(key=lambda e: e['seen'], reverse=True)
+        return cache
+
+    def to_list(self):
+        # type: () -> list
+        return [dict(entry, seen=round(entry['seen'])) for entry in self.entries]
+
+    def ips(self):
+        # type: () -> list
+        # IPs of all entries that did not expire, most recently seen first
+        oldest = time.time() - self.MAX_AGE
+        return [entry['ip'] for entry in self.entries if entry['seen'] >= oldest]
+
+    def macs(self):
+        # type: () -> dict
+        # IPs by MAC address of all entries that did not expire and whose
+        # MAC address is known
+        oldest = time.time() - self.MAX_AGE
+        return dict((entry['mac'], entry['ip']) for entry in self.entries
+                    if entry['mac'] and entry['seen'] >= oldest)
+
+    def add(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # replaces entries with the same IP or USN
+        mac = ''
+        for entry in self.entries:
+            if (tv.usn and entry['usn'] == tv.usn) or (entry['ip'] == tv.ip and not entry['usn']):
+                # same TV, maybe at another IP
+                mac = mac or entry['mac']
+        self._replace(lambda entry: entry['ip'] == tv.ip or (tv.usn and entry['usn'] == tv.usn),
+                      {'ip': tv.ip, 'usn': tv.usn, 'server': tv.server, 'mac': mac})
+
+    def set_mac(self, ip, mac):
+        # type: (str, str) -> ()
+        # the TV at ip has the MAC address mac, replaces entries with the
+        # same IP or MAC
+        same = [entry for entry in self.entries if entry['ip'] == ip or entry['mac'] == mac]
+        if [(entry['ip'], entry['mac']) for entry in same] == [(ip, mac)]:
+            if same[0]['seen'] < time.time() - self.REFRESH_INTERVAL:
+                # keep it from expiring
+                self.touch(ip)
+            return
+        usn = server = ''
+        for entry in same:
+            if entry['mac'] == mac or not entry['mac']:
+                # same TV, maybe at another IP
+                usn = usn or entry['usn']
+                server = server or entry['server']
+        self._replace(lambda entry: entry['ip'] == ip or entry['mac'] == mac,
+                      {'ip': ip, 'usn': usn, 'server': server, 'mac': mac})
+
+    def _replace(self, outdated, entry):
+        # type: ((dict) -> bool, dict) -> ()
+        self.entries = [e for e in self.entries if not outdated(e)]
+        entry['seen'] = time.time()
+        self.entries.insert(0, entry)
+        del self.entries[self.MAX_ENTRIES:]
+        self.changed = True
+
+    def touch(self, ip):
+        # type: (str) -> ()
+        # the TV at ip was seen again
+        for entry in self.entries:
+            if entry['ip'] == ip:
+                self.entries.remove(entry)
+                self.entries.insert(0, dict(entry, seen=time.time()))
+                self.changed = True
+                return
+
+
+def probe_webos(ips, timeout=1.0, port=WEBOS_PORT):
+    # type: (list, float, int) -> str
+    # Connects to port of all ips in parallel and returns the first IP in
+    # the order of ips that accepted within timeout seconds, None if none
+    # did. Returns as soon as no earlier IP can answer any more.
+    pending = {}
+    alive = set()
+    for ip in ips:
+        if ip in pending:
+            continue
+        sock, connected = _begin_connect(ip, port)
+        if sock is not None:
+            pending[ip] = sock
+        elif connected:
+            alive.add(ip)
+
+    deadline = time.time() + timeout
+    try:
+        while True:
+            for ip in ips:
+                if ip in alive:
+                    return ip
+                if ip in pending:
+                    # an earlier IP might still answer
+                    break
+            else:
+                return None
+            wait = deadline - time.time()
+            if wait <= 0:
+                break
+            socks = list(pending.values())
+            # Windows reports failed connects as exceptional
+            _, writable, failed = select.select([], socks, socks, wait)
+            for ip, sock in list(pending.items()):
+                if sock in writable or sock in failed:
+                    if sock in writable and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        alive.add(ip)
+                    del pending[ip]
+                    sock.close()
+    finally:
+        for sock in pending.values():
+            sock.close()
+
+    for ip in ips:
+        if ip in alive:
+            return ip
+    return None
+
+
+def sweep_webos(ips, timeout=0.5, concurrency=64, progress=None, port=WEBOS_PORT):
+    # type: (list, float, int, (int, int) -> bool, int) -> list
+    # IPs of ips that accept connections on port, in order of their
+    # answer. Connects to at most concurrency IPs at once and gives each
+    # timeout seconds. progress(done, total) is called whenever an IP is
+    # done and may return True to cancel the sweep.
+    queue = list(ips)
+    total = len(queue)
+    done = 0
+    alive = []
+    # socket -> (ip, deadline)
+    pending = {}
+    try:
+        while queue or pending:
+            finished = []
+            while queue and len(pending) < concurrency:
+                ip = queue.pop(0)
+                sock, connected = _begin_connect(ip, port)
+                if sock is not None:
+                    pending[sock] = (ip, time.time() + timeout)
+                    continue
+                if connected:
+                    alive.append(ip)
+                finished.append(ip)
+
+            if pending:
+                socks = list(pending.keys())
+                wait = min(deadline for _, deadline in pending.values()) - time.time()
+                # Windows reports failed connects as exceptional
+                _, writable, failed = select.select([], socks, socks, max(0, wait))
+                now = time.time()
+                for sock in socks:
+                    ip, deadline = pending[sock]
+                    if sock in writable or sock in failed:
+                        if sock in writable and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                            alive.append(ip)
+                    elif now < deadline:
+                        continue
+                    del pending[sock]
+                    sock.close()
+                    finished.append(ip)
+
+            for _ in finished:
+                done += 1
+                if progress is not None and progress(done, total):
+                    return alive
+    finally:
+        for sock in pending:
+            sock.close()
+    return alive
+
+
+def confirm_webos(ip, timeout=1.0, port=WEBOS_PORT):
+    # type: (str, float, int) -> bool
+    # whether ip accepts a WebSocket connection on port, as a webOS TV does
+    try:
+        wsocket = websocket.create_connection("ws://%s:%d" % (ip, port), timeout=timeout)
+    except Exception:
+        return False
+    wsocket.shutdown()
+    return True
+
+
+def _begin_connect(ip, port):
+    # type: (str, int) -> (socket.socket, bool)
+    # Starts a non-blocking connect. Returns the socket if the connect is
+    # in progress, otherwise None and whether it succeeded at once.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(0)
+    try:
+        err = sock.connect_ex((ip, port))
+    except (socket.error, UnicodeError):
+        err = errno.EINVAL
+    if err in (errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK)):
+        return (sock, False)
+    sock.close()
+    return (None, err == 0)
+
+
+def parse_ssdp_headers(data):
+    # type: (bytes) -> dict
+    # header names in lower case
+    headers = {}
+    for line in data.decode("utf8", "replace").split("\r\n")[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
@@ -7,6 +7,15 @@ class RemoteButton(object):
     RIGHT = "RIGHT"
     MODE_3D = "3D_MODE"
 
+class TransitionStep(object):
+    # steps of a 3D mode transition, see TransitionPlanner
+    DISABLE_3D = "disable_3D"       # ssap call, 3D off
+    ENABLE_3D = "enable_3D"         # ssap call, 3D on in the last 3D mode
+    OPEN_MENU = RemoteButton.MODE_3D
+    LEFT = RemoteButton.LEFT
+    RIGHT = RemoteButton.RIGHT
+    CLOSE_MENU = "click"
+
 class Display3dMode(object):
     ERROR = -1
     OFF = 0
@@ -40,6 +49,28 @@ class Display3dMode(object):
             return Display3dMode.OFF
         return Display3dMode.ERROR
 
+    @staticmethod
+    def to_pattern(mode):
+        # type: (Display3dMode) -> str
+        # inverse of from_string()
+        if mode == Display3dMode.CONVERT_2D_TO_3D:
+            return '2dto3d'
+        if mode == Display3dMode.SIDE_SIDE_HALF:
+            return 'side_side_half'
+        if mode == Display3dMode.TOP_BOTTOM:
+            return 'top_bottom'
+        if mode == Display3dMode.CHECK_BOARD:
+            return 'check_board'
+        if mode == Display3dMode.FRAME_SEQUENTIAL:
+            return 'frame_sequential'
+        if mode == Display3dMode.COLUMN_INTERLEAVE:
+            return 'column_interleave'
+        if mode == Display3dMode.LINE_INTERLEAVE_HALF:
+            return 'line_interleave_half'
+        if mode == Display3dMode.OFF:
+            return '2d'
+        return None
+
     @staticmethod
     def to_string(s):
         # type: (int) -> str
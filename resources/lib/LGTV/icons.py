@@ -0,0 +1,49 @@
+import base64
+import collections
+import os
+import threading
+
+
+# a toast icon ready to be sent, see LGTV.register_icon()
+Icon = collections.namedtuple('Icon', ['data', 'extension'])
+
+
+class IconRegistry(object):
+    # Toast icons, base64 encoded once per file version. Icons are keyed by
+    # path, modification time and size, so an icon file changed on disk is
+    # encoded again. Only the max_icons most recently used are kept.
+
+    def __init__(self, max_icons=8):
+        # type: (int) -> None
+        self.max_icons = max_icons                  # type: int
+        self._icons = collections.OrderedDict()     # type: collections.OrderedDict
+        self._lock = threading.Lock()
+
+    def get(self, icon_file, file_extension=None):
+        # type: (str, str) -> Icon
+        # raises IOError/OSError if icon_file cannot be read
+        stat = os.stat(icon_file)
+        key = (icon_file, stat.st_mtime, stat.st_size, file_extension)
+        with self._lock:
+            icon = self._icons.pop(key, None)
+            if icon is not None:
+                # most recently used go last
+                self._icons[key] = icon
+                return icon
+
+        with open(icon_file, "rb") as f:
+            data = base64.b64encode(f.read()).decode("utf8")
+        if not file_extension:
+            file_extension = icon_file.split(".")[-1]
+        icon = Icon(data, file_extension.lower())
+
+        with self._lock:
+            self._icons[key] = icon
+            while len(self._icons) > self.max_icons:
+                self._icons.popitem(last=False)
+        return icon
+
+    def clear(self):
+        # type: () -> ()
+        with self._lock:
+            self._icons.clear()
@@ -1,3 +1,6 @@
+import json
+
+
 class DummyKeyManager(object):
     def load_client_key(self, host):
         # type: (str) -> str
@@ -7,6 +10,22 @@ class DummyKeyManager(object):
         # type: (str, str) -> ()
         pass
 
+    def load_timings(self, host):
+        # type: (str) -> dict
+        return None
+
+    def save_timings(self, host, timings):
+        # type: (str, dict) -> ()
+        pass
+
+    def load_discovered(self):
+        # type: () -> list
+        return None
+
+    def save_discovered(self, tvs):
+        # type: (list) -> ()
+        pass
+
 class SimpleKeyManager(object):
     def __init__(self, file_name):
         self.keyfile = file_name
@@ -26,3 +45,46 @@ class SimpleKeyManager(object):
         f = open(self.keyfile, 'w')
         f.write(key)
         f.close()
+
+    def load_timings(self, host):
+        # type: (str) -> dict
+        # timings of all TVs are stored next to the key, by host
+        try:
+            f = open(self.keyfile + '.timings', 'r')
+            timings = json.load(f)
+            f.close()
+            return timings.get(host)
+        except:
+            return None
+
+    def save_timings(self, host, timings):
+        # type: (str, dict) -> ()
+        try:
+            f = open(self.keyfile + '.timings', 'r')
+            all_timings = json.load(f)
+            f.close()
+        except:
+            all_timings = {}
+        if not isinstance(all_timings, dict):
+            all_timings = {}
+        all_timings[host] = timings
+        f = open(self.keyfile + '.timings', 'w')
+        json.dump(all_timings, f)
+        f.close()
+
+    def load_discovered(self):
+        # type: () -> list
+        # TVs found before, see DiscoveryCache
+        try:
+            f = open(self.keyfile + '.discovered', 'r')
+            tvs = json.load(f)
+            f.close()
+            return tvs
+        except:
+            return None
+
+    def save_discovered(self, tvs):
+        # type: (list) -> ()
+        f = open(self.keyfile + '.discovered', 'w')
+        json.dump(tvs, f)
+        f.close()
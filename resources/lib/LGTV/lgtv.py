@@ -6,9 +6,9 @@
 from __future__ import print_function, unicode_literals
 import json
 import socket
+import threading
 import time
 import uuid
-import base64
 
 ################################################################################
 # SHIPPED MODULES
@@ -22,8 +22,14 @@ from . import websocket  # LGPL
 ################################################################################
 # HELPER MODULES
 ################################################################################
+from .discovery import DiscoveredTV, DiscoveryCache, SSDPDiscovery, SSDPListener, confirm_webos, find_ips_by_mac, \
+    local_ipv4_addresses, neighbor_table, probe_webos, subnet_hosts, sweep_webos
 from .enums import *
+from .icons import Icon, IconRegistry
 from .keymanager import DummyKeyManager
+from .planner import TransitionPlanner
+from .state import StateCache
+from .timings import MenuTimings
 
 ################################################################################
 # PYTHON 2/3 COMPATIBILITY
@@ -50,8 +56,62 @@ except:
 # ACTUAL CODE
 ################################################################################
 
-class LGTV(object):
-    def __init__(self, key_manager=DummyKeyManager(), log=print):
+# seconds between polls of the 3D mode if the TV does not push updates
+MODE_POLL_INTERVAL = 0.1
+# how often set_3D_Mode() plans again before giving up
+MAX_3D_PLANS = 4
+# seconds to wait for a DIRECT_3D_ENDPOINT not known to work
+DIRECT_3D_PROBE_TIMEOUT = 2
+
+class _PendingResponse(object):
+    # Filled in by the reader thread for a request waiting in
+    # _send_command(). Offers the part of the Future interface
+    # _dispatch_response() uses, so AsyncLGTV can use real futures.
+    def __init__(self):
+        # type: () -> None
+        self._event = threading.Event()
+        self._response = None
+
+    def done(self):
+        # type: () -> bool
+        return self._event.is_set()
+
+    def set_result(self, response):
+        # type: (dict) -> ()
+        self._response = response
+        self._event.set()
+
+    def result(self, timeout=None):
+        # type: (float) -> dict
+        # None if the connection was closed or on timeout
+        self._event.wait(timeout)
+        return self._response
+
+
+class LGTVBase(object):
+    # State and protocol logic shared by LGTV and AsyncLGTV. Nothing in
+    # here talks to the TV directly: the subclasses do the I/O, blocking
+    # or as coroutines, and hand what the TV sent to these helpers.
+    # Discovery is blocking, AsyncLGTV runs it in an executor.
+
+    # Requests that might set the 3D pattern directly, as (ssap URI,
+    # payload for a pattern like 'top_bottom'). None of them is documented,
+    # so they are probed in this order and the first one that makes the TV
+    # report the pattern is remembered per TV (see MenuTimings).
+    DIRECT_3D_ENDPOINTS = [
+        ("ssap://com.webos.service.tv.display/set3DPattern", lambda pattern: {'pattern': pattern}),
+        ("ssap://com.webos.service.tv.display/set3DOn", lambda pattern: {'pattern': pattern})
+        # not ssap://settings/setSystemSettings, probing it might change
+        # persistent picture settings
+    ]
+
+    # actions of _3D_plan_actions() besides TransitionSteps
+    _PRESS_ARROWS = "press_arrows"
+    _STEP_ARROWS = "step_arrows"
+    _RECONNECT_POINTER = "reconnect_pointer"
+    _PLAN_DONE = "done"
+
+    def __init__(self, key_manager=DummyKeyManager(), log=print, enable_compression=False):
         # type: () -> None
         self.last_host = None           # type: str
         self.wsocket = None             # type: websocket.WebSocket
@@ -62,6 +122,39 @@ class LGTV(object):
         self.is_paired = False          # type: bool
         self.log = log                  # type: (...) -> ()
         self.key_manager = key_manager  # type: DummyKeyManager compatible class
+        self.enable_compression = enable_compression  # type: bool
+        # seconds to wait for the response to a request
+        self.response_timeout = 10      # type: float
+        # requests waiting for their response by message id. Responses are
+        # received by the reader thread or task, so several requests can be
+        # in flight on one connection.
+        self._pending = {}              # type: dict
+        # callbacks of subscriptions by message id
+        self._subscriptions = {}        # type: dict
+        self._reader = None             # reads responses, see _start_reader()
+        self._msg_id_lock = threading.Lock()
+        # 3D status as pushed by the TV, see _watch_3D_Mode()
+        self._3D_Mode_subscription = None       # type: str
+        self._reported_3D_Mode = Display3dMode.ERROR  # type: Display3dMode
+        self._3D_Mode_reports = 0               # type: int
+        # 3D menu timing of the TV at last_host
+        self.timings = MenuTimings()    # type: MenuTimings
+        # mode the TV switches to when enabling 3D, None if unknown
+        self._last_3D_Mode = None       # type: Display3dMode
+        # how 3D modes are switched, set its options to what the TV supports
+        self.planner = TransitionPlanner()  # type: TransitionPlanner
+        # recently confirmed 3D mode, volume and input, see StateCache.ttl
+        self.state = StateCache()       # type: StateCache
+        # encoded toast icons
+        self.icons = IconRegistry()     # type: IconRegistry
+        # TVs found before, loaded on first discovery
+        self.discovered = None          # type: DiscoveryCache
+        # IPs whose MAC address _record_mac() found
+        self._mac_ips = set()           # type: set
+        # see _start_listener()
+        self._listener = None           # type: SSDPListener
+        self._announced_host = None     # type: str
+        self._announced_app_name = None # type: str
 
     def is_connected(self):
         # type: () -> bool
@@ -75,9 +168,43 @@ class LGTV(object):
             return False
         return self.pointer_socket.connected
 
-    def discover_ip(self, tries=5, timeout=3):
-        # type: (int) -> str
+    def _discover_ip(self, tries, timeout, host, probe_timeout, progress):
+        # type: (int, float, str, float, (int, int) -> bool) -> str
+        # blocking, see LGTV.discover_ip
+        cache = self._discovery_cache()
+        # not any other TV found before if host is down
+        candidates = [host] if host else cache.ips()
+        if candidates:
+            ip = probe_webos(candidates, probe_timeout)
+            if ip is not None:
+                self.log("TV at", ip, "is reachable, skipping SSDP")
+                cache.touch(ip)
+                self._save_discovery_cache()
+                return ip
+
+        ip = self._find_moved_tv(candidates, probe_timeout, host)
+        if ip is not None:
+            return ip
+
+        if host:
+            tvs = self._discover_tvs(tries, timeout, stop_at=[host])
+        else:
+            tvs = self._discover_tvs(tries, timeout, limit=1)
+        if not tvs:
+            self.log("Didn't find TV using SSDP, sweeping local networks")
+            tvs = self._sweep_tvs(progress=progress)
+        if not tvs:
+            self.log("Didn't find TV")
+            return None
+
+        tv = tvs[0]
+        if host in [t.ip for t in tvs]:
+            tv = tvs[[t.ip for t in tvs].index(host)]
+        self.log("Found TV at", tv.ip)
+        return tv.ip
 
+    def _discover_tvs(self, tries, timeout, stop_at=None, limit=None):
+        # type: (int, float, list, int) -> list
         if tries < 1:
             raise ValueError("tries has to be >= 1")
 
@@ -91,66 +218,101 @@ class LGTV(object):
             self.log("Timeout too big, reset to 120 seconds")
             timeout = 120
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(timeout)
-        sock.bind(("", 0)) # bind to random free port
-
-        address = None
-        i = 0
-        for i in range(tries):
-            if address is not None:
-                break
-            self._send_ssdp_discover(sock, timeout - 1, i + 1)
-
-            while True:
-                # get every response to our search datagram
-                try:
-                    data, addr = sock.recvfrom(1024) # actual message size should be way below 1024 byte.
-                    if str2bytes("WebOS") in data or str2bytes("LG Smart TV") in data:
-                        address = addr
-                        break
-                except:
-                    # probably timeout, break response-reading loop
-                    break
-
-        if address is None:
-            self.log("Didn't find TV using SSDP")
+        tvs = SSDPDiscovery(self.log).discover(timeout, tries, stop_at, limit)
+        cache = self._discovery_cache()
+        for tv in reversed(tvs):
+            cache.add(tv)
+        self._save_discovery_cache()
+        return tvs
+
+    def _sweep_tvs(self, timeout=0.5, concurrency=64, progress=None):
+        # type: (float, int, (int, int) -> bool) -> list
+        start = time.time()
+        hosts = []
+        local_addresses = local_ipv4_addresses()
+        for address in local_addresses:
+            hosts.extend(ip for ip in subnet_hosts(address) if ip not in hosts and ip not in local_addresses)
+        self.log("Probing", len(hosts), "addresses")
+
+        tvs = []
+        for ip in sweep_webos(hosts, timeout, concurrency, progress):
+            if confirm_webos(ip, 2 * timeout):
+                self.log("Found TV at", ip)
+                tvs.append(DiscoveredTV(ip, '', '', time.time() - start))
+            else:
+                self.log("Port 3000 open at", ip, "but no WebSocket server")
+        cache = self._discovery_cache()
+        for tv in reversed(tvs):
+            cache.add(tv)
+        self._save_discovery_cache()
+        return tvs
+
+    def _find_moved_tv(self, unreachable, timeout, host=None):
+        # type: (list, float, str) -> str
+        # IP of a TV found before that accepts connections at another IP
+        # now, None if there is none. Only the TV last seen at host is
+        # looked for if host is given, so no other TV is taken for it.
+        macs = self._discovery_cache().macs()
+        if host:
+            macs = dict((mac, ip) for mac, ip in macs.items() if ip == host)
+        if not macs:
             return None
-
-        self.log("Found TV at", address[0])
-        return address[0] # IP
-
-    def _send_ssdp_discover(self, sock, response_timeout=2, try_no=None):
-        # type: (socket._socketobject, int) -> ()
-        # see http://developer.lgappstv.com/TV_HELP/index.jsp?topic=%2Flge.tvsdk.references.book%2Fhtml%2FUDAP%2FUDAP%2FM+SEARCH+Request.htm
-        # for M-SEARCH request description
-
-        host = "239.255.255.250"
-        port = 1900
-
-        # according to above document, 1 <= MX <= 4 should hold.
-        # however, UPnP spec says
-        # "MX: Maximum wait time in seconds. Should be between 1 and 120 inclusive. Device responses should be delayed a
-        #      random duration between 0 and this many seconds to balance load for the control point when it processes responses.
-        #      This value may be increased if a large number of devices are expected to respond."
-        # (source: http://www.upnp.org/specs/arch/UPnP-arch-DeviceArchitecture-v1.0-20080424.pdf)
-        # Therefore, we'll just choose 2 as default.
-
-        message = (
-            "M-SEARCH * HTTP/1.1\r\n" +
-            "HOST: 239.255.255.250:1900\r\n" +
-            'MAN: "ssdp:discover"\r\n' +
-            "MX: " + str(response_timeout) + "\r\n" +
-            "ST: urn:dial-multiscreen-org:service:dial:1\r\n" +
-            "USER-AGENT: UDAP/2.0\r\n\r\n") # close with double \r\n
-        # according to LG, USER-AGENT is required (everything except UDAP/2.0 can be omitted)
-        # (although my TV responds even when USER-AGENT is missing completely...)
-
-        if try_no is None:
-            self.log("Sending SSDP search message")
-        else:
-            self.log("Sending SSDP search message, try", try_no)
-        sock.sendto(str2bytes(message), (host, port))
+        moved = find_ips_by_mac(list(macs.keys()), unreachable, 2 * timeout)
+        if not moved:
+            return None
+        ip = probe_webos(list(moved.values()), timeout)
+        if ip is None:
+            return None
+        for mac, new_ip in moved.items():
+            if new_ip == ip:
+                self.log("TV moved from", macs[mac], "to", ip)
+                self.discovered.set_mac(ip, mac)
+                self._save_discovery_cache()
+        return ip
+
+    def _needs_mac(self, host):
+        # type: (str) -> bool
+        # whether _record_mac() has not found the MAC address of the TV at
+        # host yet. It is looked up once per run, so a changed IP -> MAC
+        # mapping is noticed.
+        return host[len("ws://"):].rsplit(":", 1)[0] not in self._mac_ips
+
+    def _record_mac(self, host):
+        # type: (str) -> ()
+        # remembers the MAC address of the TV at host, if it is in the
+        # local network, so it can be found again when its IP changes.
+        # Reads the neighbor table, which might run "ip neigh".
+        ip = host[len("ws://"):].rsplit(":", 1)[0]
+        try:
+            mac = neighbor_table().get(ip)
+        except Exception as e:
+            self.log("Could not read neighbor table:", str(e))
+            return
+        if mac is None:
+            return
+        self._mac_ips.add(ip)
+        self._discovery_cache().set_mac(ip, mac)
+        # saves only if something changed
+        self._save_discovery_cache()
+
+    def _discovery_cache(self):
+        # type: () -> DiscoveryCache
+        if self.discovered is None:
+            # key managers without discovery support are fine
+            load = getattr(self.key_manager, 'load_discovered', None)
+            self.discovered = DiscoveryCache.from_list(load() if load is not None else None)
+        return self.discovered
+
+    def _save_discovery_cache(self):
+        # type: () -> ()
+        save = getattr(self.key_manager, 'save_discovered', None)
+        if not self.discovered.changed or save is None:
+            return
+        try:
+            save(self.discovered.to_list())
+            self.discovered.changed = False
+        except Exception as e:
+            self.log("Could not save discovered TVs:", str(e))
 
     @staticmethod
     def _sanitize_host_string(host):
@@ -211,74 +373,65 @@ class LGTV(object):
 
         return json.dumps(pairing_request)
 
-    def connect(self, host, app_name="Python Remote", connect_input_pointer=True):
-        # type: (str) -> bool
-        if self.is_connected():
-            return True
-
-        if self.wsocket is not None and self.wsocket.connected:
-            self.wsocket.close()
-        self._disconnect_input_pointer()
-
+    def _begin_session(self, host):
+        # type: (str) -> str
+        # returns the sanitized host or None if host is invalid
         self.is_paired = False
 
         if not isinstance(host, basestring):
             self.log("host is no instance of str: '" + str(host) + "'")
-            return False
+            return None
 
         host = self._sanitize_host_string(host)
         self.log("Connecting to", host)
+        if host != self.last_host:
+            self.timings = self._load_timings(host)
+            self._last_3D_Mode = None
+        self.state.clear()
         self.last_host = host
 
         # some prefix made of 6 hex chars from a random UUID
         self.random_prefix = uuid.uuid4().hex[:6] + "_"
         self.command_counter = 0
+        return host
 
-        msg_id = self.random_prefix + str(self.command_counter)
-        self.command_counter += 1
-
-        self.wsocket = websocket.create_connection(host)
+    def _next_msg_id(self):
+        # type: () -> str
+        with self._msg_id_lock:
+            msg_id = self.random_prefix + str(self.command_counter)
+            self.command_counter += 1
+        return msg_id
 
+    def _prepare_pairing_request(self, host, msg_id, app_name):
+        # type: (str, str, str) -> str
         self.pairing_key = self.key_manager.load_client_key(host)
         if self.pairing_key is None:
             self.log("Pairing without key...")
         else:
             self.log("Pairing with key", self.pairing_key)
 
-        pairing_request = self._generate_pairing_request(msg_id, app_name, self.pairing_key)
-        self.wsocket.send(pairing_request)
+        return self._generate_pairing_request(msg_id, app_name, self.pairing_key)
 
+    def _decode_pairing_response(self, received, msg_id, description):
+        # type: (str, str, str) -> dict
+        # returns the decoded response or None if it is unusable
         try:
-            received = self.wsocket.recv()
             response = json.loads(received)
         except Exception as e:
-            self.log("Could not decode response '" + str(received) + "' received after sending pairing request:" + str(e))
-            return False
+            self.log("Could not decode response '" + str(received) + "' " + description + ":" + str(e))
+            return None
 
         if response.get('id') != msg_id:
             self.log("Expected response with ID", msg_id, "but got", response.get('id'))
-            return False
+            return None
         if 'payload' not in response or not isinstance(response['payload'], dict):
             self.log("payload missing in response")
-            return False
-
-        if 'pairingType' in response['payload']:
-            # not paired yet, next message will be pairing status
-            # so load another message
-            try:
-                received = self.wsocket.recv()
-                response = json.loads(received)
-            except Exception as e:
-                self.log("Could not decode response '" + str(received) + "' received as second message after sending pairing request:" + str(e))
-                return False
+            return None
 
-        if response.get('id') != msg_id:
-            self.log("Expected response with ID", msg_id, "but got", response.get('id'))
-            return False
-        if 'payload' not in response or not isinstance(response['payload'], dict):
-            self.log("payload missing in response")
-            return False
+        return response
 
+    def _finish_pairing(self, host, response):
+        # type: (str, dict) -> bool
         if response.get('type') in [None, 'error']: # type missing or {"type": "error"}
             if 'error' in response:
                 self.log("Connect failed:", response['error'])
@@ -297,6 +450,531 @@ class LGTV(object):
             self.key_manager.save_client_key(host, self.pairing_key)
 
         self.is_paired = True
+        return True
+
+    def stop_listening(self):
+        # type: () -> ()
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def _start_listener(self, host, app_name):
+        # type: (str, str) -> bool
+        # see LGTV.start_listening, the subclasses handle the announcements
+        # in _on_tv_alive() and _on_tv_byebye().
+        self.stop_listening()
+        self._announced_host = self._sanitize_host_string(host)
+        self._announced_app_name = app_name
+        self._listener = SSDPListener(self._on_tv_alive, self._on_tv_byebye, self.log)
+        return self._listener.start()
+
+    def _is_announced_tv(self, tv):
+        # type: (DiscoveredTV) -> bool
+        return self._announced_host is not None and self._sanitize_host_string(tv.ip) == self._announced_host
+
+    def _dispatch_response(self, received, pending, subscriptions):
+        # type: (str, dict, dict) -> ()
+        try:
+            response = json.loads(received)
+        except Exception as e:
+            self.log("Could not decode message '" + str(received) + "' received from TV:", str(e))
+            return
+
+        msg_id = response.get('id')
+        callback = subscriptions.get(msg_id)
+        if callback is not None:
+            # the first response to a subscription is delivered as well,
+            # before subscribe() returns.
+            try:
+                callback(*self._parse_response(response))
+            except Exception as e:
+                self.log("Subscription callback for", msg_id, "failed:", str(e))
+
+        waiter = pending.pop(msg_id, None)
+        if waiter is None:
+            if callback is None:
+                # e.g. a late response to a request that timed out
+                self.log("Dropping response with unknown ID", msg_id)
+            return
+        if not waiter.done():
+            waiter.set_result(response)
+
+    @staticmethod
+    def _fail_pending(pending):
+        # type: (dict) -> ()
+        # wake up all requests still waiting on a closed connection
+        while pending:
+            try:
+                _, waiter = pending.popitem()
+            except KeyError:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _parse_pointer_socket_path(self, success, payload):
+        # type: (bool, Any) -> str
+        if not success:
+            self.log("Could not connect to InputPointer socket:", payload)
+            return None
+        if 'socketPath' not in payload:
+            self.log("Could not connect to InputPointer socket: socketPath is missing in payload")
+            return None
+        return payload['socketPath']
+
+    def _make_request(self, uri, payload=None, msg_type='request'):
+        # type: (str, Any, str) -> (str, str)
+        # returns message id and the encoded request
+        msg_id = self._next_msg_id()
+
+        msg = {
+            'id': msg_id,
+            'type': msg_type,
+            'uri': uri
+        }
+        if payload is not None:
+            msg['payload'] = payload
+
+        return msg_id, json.dumps(msg)
+
+    @staticmethod
+    def _parse_response(response):
+        # type: (dict) -> (bool, Any)
+        if response.get('type') == 'error':
+            return (False, response['error'])
+
+        if 'payload' not in response:
+            return (False, "payload missing in response")
+
+        if not isinstance(response['payload'], dict):
+            return (False, "payload is no dictionary")
+
+        return (True, response['payload'])
+
+    def _parse_responses(self, responses):
+        # type: (list) -> list
+        # like _parse_response() for each response of _exchange()
+        results = []
+        for response in responses:
+            if response is not None:
+                results.append(self._parse_response(response))
+            elif self.is_connected():
+                results.append((False, "No response from TV within " + str(self.response_timeout) + " seconds"))
+            else:
+                results.append((False, "Connection closed by server"))
+        return results
+
+    def register_icon(self, icon_file, file_extension=None):
+        # type: (str, str) -> (bool, Any)
+        # Encodes icon_file ahead of time. Returns (True, icon) to be passed
+        # as toast(..., icon=icon), which then needs no file access at all.
+        try:
+            return (True, self.icons.get(icon_file, file_extension))
+        except Exception as e:
+            return (False, "Encoding icon failed: " + str(e))
+
+    def _toast_payload(self, msg, icon_file=None, file_extension=None, icon_base64=None, icon=None):
+        # type: (str, str, str, str, Icon) -> (bool, Any)
+        # icon should be approx. 80x80 pixels, bigger icons might be
+        # ignored (resulting in blank toast icons) or the toast might fail
+        # completely. PNG and JPG have been successfully tested.
+        #
+        # A registered icon takes precedence, then icon_base64 if file_extension
+        # is given, otherwise icon_file is used, using the file's extension if
+        # file_extension is empty. Icon files are only encoded again when
+        # they changed (see IconRegistry).
+        if len(msg) > 60:
+            self.log("Warning: Toast message is longer than 60 chars")
+
+        if isinstance(icon, Icon):
+            encoded_icon, file_extension = icon
+        elif isinstance(icon_base64, basestring) and isinstance(file_extension, basestring):
+            encoded_icon = icon_base64
+        elif isinstance(icon_file, basestring):
+            success, result = self.register_icon(icon_file, file_extension)
+            if not success:
+                return (False, result)
+            encoded_icon, file_extension = result
+        else:
+            encoded_icon = None
+
+        payload = {
+            # see https://webos-devrel.github.io/webOS.js/notification.js.html
+            # for additional information
+            'message': msg
+        }
+
+        if encoded_icon:
+            payload['iconData'] = encoded_icon
+            payload['iconExtension'] = file_extension.lower()
+
+        return (True, payload)
+
+    def _parse_3D_Mode(self, success, payload):
+        # type: (bool, Any) -> Display3dMode
+        # every reported mode, queried or pushed, ends up here
+        if not success:
+            self.log("get_3D_Mode: Could not get current 3D mode:", payload)
+            self.state.invalidate(StateCache.MODE_3D)
+            return Display3dMode.ERROR
+        mode = Display3dMode.from_string(payload.get('status3D', {}).get('pattern'))
+        if mode == Display3dMode.ERROR:
+            self.state.invalidate(StateCache.MODE_3D)
+        else:
+            self.state.set(StateCache.MODE_3D, mode)
+        if mode > Display3dMode.OFF:
+            self._last_3D_Mode = mode
+        return mode
+
+    def _direct_3D_endpoints(self, mode, current_mode):
+        # type: (Display3dMode, Display3dMode) -> list
+        # The remembered or, if not probed yet, all DIRECT_3D_ENDPOINTS
+        # worth trying to switch from current_mode to mode.
+        direct_3D_uri = self.timings.direct_3D_uri
+        if direct_3D_uri == "":
+            # probed before, the TV has none
+            return []
+        if direct_3D_uri is None:
+            if current_mode == Display3dMode.OFF and self._last_3D_Mode in (None, mode):
+                # an endpoint ignoring the pattern would just enable 3D and
+                # look like working, probe another time.
+                return []
+            return [e for e in self.DIRECT_3D_ENDPOINTS if e[0] not in self.timings.failed_direct_3D_uris]
+        return [e for e in self.DIRECT_3D_ENDPOINTS if e[0] == direct_3D_uri]
+
+    def _record_direct_3D_result(self, uri, duration=None):
+        # type: (str, float) -> ()
+        # uri switched the mode within duration seconds, None if none of
+        # the _direct_3D_endpoints() did
+        direct_3D_uri = self.timings.direct_3D_uri
+        if uri is not None:
+            self.timings.record_mode_switch(duration)
+            if direct_3D_uri is None:
+                self.log("Setting 3D pattern directly via", uri)
+            self.timings.record_direct_3D_uri(uri)
+        elif direct_3D_uri is None:
+            if any(e[0] not in self.timings.failed_direct_3D_uris for e in self.DIRECT_3D_ENDPOINTS):
+                # cut short, the others are probed next time
+                return
+            self.log("Setting 3D pattern directly is not supported, using the 3D menu")
+            self.timings.record_direct_3D_uri("")
+        else:
+            # worked before (firmware update?), probe again next time
+            self.log("Setting 3D pattern directly via", direct_3D_uri, "failed, using the 3D menu")
+            self.timings.record_direct_3D_uri(None)
+
+    def _3D_plan_actions(self, mode, current_mode):
+        # type: (Display3dMode, Display3dMode) -> generator
+        # Follows the cheapest plan of self.planner from current_mode to
+        # mode and plans again whenever the TV reports something
+        # unexpected. Does no I/O itself but yields (action, argument,
+        # menu_open) and expects the outcome of each action to be sent in:
+        #   CLOSE_MENU, None: click, the outcome is ignored
+        #   DISABLE_3D or ENABLE_3D, None: (success, reported mode)
+        #   OPEN_MENU, current mode: reported mode
+        #   _PRESS_ARROWS, (presses, current mode, expected mode, settling):
+        #       reported mode
+        #   _STEP_ARROWS, (presses, current mode, settling): reported mode,
+        #       the arrows are pressed one at a time
+        #   _RECONNECT_POINTER, None: whether reconnecting succeeded
+        #   _PLAN_DONE, (bool, Any): the result, nothing is sent in
+        # menu_open is whether the 3D menu is or might become open, settling
+        # whether it was just opened and might not take arrows yet.
+        if current_mode == Display3dMode.OFF:
+            state = (current_mode, False, self._last_3D_Mode)
+        else:
+            state = (current_mode, False, current_mode)
+        # in case the input pointer socket times out (which we cannot check reliably),
+        # sending RemoteButton.MODE_3D will not have any effect.
+        # Therefore, if this happens, we will reconnect the socket and try again _once_.
+        had_pointer_error = False
+        # once arrows sent in a row got lost, they are pressed one at a time
+        stepping = False
+        settling = False
+
+        for _ in range(MAX_3D_PLANS):
+            if state[0] == mode and not state[1]:
+                break
+            steps = self.planner.plan(state, mode, self.timings.step_costs())
+            if not steps:
+                for action in self._abort_3D_plan(state, "No way to switch from " + Display3dMode.to_string(state[0]) + " to " + Display3dMode.to_string(mode) + "."):
+                    yield action
+                return
+
+            i = 0
+            while i < len(steps):
+                step = steps[i]
+                presses = [step]
+                while step in (TransitionStep.LEFT, TransitionStep.RIGHT) and \
+                        i + len(presses) < len(steps) and steps[i + len(presses)] in (TransitionStep.LEFT, TransitionStep.RIGHT):
+                    presses.append(steps[i + len(presses)])
+                i += len(presses)
+                expected = state
+                for press in presses:
+                    expected = self.planner.apply(expected, press)
+                menu_open = state[1] or expected[1]
+
+                if step == TransitionStep.CLOSE_MENU:
+                    yield (step, None, menu_open)
+                    state = expected
+                    continue
+                if step in (TransitionStep.DISABLE_3D, TransitionStep.ENABLE_3D):
+                    success, reported = yield (step, None, menu_open)
+                elif step == TransitionStep.OPEN_MENU:
+                    success, reported = True, (yield (step, state[0], menu_open))
+                    settling = True
+                elif stepping:
+                    success, reported = True, (yield (self._STEP_ARROWS, (presses, state[0], settling), menu_open))
+                    settling = False
+                else:
+                    success, reported = True, (yield (self._PRESS_ARROWS, (presses, state[0], expected[0], settling), menu_open))
+                    settling = False
+
+                if not success:
+                    for action in self._abort_3D_plan(state, "Could not " + step.replace("_", " ") + ": " + str(reported)):
+                        yield action
+                    return
+                if reported == Display3dMode.ERROR:
+                    for action in self._abort_3D_plan(state, "Could not get current 3D mode. Something went wrong."):
+                        yield action
+                    return
+                if reported == expected[0] or (expected[0] is None and reported != Display3dMode.OFF):
+                    if expected[0] is None:
+                        # 3D was enabled in the formerly unknown last 3D mode
+                        expected = (reported, expected[1], reported)
+                    state = expected
+                    if had_pointer_error and step == TransitionStep.OPEN_MENU:
+                        self.log("Sending 3D remote button succeeded after reconnecting input pointer socket.")
+                        had_pointer_error = False
+                    continue
+
+                # the TV did something else than planned
+                if step == TransitionStep.OPEN_MENU and reported == Display3dMode.OFF:
+                    if had_pointer_error:
+                        yield (self._PLAN_DONE, (False, "Sending 3D remote button resulted in 3D turned off, even after reconnecting input pointer socket."), False)
+                        return
+                    # reconnect input pointer since it probably timed out
+                    self.log("Sending 3D remote button resulted in 3D turned off. Trying to reconnect input pointer socket.")
+                    if not (yield (self._RECONNECT_POINTER, None, False)):
+                        yield (self._PLAN_DONE, (False, "Failed to reconnect input pointer socket after sending 3D remote button failed."), False)
+                        return
+                    had_pointer_error = True
+                elif step in (TransitionStep.LEFT, TransitionStep.RIGHT):
+                    if reported == Display3dMode.OFF:
+                        # shouldn't happen?!
+                        for action in self._abort_3D_plan(state, "Sending remote button sequence resulted in 3D turned off."):
+                            yield action
+                        return
+                    if stepping and reported == state[0]:
+                        # the TV does not react to presses any more, give up
+                        for action in self._abort_3D_plan(state, "Sending remote buttons resulted in mode " + Display3dMode.to_string(reported) + " but mode " + Display3dMode.to_string(expected[0]) + " was expected."):
+                            yield action
+                        return
+                    state = (reported, True, reported)
+                    stepping = True
+                elif reported == Display3dMode.OFF:
+                    state = (reported, False, state[2])
+                else:
+                    state = (reported, False, reported)
+                # plan again from the reported state
+                break
+
+        if state[0] == mode and not state[1]:
+            yield (self._PLAN_DONE, (True, ""), False)
+            return
+        for action in self._abort_3D_plan(state, "Could not switch to mode " + Display3dMode.to_string(mode) + ", TV is in mode " + Display3dMode.to_string(state[0]) + "."):
+            yield action
+
+    def _record_3D_Mode_arrows(self, current_mode, mode, reported, settling):
+        # type: (Display3dMode, Display3dMode, Display3dMode, bool) -> ()
+        # Learns from arrows pressed in a row to get from current_mode to
+        # mode. If none of them registered right after the menu opened,
+        # the menu was not settled yet, which says nothing about pacing.
+        if reported in (Display3dMode.OFF, Display3dMode.ERROR):
+            return
+        if settling:
+            self.timings.record_menu_settle(reported != current_mode)
+            if reported == current_mode:
+                return
+        self.timings.record_arrow_sequence(reported == mode)
+
+    def _abort_3D_plan(self, state, message):
+        # type: (tuple, str) -> list
+        # actions of _3D_plan_actions() giving up in state
+        actions = [(TransitionStep.CLOSE_MENU, None, True)] if state[1] else []
+        return actions + [(self._PLAN_DONE, (False, message), False)]
+
+    def _load_timings(self, host):
+        # type: (str) -> MenuTimings
+        # key managers without timing support are fine
+        load = getattr(self.key_manager, 'load_timings', None)
+        timings = load(host) if load is not None else None
+        if not isinstance(timings, dict):
+            return MenuTimings()
+        return MenuTimings.from_dict(timings)
+
+    def _save_timings(self):
+        # type: () -> ()
+        save = getattr(self.key_manager, 'save_timings', None)
+        if not self.timings.changed or save is None or self.last_host is None:
+            return
+        try:
+            save(self.last_host, self.timings.to_dict())
+            self.timings.changed = False
+        except Exception as e:
+            self.log("Could not save timings:", str(e))
+
+    @staticmethod
+    def _button_command(button):
+        # type: (RemoteButton) -> str
+        return "type:button\nname:" + button + "\n\n"
+
+    @classmethod
+    def _button_steps(cls, sequence, pacing):
+        # type: (list, float) -> list
+        # input commands of each step of a send_buttons() sequence
+        steps = [[step] if isinstance(step, basestring) else list(step) for step in sequence]
+        if not pacing:
+            steps = [sum(steps, [])]
+        return [[cls._button_command(button) for button in step] for step in steps if step]
+
+    @staticmethod
+    def _parse_inputs(success, payload):
+        # type: (bool, Any) -> (bool, Any)
+        if not success:
+            return (False, payload)
+        if 'devices' not in payload:
+            return (False, "devices missing in payload")
+
+        # polish the list
+        devices = payload['devices']
+        result = {}
+
+        for dev in devices:
+            if 'id' not in dev:
+                continue
+            result[dev['id']] = {
+                'icon': dev.get('icon', 'MISSING'),
+                'label': dev.get('label', 'MISSING'),
+                'favorite': dev.get('favorite', False)
+            }
+
+        return (success, result)
+
+    def get_input(self):
+        # type: () -> str
+        # input last switched to with set_input(), None if not within
+        # state.ttl. The TV offers no way to query it.
+        return self.state.get(StateCache.INPUT)
+
+    def _parse_volume(self, success, payload):
+        # type: (bool, Any) -> (bool, int)
+        if not success:
+            return (False, -2)
+
+        if 'volume' in payload:
+            self.state.set(StateCache.VOLUME, payload['volume'])
+            return (True, payload['volume'])
+        return (False, -2)
+
+
+class LGTV(LGTVBase):
+    # Talks to the TV with blocking calls. Responses are received by a
+    # reader thread, so commands can be sent from several threads at once.
+
+    def __init__(self, key_manager=DummyKeyManager(), log=print, enable_compression=False):
+        # type: () -> None
+        # enable_compression offers permessage-deflate to the TV, which saves
+        # bandwidth for toast icons and long lists if the TV supports it.
+        LGTVBase.__init__(self, key_manager, log, enable_compression)
+        self._reader = None             # type: threading.Thread
+        # notified whenever the TV pushes a 3D status update
+        self._3D_Mode_changed = threading.Condition()
+        # connections are also made from the SSDP listener thread
+        self._connect_lock = threading.RLock()
+
+    def discover_ip(self, tries=5, timeout=3, host=None, probe_timeout=1.0, progress=None):
+        # type: (int, float, str, float, (int, int) -> bool) -> str
+        # IP of the TV that answered first (host if it answered), None if
+        # none answered within timeout seconds. host, or the TVs found
+        # before if host is None, are probed first (see probe_webos()), SSDP
+        # is only used if none of them accepts connections within
+        # probe_timeout seconds.
+        # Next, the TV last seen at host (any TV found before if host is
+        # None) is looked up by its MAC address in case it got another IP
+        # (see find_ips_by_mac()). If SSDP finds nothing either, the local
+        # networks are swept, see sweep_tvs() for progress. See
+        # discover_tvs().
+        return self._discover_ip(tries, timeout, host, probe_timeout, progress)
+
+    def discover_tvs(self, tries=5, timeout=3, stop_at=None, limit=None):
+        # type: (int, float, list, int) -> list
+        # Searches all local interfaces at once and returns a DiscoveredTV
+        # (ip, usn, server, response_time) for every TV that answered within
+        # timeout seconds. The search message is sent tries times within
+        # that window. Returns early once a TV with an IP in stop_at
+        # answered or limit TVs answered.
+        return self._discover_tvs(tries, timeout, stop_at, limit)
+
+    def sweep_tvs(self, timeout=0.5, concurrency=64, progress=None):
+        # type: (float, int, (int, int) -> bool) -> list
+        # Fallback for networks blocking multicast: connects to port 3000
+        # of every host in the /24 networks of the local interfaces (see
+        # sweep_webos() for the arguments) and returns a DiscoveredTV
+        # without USN and server for each that accepts a WebSocket
+        # connection. Takes about 254 / concurrency * timeout seconds.
+        return self._sweep_tvs(timeout, concurrency, progress)
+
+    def connect(self, host, app_name="Python Remote", connect_input_pointer=True):
+        # type: (str) -> bool
+        with self._connect_lock:
+            return self._connect(host, app_name, connect_input_pointer)
+
+    def _connect(self, host, app_name, connect_input_pointer):
+        # type: (str, str, bool) -> bool
+        if self.is_connected():
+            return True
+
+        self._close_wsocket()
+        self._disconnect_input_pointer()
+
+        host = self._begin_session(host)
+        if host is None:
+            return False
+        msg_id = self._next_msg_id()
+
+        # requests may be sent from several threads
+        self.wsocket = websocket.create_connection(host, enable_compression=self.enable_compression,
+                                                   enable_multithread=True)
+
+        pairing_request = self._prepare_pairing_request(host, msg_id, app_name)
+        self.wsocket.send(pairing_request)
+
+        try:
+            received = self.wsocket.recv()
+        except Exception as e:
+            self.log("Could not receive response after sending pairing request:", str(e))
+            return False
+        response = self._decode_pairing_response(received, msg_id, "received after sending pairing request")
+        if response is None:
+            return False
+
+        if 'pairingType' in response['payload']:
+            # not paired yet, next message will be pairing status
+            # so load another message
+            try:
+                received = self.wsocket.recv()
+            except Exception as e:
+                self.log("Could not receive second message after sending pairing request:", str(e))
+                return False
+            response = self._decode_pairing_response(received, msg_id, "received as second message after sending pairing request")
+            if response is None:
+                return False
+
+        if not self._finish_pairing(host, response):
+            return False
+        self._start_reader()
+        if self._needs_mac(host):
+            self._record_mac(host)
 
         if connect_input_pointer:
             # finally connect to InputPointer socket
@@ -309,12 +987,119 @@ class LGTV(object):
         self._disconnect_input_pointer()
 
         self.is_paired = False
+        self._close_wsocket()
+
+    def start_listening(self, host, app_name="Python Remote"):
+        # type: (str, str) -> bool
+        # Listens for SSDP announcements (see SSDPListener): connects as
+        # soon as the TV at host comes online, so the first command after
+        # switching it on does not wait for the connection, and drops the
+        # connection when the TV goes offline. False if the announcements
+        # cannot be received.
+        return self._start_listener(host, app_name)
+
+    def _on_tv_alive(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # runs in the listener thread
+        if self._is_announced_tv(tv):
+            self._connect_announced_tv(tv)
+
+    def _on_tv_byebye(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # runs in the listener thread
+        if self._is_announced_tv(tv):
+            self._drop_connection(tv)
+
+    def _connect_announced_tv(self, tv):
+        # type: (DiscoveredTV) -> ()
+        if self.is_connected():
+            return
+        self.log("TV at", tv.ip, "came online, connecting")
+        try:
+            if not self.connect(self._announced_host, self._announced_app_name):
+                self.log("Connecting to TV at", tv.ip, "after it came online failed")
+                return
+        except Exception as e:
+            self.log("Connecting to TV at", tv.ip, "after it came online failed:", str(e))
+            return
+        # ready for the first 3D switch
+        self._watch_3D_Mode()
+
+    def _drop_connection(self, tv):
+        # type: (DiscoveredTV) -> ()
+        # The TV went offline, close the connection without waiting for
+        # it. Pending requests fail and the next one reconnects.
+        with self._connect_lock:
+            if self.wsocket is None and self.pointer_socket is None:
+                return
+            self.log("TV at", tv.ip, "went offline, dropping connection")
+            wsocket, self.wsocket = self.wsocket, None
+            pointer_socket, self.pointer_socket = self.pointer_socket, None
+            self._reader = None
+            self.is_paired = False
+            self.state.clear()
+        for sock in (wsocket, pointer_socket):
+            if sock is None:
+                continue
+            try:
+                # wakes up the reader thread
+                sock.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            sock.shutdown()
 
-        if not self.is_connected():
+    def _start_reader(self):
+        # type: () -> ()
+        # subscriptions end with the connection
+        self._pending = {}
+        self._subscriptions = {}
+        self._3D_Mode_subscription = None
+        self._reader = threading.Thread(target=self._read_responses,
+                                        args=(self.wsocket, self._pending, self._subscriptions))
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_responses(self, wsocket, pending, subscriptions):
+        # type: (websocket.WebSocket, dict, dict) -> ()
+        # runs in the reader thread until the connection is closed
+        while True:
+            try:
+                received = wsocket.recv()
+            except Exception as e:
+                if wsocket.connected:
+                    self.log("Receiving from TV failed:", str(e))
+                received = ""
+            if len(received) == 0:
+                # connection closed
+                break
+            self._dispatch_response(received, pending, subscriptions)
+
+        wsocket.connected = False
+        self._fail_pending(pending)
+
+    def _close_wsocket(self):
+        # type: () -> ()
+        wsocket, self.wsocket = self.wsocket, None
+        reader, self._reader = self._reader, None
+        if wsocket is None:
+            return
+        if reader is None or reader is threading.current_thread():
+            wsocket.close()
             return
 
-        self.wsocket.close()
-        self.wsocket = None
+        # the reader thread receives the TV's close frame and terminates
+        try:
+            wsocket.send_close()
+        except Exception:
+            pass
+        reader.join(3)
+        if reader.is_alive():
+            # no close frame from the TV, wake up the reader
+            try:
+                wsocket.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+        wsocket.shutdown()
 
     def _connect_input_pointer(self):
         # type: () -> bool
@@ -322,18 +1107,14 @@ class LGTV(object):
             return True
 
         # get address of input pointer socket
-        success, payload = self._send_command("ssap://com.webos.service.networkinput/getPointerInputSocket")
-
-        if not success:
-            self.log("Could not connect to InputPointer socket:", payload)
-            return False
-        if 'socketPath' not in payload:
-            self.log("Could not connect to InputPointer socket: socketPath is missing in payload")
+        socket_path = self._parse_pointer_socket_path(
+            *self._send_command("ssap://com.webos.service.networkinput/getPointerInputSocket"))
+        if socket_path is None:
             return False
 
         try:
-            self.log("Connecting to InputPointer socket at", payload['socketPath'])
-            self.pointer_socket = websocket.create_connection(payload['socketPath'])
+            self.log("Connecting to InputPointer socket at", socket_path)
+            self.pointer_socket = websocket.create_connection(socket_path)
         except Exception as e:
             self.log("Connection to InputPointer socket failed:", str(e))
             return False
@@ -348,9 +1129,8 @@ class LGTV(object):
         self.pointer_socket.close()
         self.pointer_socket = None
 
-    def _send_command(self, uri, payload=None, resending=False):
-        # type: (str, Any) -> (bool, Any)
-        # Tuple's second component is dict if first component is True.
+    def _ensure_connected(self):
+        # type: () -> (bool, str)
         if not self.is_connected():
             if self.last_host is None:
                 return (False, "Not connected")
@@ -359,109 +1139,194 @@ class LGTV(object):
             if not self.is_connected():
                 return (False, "is_connected() returned False after successful reconnect")
             self.log("Successfully reconnected")
+        return (True, "")
 
-        msg_id = self.random_prefix + str(self.command_counter)
-        self.command_counter += 1
-
-        msg = {
-            'id': msg_id,
-            'type': 'request',
-            'uri': uri
-        }
-        if payload is not None:
-            msg['payload'] = payload
-
-        self.wsocket.send(json.dumps(msg))
+    def _send_command(self, uri, payload=None, resending=False, timeout=None):
+        # type: (str, Any, bool, float) -> (bool, Any)
+        # Tuple's second component is dict if first component is True.
+        # Safe to call from several threads at once. timeout defaults to
+        # response_timeout.
+        success, reason = self._ensure_connected()
+        if not success:
+            return (False, reason)
 
-        received = self.wsocket.recv()
-        if len(received) == 0 or not self.wsocket.connected:
+        response = self._exchange([self._make_request(uri, payload)], timeout)[0]
+        if response is None:
+            if self.is_connected():
+                return (False, "No response from TV within " + str(timeout or self.response_timeout) + " seconds")
             if not resending:
                 self.log("Connection closed by server, probably timed out.")
                 # try connecting one more time
-                return self._send_command(uri, payload, resending=True)
+                return self._send_command(uri, payload, resending=True, timeout=timeout)
             self.log("Connection closed by server, probably timed out  (second time, not trying again).")
             return (False, "Connection closed by server, probably timed out (second time, not trying again).")
 
-        try:
-            response = json.loads(received)
-        except Exception as e:
-            return (False, "Could not decode response '" + str(received) + "' received after sending command:" + str(e))
-
-        if response.get('id') != msg_id:
-            return (False, "Response does not match sent message id. Response order might be mismatched. We're screwed.")
-
-        if response.get('type') == 'error':
-            return (False, response['error'])
+        return self._parse_response(response)
 
-        if 'payload' not in response:
-            return (False, "payload missing in response")
-
-        if not isinstance(response['payload'], dict):
-            return (False, "payload is no dictionary")
-
-        return (True, response['payload'])
-
-    def toast(self, msg, icon_file=None, file_extension=None, icon_base64=None):
-        # type: (str, str, str, str) -> (bool, Any)
-        # icon should be approx. 80x80 pixels, bigger icons might be
-        # ignored (resulting in blank toast icons) or the toast might fail
-        # completely. PNG and JPG have been successfully tested.
-        #
-        # icon_base64 takes precedence over icon_file if file_extension is given,
-        # otherwise icon_file is used, using the file's extension if
-        # file_extension is empty.
-        if len(msg) > 60:
-            self.log("Warning: Toast message is longer than 60 chars")
+    def _send_commands(self, commands):
+        # type: (list) -> list
+        # Sends a list of (uri, payload) requests with a single write, then
+        # waits for all responses. Returns a (bool, Any) tuple per request,
+        # like _send_command() (but without retrying).
+        success, reason = self._ensure_connected()
+        if not success:
+            return [(False, reason)] * len(commands)
+
+        return self._parse_responses(self._exchange([self._make_request(uri, payload) for uri, payload in commands]))
+
+    def _exchange(self, requests, timeout=None):
+        # type: (list, float) -> list
+        # sends (message id, request) pairs made by _make_request() and
+        # returns the decoded responses, None for requests that timed out
+        # (after timeout or response_timeout seconds) or were cut off by a
+        # closed connection.
+        waiters = [_PendingResponse() for _ in requests]
+        pending = self._pending
+        for (msg_id, _), waiter in zip(requests, waiters):
+            pending[msg_id] = waiter
+        try:
+            wsocket = self.wsocket
+            if wsocket is None or not wsocket.connected:
+                # reader has terminated in the meantime
+                return [None] * len(requests)
+            wsocket.send_many([msg for _, msg in requests])
+            deadline = time.time() + (timeout or self.response_timeout)
+            return [waiter.result(max(0, deadline - time.time())) for waiter in waiters]
+        finally:
+            for msg_id, _ in requests:
+                pending.pop(msg_id, None)
+
+    def subscribe(self, uri, callback, payload=None):
+        # type: (str, (bool, Any) -> (), Any) -> (bool, Any)
+        # Subscribes to an ssap URI that pushes updates, e.g.
+        # ssap://com.webos.service.tv.display/get3DStatus.
+        # callback(success, payload) is called for the first response and
+        # for every update. It runs in the reader thread and must not send
+        # commands itself. Returns (True, subscription id) on success.
+        # Subscriptions end with the connection.
+        success, reason = self._ensure_connected()
+        if not success:
+            return (False, reason)
 
-        if isinstance(icon_base64, basestring) and isinstance(file_extension, basestring):
-            encoded_icon = icon_base64
-        elif isinstance(icon_file, basestring):
-            try:
-                with open(icon_file, "rb") as f:
-                    encoded_icon = base64.b64encode(f.read()).decode("utf8")
-                    if not file_extension:
-                        file_extension = icon_file.split(".")[-1]
-            except Exception as e:
-                return (False, "Encoding icon failed: " + str(e))
-        else:
-            encoded_icon = None
+        subscriptions = self._subscriptions
+        msg_id, msg = self._make_request(uri, payload, 'subscribe')
+        subscriptions[msg_id] = callback
+        response = self._exchange([(msg_id, msg)])[0]
+        if response is None:
+            subscriptions.pop(msg_id, None)
+            return (False, "Subscribing to " + uri + " failed, no response from TV")
 
-        payload = {
-            # see https://webos-devrel.github.io/webOS.js/notification.js.html
-            # for additional information
-            'message': msg
-        }
+        success, result = self._parse_response(response)
+        if not success:
+            subscriptions.pop(msg_id, None)
+            return (False, result)
+        return (True, msg_id)
 
-        if encoded_icon:
-            payload['iconData'] = encoded_icon
-            payload['iconExtension'] = file_extension.lower()
+    def unsubscribe(self, subscription_id):
+        # type: (str) -> (bool, Any)
+        if self._subscriptions.pop(subscription_id, None) is None:
+            return (False, "Unknown subscription " + str(subscription_id))
+        if self.is_connected():
+            self.wsocket.send(json.dumps({'id': subscription_id, 'type': 'unsubscribe'}))
+        return (True, "")
 
+    def toast(self, msg, icon_file=None, file_extension=None, icon_base64=None, icon=None):
+        # type: (str, str, str, str, Icon) -> (bool, Any)
+        success, payload = self._toast_payload(msg, icon_file, file_extension, icon_base64, icon)
+        if not success:
+            return (False, payload)
         return self._send_command("ssap://system.notifications/createToast", payload)
 
     def disable_3D(self):
         # type: () -> (bool, Any)
+        self.state.invalidate(StateCache.MODE_3D)
         return self._send_command("ssap://com.webos.service.tv.display/set3DOff")
 
     def enable_3D(self):
         # type: () -> (bool, Any)
+        self.state.invalidate(StateCache.MODE_3D)
         return self._send_command("ssap://com.webos.service.tv.display/set3DOn")
 
     def get_3D_Mode(self):
         # type: () -> Display3dMode
-        success, payload = self._send_command("ssap://com.webos.service.tv.display/get3DStatus")
+        # recently confirmed modes are returned without asking the TV
+        mode = self.state.get(StateCache.MODE_3D)
+        if mode is not None:
+            return mode
+        return self._query_3D_Mode()
+
+    def _query_3D_Mode(self):
+        # type: () -> Display3dMode
+        return self._parse_3D_Mode(*self._send_command("ssap://com.webos.service.tv.display/get3DStatus"))
+
+    def _watch_3D_Mode(self):
+        # type: () -> bool
+        # subscribes to the 3D status once per connection, returns whether
+        # pushed 3D status updates are available.
+        if self._3D_Mode_subscription is not None and self.is_connected():
+            return True
+        success, result = self.subscribe("ssap://com.webos.service.tv.display/get3DStatus", self._on_3D_status)
         if not success:
-            self.log("get_3D_Mode: Could not get current 3D mode:", payload)
-            return Display3dMode.ERROR
-        return Display3dMode.from_string(payload.get('status3D', {}).get('pattern'))
+            self.log("Could not subscribe to 3D status, polling instead:", result)
+            return False
+        self._3D_Mode_subscription = result
+        return True
+
+    def _on_3D_status(self, success, payload):
+        # type: (bool, Any) -> ()
+        mode = self._parse_3D_Mode(success, payload)
+        with self._3D_Mode_changed:
+            self._reported_3D_Mode = mode
+            self._3D_Mode_reports += 1
+            self._3D_Mode_changed.notify_all()
+
+    def _wait_for_3D_Mode(self, accept, timeout, since):
+        # type: ((Display3dMode) -> bool, float, int) -> Display3dMode
+        # Waits until the TV reports a 3D mode accepted by accept() or
+        # timeout seconds have passed, returns the last reported mode.
+        # Pushed updates only count after the since-th one, so take since
+        # from _3D_Mode_reports before triggering the change. Without
+        # pushed updates, the mode is polled every MODE_POLL_INTERVAL
+        # seconds. After a timeout, the mode is polled once more.
+        deadline = time.time() + timeout
+        if self._3D_Mode_subscription is not None and self.is_connected():
+            with self._3D_Mode_changed:
+                while True:
+                    if self._3D_Mode_reports > since and accept(self._reported_3D_Mode):
+                        return self._reported_3D_Mode
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._3D_Mode_changed.wait(remaining)
+            return self._query_3D_Mode()
+
+        while True:
+            mode = self._query_3D_Mode()
+            remaining = deadline - time.time()
+            if accept(mode) or remaining <= 0 or mode == Display3dMode.ERROR:
+                return mode
+            time.sleep(min(MODE_POLL_INTERVAL, remaining))
 
     def send_enter_key(self):
         # type: () -> (bool, Any)
         return self._send_command("ssap://com.webos.service.ime/sendEnterKey")
 
-    def set_3D_Mode(self, mode, button_delay=1.5):  # ~ 1 second seems to be minimum, 1.5 just to make sure.
-        # type: (Display3dMode, float) -> (bool, Any)
+    def set_3D_Mode(self, mode, button_delay=None, arrow_delay=None):
+        # type: (Display3dMode, float, float) -> (bool, Any)
+        # Follows the cheapest plan of self.planner (see TransitionPlanner)
+        # and plans again whenever the TV reports something unexpected.
+        # Every step waits until the TV reports the expected 3D mode, so a
+        # switch takes as long as the TV needs. button_delay is the longest
+        # wait for 3D to be switched or the 3D menu to open, arrow_delay
+        # the longest wait per arrow press. Both are learned per TV (see
+        # MenuTimings) unless given.
         if mode < Display3dMode.OFF or mode > Display3dMode.LINE_INTERLEAVE_HALF:
             return (False, "Invalid 3D mode")
+        # the TV pushes 3D status changes, so we can wait for them instead
+        # of polling (falls back to polling). The first push is the current
+        # mode, so get_3D_Mode() needs no round trip afterwards.
+        self._watch_3D_Mode()
+
         current_mode = self.get_3D_Mode()
         if current_mode == mode:
             # already correct mode
@@ -473,115 +1338,196 @@ class LGTV(object):
             # easiest variant: simply disable 3D.
             return self.disable_3D()
 
-        if current_mode != Display3dMode.OFF:
-            # we are in any incorrect 3D mode. Disable 3D to be able to enable it again via remote button.
-            if not self.disable_3D()[0]:
-                return (False, "Could not initially disable 3D: " + str(result[1]))
-        else:
-            # we were in 2D initially. We'll quickly enable 3D to see which mode we're
-            # in. If this is the correct one, we can skip sending remote buttons completely
-            # (saves time if only watching movies of one 3D mode most of the time)
-            result = self.enable_3D()
-            if not result[0]:
-                return (False, "Could not enable 3D to check current 3D mode: " + str(result[1]))
+        if button_delay is None:
+            button_delay = self.timings.menu_delay()
 
-            current_mode = self.get_3D_Mode()
-            if current_mode == Display3dMode.ERROR:
-                return (False, "Could not get current 3D mode. Something went wrong.")
-            if current_mode == mode:
-                # last 3D mode was correct
-                return (True, "")
-
-            # last 3D mode was incorrect. Disable again so that sending remote 3D button enables it
-            result = self.disable_3D()
-            if not result[0]:
-                return (False, "Could not disable 3D after checking current 3D mode: " + str(result[1]))
-
-        # enable 3D via remote 3D button
-        self.send_button(RemoteButton.MODE_3D)
-        # wait for menu to open
-        time.sleep(button_delay)
-
-        # in case the input pointer socket times out (which we cannot check reliably),
-        # sending RemoteButton.MODE_3D will not have any effect.
-        # Therefore, if this happens, we will reconnect the socket and try again
-        # _once_. The easiest way is wrapping the code in a loop...
-        had_error = False
-        for _ in range(2):
-            current_mode = self.get_3D_Mode()
-            if current_mode == Display3dMode.ERROR:
-                return (False, "Could not get current 3D mode. Something went wrong.")
-            if current_mode == Display3dMode.OFF:
-                if not had_error:
-                    # reconnect input pointer since it probably timed out
-                    self.log("Sending 3D remote button resulted in 3D turned off. Trying to reconnect input pointer socket.")
-                    self._disconnect_input_pointer()
-                    if not self._connect_input_pointer():
-                        return (False, "Failed to reconnect input pointer socket after sending 3D remote button failed.")
-                    # resend 3D remote button
-                    self.send_button(RemoteButton.MODE_3D)
-                    time.sleep(button_delay)
-                    had_error = True
-                    continue
-                else:
-                    return (False, "Sending 3D remote button resulted in 3D turned off, even after reconnecting input pointer socket.")
-
-            if had_error:
-                self.log("Sending 3D remote button succeeded after reconnecting input pointer socket.")
-            # no error, break loop
-            break
-
-        # send left/right buttons in menu to select correct mode.
-        # this is tried at most twice (in case timing is wrong during first try)
-        for i in range(2):
-            delta = mode - current_mode
-            button = RemoteButton.LEFT if delta < 0 else RemoteButton.RIGHT
-            for i in range(abs(delta)):
-                self.send_button(button)
-                # add some delay in second try
-                time.sleep(i * 0.25)
-
-            # wait to make sure changes are in effect
-            time.sleep(0.25)
-
-            current_mode = self.get_3D_Mode()
-            if current_mode == mode:
-                # timing worked
-                self.send_click() # close menu
+        try:
+            # a single request if the TV can do it, the menu otherwise
+            reported = self._set_3D_Mode_directly(mode, current_mode, button_delay)
+            if reported == mode:
                 return (True, "")
-
-            if current_mode == Display3dMode.OFF:
-                # shouldn't happen?!
-                self.send_click() # close menu
-                return (False, "Sending remote button sequence resulted in 3D turned off.")
+            if reported is not None and reported != current_mode:
+                current_mode = reported if reported != Display3dMode.ERROR else self._query_3D_Mode()
+                if current_mode == Display3dMode.ERROR:
+                    return (False, "set_3D_Mode: Could not get current 3D mode. Something went wrong.")
+            return self._follow_3D_plan(mode, current_mode, button_delay, arrow_delay)
+        finally:
+            self._save_timings()
+
+    def _set_3D_Mode_directly(self, mode, current_mode, timeout):
+        # type: (Display3dMode, Display3dMode, float) -> Display3dMode
+        # Tries the _direct_3D_endpoints(), endpoints not known to work
+        # only for DIRECT_3D_PROBE_TIMEOUT seconds. Returns the last
+        # reported mode or None if nothing was sent.
+        endpoints = self._direct_3D_endpoints(mode, current_mode)
+        if not endpoints:
+            return None
+        probing = self.timings.direct_3D_uri is None
+        if probing:
+            timeout = min(timeout, DIRECT_3D_PROBE_TIMEOUT)
+
+        for uri, payload in endpoints:
+            since = self._3D_Mode_reports
+            start = time.time()
+            self.state.invalidate(StateCache.MODE_3D)
+            success, result = self._send_command(uri, payload(Display3dMode.to_pattern(mode)),
+                                                 timeout=timeout if probing else None)
+            if not success and not self.is_connected():
+                # says nothing about uri
+                return current_mode
+            if success:
+                current_mode = self._wait_for_3D_Mode(lambda m: m == mode, timeout, since)
+                if current_mode == mode:
+                    self._record_direct_3D_result(uri, time.time() - start)
+                    return current_mode
+            if probing:
+                self.timings.record_direct_3D_failure(uri)
             if current_mode == Display3dMode.ERROR:
-                self.send_click() # close menu
-                return (False, "Could not get current 3D mode. Something went wrong.")
-
-            # current_mode != mode holds from now on
+                break
 
-            if i == 0:
-                # try again after delay
-                time.sleep(1)
+        self._record_direct_3D_result(None)
+        return current_mode
+
+    def _follow_3D_plan(self, mode, current_mode, button_delay, arrow_delay):
+        # type: (Display3dMode, Display3dMode, float, float) -> (bool, Any)
+        # does what _3D_plan_actions() asks for
+        actions = self._3D_plan_actions(mode, current_mode)
+        action, argument, _ = next(actions)
+        while action != self._PLAN_DONE:
+            if action == TransitionStep.CLOSE_MENU:
+                outcome = self.send_click()
+            elif action == TransitionStep.DISABLE_3D:
+                outcome = self._change_3D_Mode(self.disable_3D, lambda m: m == Display3dMode.OFF, button_delay)
+            elif action == TransitionStep.ENABLE_3D:
+                outcome = self._change_3D_Mode(self.enable_3D, lambda m: m != Display3dMode.OFF, button_delay)
+            elif action == TransitionStep.OPEN_MENU:
+                outcome = self._open_3D_menu(argument, button_delay)
+            elif action == self._PRESS_ARROWS:
+                outcome = self._press_3D_Mode_arrows(argument[0], argument[1], argument[2], argument[3], arrow_delay)
+            elif action == self._STEP_ARROWS:
+                outcome = self._step_3D_Mode(argument[0], argument[1], argument[2], arrow_delay)
+            else:
+                self._disconnect_input_pointer()
+                outcome = self._connect_input_pointer()
+            action, argument, _ = actions.send(outcome)
+        return argument
+
+    def _change_3D_Mode(self, command, accept, timeout):
+        # type: (() -> (bool, Any), (Display3dMode) -> bool, float) -> (bool, Any)
+        # Sends command and waits at most timeout seconds until the TV
+        # reports a 3D mode accepted by accept(). Returns (True, reported
+        # mode) or the command's error.
+        since = self._3D_Mode_reports
+        start = time.time()
+        result = command()
+        if not result[0]:
+            return result
+        current_mode = self._wait_for_3D_Mode(accept, timeout, since)
+        if accept(current_mode):
+            self.timings.record_mode_switch(time.time() - start)
+        return (True, current_mode)
+
+    def _press_for_3D_Mode(self, buttons, accept, timeout, pacing=0):
+        # type: (list, (Display3dMode) -> bool, float, float) -> Display3dMode
+        # like _change_3D_Mode() for remote buttons. Lost button presses
+        # cannot be detected other than by the reported mode, so the
+        # last reported mode is returned in any case.
+        since = self._3D_Mode_reports
+        self.send_buttons(buttons, pacing)
+        return self._wait_for_3D_Mode(accept, timeout, since)
+
+    def _open_3D_menu(self, current_mode, button_delay):
+        # type: (Display3dMode, float) -> Display3dMode
+        if current_mode != Display3dMode.OFF:
+            # the menu opens in the current mode, so there is no report to
+            # wait for.
+            self.send_button(RemoteButton.MODE_3D)
+            time.sleep(self.timings.menu_open)
+            return current_mode
+        # from 2D, the menu is open once the TV reports 3D to be on.
+        start = time.time()
+        current_mode = self._press_for_3D_Mode([RemoteButton.MODE_3D], lambda m: m != Display3dMode.OFF, button_delay)
+        if current_mode not in (Display3dMode.OFF, Display3dMode.ERROR):
+            self.timings.record_menu_open(time.time() - start)
+        return current_mode
+
+    def _press_3D_Mode_arrows(self, presses, current_mode, mode, settling, arrow_delay):
+        # type: (list, Display3dMode, Display3dMode, bool, float) -> Display3dMode
+        # Presses all arrows at once, paced as slow as this TV needs and,
+        # if the menu was just opened, once it is settled. Returns the last
+        # reported mode.
+        timeout = (arrow_delay or self.timings.arrow_delay()) * len(presses)
+        if settling:
+            time.sleep(self.timings.menu_settle)
+        start = time.time()
+        reported = self._press_for_3D_Mode(presses, lambda m: m == mode, timeout, self.timings.arrow_pacing)
+        if reported == mode:
+            self.timings.record_arrow_press((time.time() - start) / len(presses))
+        self._record_3D_Mode_arrows(current_mode, mode, reported, settling)
+        return reported
+
+    def _step_3D_Mode(self, presses, current_mode, settling, arrow_delay):
+        # type: (list, Display3dMode, bool, float) -> Display3dMode
+        # Presses arrows one at a time, each as soon as the TV reported the
+        # previous one. A press that is not reported within arrow_delay
+        # seconds is repeated once. Returns the last reported mode.
+        if settling:
+            time.sleep(self.timings.menu_settle)
+        lost_presses = 0
+        i = 0
+        while i < len(presses):
+            previous_mode = current_mode
+            start = time.time()
+            current_mode = self._press_for_3D_Mode([presses[i]], lambda m: m != previous_mode,
+                                                   arrow_delay or self.timings.arrow_delay())
+            if current_mode in (Display3dMode.OFF, Display3dMode.ERROR):
+                break
+            if current_mode != previous_mode:
+                self.timings.record_arrow_press(time.time() - start)
+                lost_presses = 0
+                i += 1
                 continue
-
-            # failed after second try, give up.
-            # close menu
-            self.send_click()
-            return (False, "Sending remote buttons resulted in mode " + Display3dMode.to_string(current_mode) + " but mode " + Display3dMode.to_string(mode) + " was expected.")
+            self.timings.record_lost_press()
+            lost_presses += 1
+            if lost_presses == 2:
+                # TV does not react any more, give up
+                break
+        return current_mode
 
     def _send_input_command(self, cmd):
         # type: (str) -> (bool, str)
+        return self._send_input_commands([cmd])
+
+    def _send_input_commands(self, cmds):
+        # type: (list) -> (bool, str)
+        # all commands are sent with a single write
         if not self._is_pointer_connected() and not self._connect_input_pointer():
             return (False, "Could not connect to InputPointer socket")
 
-        self.pointer_socket.send(cmd)
+        self.pointer_socket.send_many(cmds)
         # unfortunately, we cannot check whether the socket timed out...
         return (True, "")
 
     def send_button(self, button):
         # type: (RemoteButton) -> (bool, str)
-        return self._send_input_command("type:button\nname:" + button + "\n\n")
+        # buttons might change the 3D mode, e.g. in the 3D menu
+        self.state.invalidate(StateCache.MODE_3D)
+        return self._send_input_command(self._button_command(button))
+
+    def send_buttons(self, sequence, pacing=0):
+        # type: (list, float) -> (bool, str)
+        # sequence is a list of steps, each step is a RemoteButton or a list
+        # of RemoteButtons. The buttons of a step are sent with a single write,
+        # steps are sent pacing seconds apart. Without pacing, the whole
+        # sequence is sent at once.
+        self.state.invalidate(StateCache.MODE_3D)
+        for i, step in enumerate(self._button_steps(sequence, pacing)):
+            if i > 0:
+                time.sleep(pacing)
+            result = self._send_input_commands(step)
+            if not result[0]:
+                return result
+        return (True, "")
 
     def send_click(self):
         # type: () -> (bool, str)
@@ -589,31 +1535,17 @@ class LGTV(object):
 
     def get_inputs(self):
         # type: () -> (bool, Any)
-        success, payload = self._send_command("ssap://tv/getExternalInputList")
-        if not success:
-            return (False, payload)
-        if 'devices' not in payload:
-            return (False, "devices missing in payload")
-
-        # polish the list
-        devices = payload['devices']
-        result = {}
-
-        for dev in devices:
-            if 'id' not in dev:
-                continue
-            result[dev['id']] = {
-                'icon': dev.get('icon', 'MISSING'),
-                'label': dev.get('label', 'MISSING'),
-                'favorite': dev.get('favorite', False)
-            }
-
-        return (success, result)
+        return self._parse_inputs(*self._send_command("ssap://tv/getExternalInputList"))
 
     def set_input(self, input):
         # type: (str) -> (bool, Any)
         # input can be HDMI_1, HDMI_2 etc.
-        return self._send_command("ssap://tv/switchInput", {'inputId': input})
+        # the new input might come with another 3D mode
+        self.state.invalidate(StateCache.INPUT, StateCache.MODE_3D)
+        result = self._send_command("ssap://tv/switchInput", {'inputId': input})
+        if result[0]:
+            self.state.set(StateCache.INPUT, input)
+        return result
 
     def get_channel(self):
         # type: () -> (bool, Any)
@@ -625,26 +1557,30 @@ class LGTV(object):
         # if volume is muted or unavailable (optical output etc.), volume
         # will be -1.
         # On error, volume will be -2.
-        success, payload = self._send_command("ssap://audio/getVolume")
-
-        if not success:
-            return (False, -2)
-
-        if 'volume' in payload:
-            return (True, payload['volume'])
-        return (False, -2)
+        # A recently confirmed volume is returned without asking the TV.
+        volume = self.state.get(StateCache.VOLUME)
+        if volume is not None:
+            return (True, volume)
+        return self._parse_volume(*self._send_command("ssap://audio/getVolume"))
 
     def set_volume(self, volume):
         # type: (int) -> (bool, Any)
         if volume < 0 or volume > 100:
             return (False, "0 <= volume <= 100 must hold.")
-        return self._send_command("ssap://audio/setVolume", {'volume': volume})
+        self.state.invalidate(StateCache.VOLUME)
+        result = self._send_command("ssap://audio/setVolume", {'volume': volume})
+        if result[0]:
+            self.state.set(StateCache.VOLUME, volume)
+        return result
 
     def get_audio_status(self):
         # type: () -> (bool, Any)
         # example:
         # {'scenario': 'mastervolume_ext_speaker_optical', 'volume': -1, 'mute': False, 'returnValue': True}
-        return self._send_command("ssap://audio/getStatus")
+        result = self._send_command("ssap://audio/getStatus")
+        if result[0] and 'volume' in result[1]:
+            self.state.set(StateCache.VOLUME, result[1]['volume'])
+        return result
 
     # not working due to insufficient permissions (pairing request lacking valid signature?)
     #def get_software_info(self):
@@ -0,0 +1,141 @@
+import heapq
+
+from .enums import Display3dMode, TransitionStep
+
+
+class TransitionPlanner(object):
+    # Plans the cheapest way to switch the TV from one 3D mode to another.
+    #
+    # A state is a tuple (mode, menu_open, last_3D_mode): the current 3D
+    # mode, whether the 3D menu is open and the mode the TV switches to when
+    # 3D is enabled (None if unknown). Steps are ssap calls and remote
+    # buttons (see TransitionStep), each with a cost in seconds taken from
+    # a dict like MenuTimings.step_costs(). Which steps a TV supports
+    # depends on its menu:
+    #   wrap_around: LEFT in the first menu entry selects the last one and
+    #                vice versa.
+    #   menu_from_3D: the 3D button opens the 3D menu while 3D is on, so
+    #                 switching between 3D modes needs no off/on cycle.
+    # Both are off by default, which is how the TV has always been driven.
+
+    FIRST_MENU_MODE = Display3dMode.CONVERT_2D_TO_3D
+    LAST_MENU_MODE = Display3dMode.LINE_INTERLEAVE_HALF
+
+    def __init__(self, wrap_around=False, menu_from_3D=False):
+        # type: (bool, bool) -> None
+        self.wrap_around = wrap_around      # type: bool
+        self.menu_from_3D = menu_from_3D    # type: bool
+
+    def plan(self, state, target_mode, costs):
+        # type: (tuple, Display3dMode, dict) -> list
+        # Returns the cheapest list of steps from state to target_mode with
+        # the menu closed, or None if there is none. If a step leads to an
+        # unknown mode (enabling 3D while the last 3D mode is unknown), the
+        # plan ends with that step and has to be made again once the mode
+        # is known. That step is chosen by its expected cost, assuming all
+        # 3D modes to be equally likely.
+        mode, menu_open, last_3D_mode = state
+        if mode != Display3dMode.OFF or last_3D_mode is not None:
+            return self._search(state, target_mode, costs)[1]
+
+        best_cost, best_plan = self._search(state, target_mode, costs)
+        for step in (TransitionStep.ENABLE_3D, TransitionStep.OPEN_MENU):
+            if self.apply(state, step) is None:
+                continue
+            cost = costs[step] + self._expected_cost(step, target_mode, costs)
+            if best_plan is None or cost < best_cost:
+                best_cost, best_plan = cost, [step]
+        return best_plan
+
+    def cost(self, state, steps, costs):
+        # type: (tuple, list, dict) -> float
+        # cost of steps starting at state, None if a step is not possible
+        total = 0.0
+        for step in steps:
+            state = self.apply(state, step)
+            if state is None:
+                return None
+            total += costs[step]
+        return total
+
+    def apply(self, state, step):
+        # type: (tuple, str) -> tuple
+        # Returns the state after step or None if step is not possible
+        # in state. The mode is None if it is unknown.
+        mode, menu_open, last_3D_mode = state
+        if menu_open:
+            if step == TransitionStep.CLOSE_MENU:
+                return (mode, False, mode)
+            if step == TransitionStep.LEFT:
+                return self._move(mode, -1)
+            if step == TransitionStep.RIGHT:
+                return self._move(mode, 1)
+            return None
+
+        if mode == Display3dMode.OFF:
+            if step == TransitionStep.ENABLE_3D:
+                return (last_3D_mode, False, last_3D_mode)
+            if step == TransitionStep.OPEN_MENU:
+                return (last_3D_mode, True, last_3D_mode)
+            return None
+
+        if step == TransitionStep.DISABLE_3D:
+            return (Display3dMode.OFF, False, mode)
+        if step == TransitionStep.OPEN_MENU and self.menu_from_3D:
+            return (mode, True, mode)
+        return None
+
+    def _move(self, mode, delta):
+        # type: (Display3dMode, int) -> tuple
+        new_mode = mode + delta
+        if self.FIRST_MENU_MODE <= new_mode <= self.LAST_MENU_MODE:
+            return (new_mode, True, new_mode)
+        if not self.wrap_around:
+            # stays at the end of the menu, pointless
+            return None
+        if new_mode < self.FIRST_MENU_MODE:
+            new_mode = self.LAST_MENU_MODE
+        else:
+            new_mode = self.FIRST_MENU_MODE
+        return (new_mode, True, new_mode)
+
+    def _expected_cost(self, step, target_mode, costs):
+        # type: (str, Display3dMode, dict) -> float
+        # mean cost after step from 3D off, over all possible last 3D modes
+        total = 0.0
+        modes = range(self.FIRST_MENU_MODE, self.LAST_MENU_MODE + 1)
+        for last_3D_mode in modes:
+            state = self.apply((Display3dMode.OFF, False, last_3D_mode), step)
+            cost = self._search(state, target_mode, costs)[0]
+            if cost is None:
+                return float('inf')
+            total += cost
+        return total / len(modes)
+
+    def _search(self, state, target_mode, costs):
+        # type: (tuple, Display3dMode, dict) -> (float, list)
+        # Dijkstra's algorithm over the (small) state graph, returns the
+        # cost and steps of the cheapest plan or (None, None).
+        steps = [step for step in (TransitionStep.DISABLE_3D, TransitionStep.ENABLE_3D,
+                                   TransitionStep.OPEN_MENU, TransitionStep.LEFT,
+                                   TransitionStep.RIGHT, TransitionStep.CLOSE_MENU)
+                 if step in costs]
+        # the counter keeps the order of equally expensive plans stable
+        counter = 0
+        queue = [(0.0, counter, state, [])]
+        done = set()
+        while queue:
+            cost, _, state, plan = heapq.heappop(queue)
+            if state in done:
+                continue
+            done.add(state)
+            mode, menu_open, last_3D_mode = state
+            if mode == target_mode and not menu_open:
+                return (cost, plan)
+            for step in steps:
+                next_state = self.apply(state, step)
+                if next_state is None or next_state[0] is None or next_state in done:
+                    continue
+                counter += 1
+                heapq.heappush(queue, (cost + costs[step], counter, next_state, plan + [step]))
+        return (None, None)
@@ -0,0 +1,43 @@
+import time
+
+
+class StateCache(object):
+    # Last confirmed TV state (3D mode, volume, input) with the time it was
+    # confirmed, so reads shortly after need no round trip. Values come from
+    # command results and pushed updates. Commands that might change a
+    # value invalidate it before they are sent.
+
+    # keys
+    MODE_3D = '3D_Mode'
+    VOLUME = 'volume'
+    INPUT = 'input'
+
+    def __init__(self, ttl=2.0):
+        # type: (float) -> None
+        # values older than ttl seconds are not returned, 0 disables caching
+        self.ttl = ttl          # type: float
+        self._values = {}       # type: dict
+
+    def get(self, key):
+        # type: (str) -> Any
+        # returns None if the value is unknown or too old
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, confirmed = entry
+        if time.time() - confirmed > self.ttl:
+            return None
+        return value
+
+    def set(self, key, value):
+        # type: (str, Any) -> ()
+        self._values[key] = (value, time.time())
+
+    def invalidate(self, *keys):
+        # type: (str) -> ()
+        for key in keys:
+            self._values.pop(key, None)
+
+    def clear(self):
+        # type: () -> ()
+        self._values = {}
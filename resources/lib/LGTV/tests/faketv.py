@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+
+import base64
+import hashlib
+import json
+import socket
+import threading
+import time
+
+from resources.lib.LGTV import websocket
+from resources.lib.LGTV.enums import Display3dMode, RemoteButton
+from resources.lib.LGTV.lgtv import LGTVBase
+from resources.lib.LGTV.websocket._abnf import ABNF, frame_buffer
+from resources.lib.LGTV.websocket._socket import recv_into
+
+STATUS_3D = "ssap://com.webos.service.tv.display/get3DStatus"
+
+create_connection = websocket.create_connection
+# Python 3 only
+create_async_connection = getattr(websocket, 'create_async_connection', None)
+
+
+class FakeTV(object):
+    # A webOS TV at the other end of socketpairs. Patch
+    # websocket.create_connection (and create_async_connection) with the
+    # methods of the same name to connect to it. Answers ssap requests,
+    # pushes 3D status updates to subscribers and has a 3D menu: the 3D
+    # button opens it in the last 3D mode, arrows move through its
+    # entries, a click closes it.
+
+    POINTER_URL = "ws://tv:3001/pointer"
+
+    def __init__(self, mode=Display3dMode.OFF, last_3D_Mode=Display3dMode.SIDE_SIDE_HALF):
+        self.mode = mode
+        self.last_3D_Mode = last_3D_Mode
+        self.menu_open = False
+        # seconds after opening in which the menu ignores arrows
+        self.menu_settle = 0.0
+        self.volume = 11
+        # subscriptions fail if False, the 3D status has to be polled
+        self.push = True
+        # URIs of requests that are not answered at all
+        self.ignored = set()
+        # DIRECT_3D_ENDPOINTS the TV supports, the others fail
+        self.direct_3D_uris = set()
+        # requests are answered in reverse order in batches of this size
+        self.reorder = 1
+        # every request as (type, uri) and every button name or "click"
+        self.requests = []
+        self.buttons = []
+        self._menu_opened = 0.0
+        self._held = []
+        self._subscribers = []
+        self._servers = []
+        self._send_lock = threading.Lock()
+
+    def create_connection(self, url, **options):
+        # replaces websocket.create_connection
+        return create_connection(url, socket=self._serve(url), **options)
+
+    def create_async_connection(self, url, **options):
+        # replaces websocket.create_async_connection, returns a coroutine
+        return create_async_connection(url, socket=self._serve(url), **options)
+
+    def close(self):
+        # the TV is switched off
+        for server in self._servers:
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    @staticmethod
+    def wait(condition, timeout=2):
+        # for input commands, which are not answered
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def status(self):
+        return {'returnValue': True,
+                'status3D': {'status': self.mode != Display3dMode.OFF, 'pattern': Display3dMode.to_pattern(self.mode)}}
+
+    def set_mode(self, mode):
+        # switches the mode and pushes it to subscribers
+        self.mode = mode
+        if mode > Display3dMode.OFF:
+            self.last_3D_Mode = mode
+        for server, msg_id in list(self._subscribers):
+            self._send(server, {'type': 'response', 'id': msg_id, 'payload': self.status()})
+
+    def _serve(self, url):
+        # returns the client end of a new connection
+        client, server = socket.socketpair()
+        self._servers.append(server)
+        target = self._serve_pointer if url == self.POINTER_URL else self._serve_ssap
+        thread = threading.Thread(target=target, args=(server,))
+        thread.daemon = True
+        thread.start()
+        return client
+
+    def _messages(self, server):
+        # text messages received on server until the connection is closed
+        request = b""
+        while b"\r\n\r\n" not in request:
+            data = server.recv(4096)
+            if not data:
+                return
+            request += data
+        for line in request.decode("utf-8").split("\r\n"):
+            if line.lower().startswith("sec-websocket-key:"):
+                key = line.split(":", 1)[1].strip()
+        accept = base64.b64encode(hashlib.sha1((key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode("utf-8")).digest())
+        server.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                       b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+        frames = frame_buffer(lambda buffer, n: recv_into(server, buffer, n), True)
+        while True:
+            try:
+                frame = frames.recv_frame()
+            except Exception:
+                break
+            if frame.opcode == ABNF.OPCODE_CLOSE:
+                self._send_frame(server, ABNF.create_frame(frame.data, ABNF.OPCODE_CLOSE))
+                break
+            if frame.opcode == ABNF.OPCODE_TEXT:
+                yield frame.data.decode("utf-8")
+        self._subscribers = [s for s in self._subscribers if s[0] is not server]
+        server.close()
+
+    def _send(self, server, message):
+        self._send_frame(server, ABNF.create_frame(json.dumps(message), ABNF.OPCODE_TEXT))
+
+    def _send_frame(self, server, frame):
+        frame.mask = 0
+        with self._send_lock:
+            try:
+                server.sendall(frame.format())
+            except socket.error:
+                pass
+
+    def _serve_ssap(self, server):
+        for text in self._messages(server):
+            request = json.loads(text)
+            msg_id = request.get('id')
+            uri = request.get('uri')
+            self.requests.append((request['type'], uri))
+            if request['type'] == 'register':
+                self._send(server, {'type': 'registered', 'id': msg_id, 'payload': {'client-key': "KEY"}})
+                continue
+            if request['type'] != 'request' and request['type'] != 'subscribe':
+                continue
+            if uri in self.ignored:
+                continue
+
+            response = {'type': 'response', 'id': msg_id, 'payload': {'returnValue': True}}
+            if request['type'] == 'subscribe':
+                if uri == STATUS_3D and self.push:
+                    self._subscribers.append((server, msg_id))
+                    response['payload'] = self.status()
+                else:
+                    response = {'type': 'error', 'id': msg_id, 'error': "404 no such service or method"}
+            elif uri == STATUS_3D:
+                response['payload'] = self.status()
+            elif uri in self.direct_3D_uris and 'payload' in request:
+                self.set_mode(Display3dMode.from_string(request['payload']['pattern']))
+            elif uri.endswith("/set3DOn"):
+                # ignores a pattern
+                self.set_mode(self.last_3D_Mode)
+            elif uri.endswith("/set3DOff"):
+                self.set_mode(Display3dMode.OFF)
+            elif uri in [e[0] for e in LGTVBase.DIRECT_3D_ENDPOINTS]:
+                response = {'type': 'error', 'id': msg_id, 'error': "404 no such service or method"}
+            elif uri.endswith("/getPointerInputSocket"):
+                response['payload']['socketPath'] = self.POINTER_URL
+            elif uri.endswith("/getVolume"):
+                response['payload']['volume'] = self.volume
+
+            self._held.append(response)
+            if len(self._held) >= self.reorder:
+                held, self._held = self._held, []
+                for response in reversed(held):
+                    self._send(server, response)
+
+    def _serve_pointer(self, server):
+        for text in self._messages(server):
+            if text.startswith("type:click"):
+                self.buttons.append("click")
+                self.menu_open = False
+                continue
+            button = text.split("name:", 1)[1].strip()
+            self.buttons.append(button)
+            if button == RemoteButton.MODE_3D:
+                self.menu_open = True
+                self._menu_opened = time.time()
+                self.set_mode(self.mode if self.mode != Display3dMode.OFF else self.last_3D_Mode)
+            elif self.menu_open and time.time() - self._menu_opened >= self.menu_settle:
+                if button == RemoteButton.LEFT and self.mode > Display3dMode.CONVERT_2D_TO_3D:
+                    self.set_mode(self.mode - 1)
+                elif button == RemoteButton.RIGHT and self.mode < Display3dMode.LINE_INTERLEAVE_HALF:
+                    self.set_mode(self.mode + 1)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+
+import sys
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV import lgtv, websocket
+from resources.lib.LGTV.discovery import DiscoveredTV
+from resources.lib.LGTV.enums import Display3dMode
+from resources.lib.LGTV.tests.faketv import FakeTV
+
+if sys.version_info[0] >= 3:
+    import asyncio
+    from resources.lib.LGTV.async_lgtv import AsyncLGTV
+
+TV = DiscoveredTV("192.0.2.5", "uuid:a", "WebOS/1.5 UPnP/1.0", 0.1)
+
+
+class FakeSSDPDiscovery(object):
+    # answers with the TVs in found
+    found = []
+
+    def __init__(self, log):
+        pass
+
+    def discover(self, timeout, tries, stop_at=None, limit=None):
+        return list(self.found)
+
+
+@unittest.skipUnless(sys.version_info[0] >= 3, "asyncio is not available")
+class AsyncDiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ssdp_discovery = lgtv.SSDPDiscovery
+        lgtv.SSDPDiscovery = FakeSSDPDiscovery
+        self.sweep = (lgtv.local_ipv4_addresses, lgtv.sweep_webos, lgtv.confirm_webos)
+        lgtv.local_ipv4_addresses = lambda: ["192.0.2.2"]
+        lgtv.sweep_webos = lambda hosts, timeout, concurrency, progress: [ip for ip in hosts if ip == TV.ip]
+        lgtv.confirm_webos = lambda ip, timeout: True
+        self.tv = AsyncLGTV(log=lambda *args: None)
+
+    def tearDown(self):
+        lgtv.SSDPDiscovery = self.ssdp_discovery
+        lgtv.local_ipv4_addresses, lgtv.sweep_webos, lgtv.confirm_webos = self.sweep
+        FakeSSDPDiscovery.found = []
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def testDiscoverTVs(self):
+        FakeSSDPDiscovery.found = [TV]
+        self.assertEqual(self.loop.run_until_complete(self.tv.discover_tvs(timeout=2)), [TV])
+        self.assertEqual(self.tv.discovered.ips(), [TV.ip])
+
+    def testDiscoverIP(self):
+        FakeSSDPDiscovery.found = [TV]
+        self.assertEqual(self.loop.run_until_complete(self.tv.discover_ip(timeout=2)), TV.ip)
+
+    def testSweepTVs(self):
+        tvs = self.loop.run_until_complete(self.tv.sweep_tvs())
+        self.assertEqual([tv.ip for tv in tvs], [TV.ip])
+
+    def testDiscoverIPBySweeping(self):
+        # multicast is blocked
+        self.assertEqual(self.loop.run_until_complete(self.tv.discover_ip(timeout=2)), TV.ip)
+        self.assertEqual(self.tv.discovered.ips(), [TV.ip])
+
+
+@unittest.skipUnless(sys.version_info[0] >= 3, "asyncio is not available")
+class AsyncLGTVTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.fake = FakeTV()
+        self.create_async_connection = websocket.create_async_connection
+        self.neighbor_table = lgtv.neighbor_table
+        websocket.create_async_connection = self.fake.create_async_connection
+        self.tv = AsyncLGTV(log=lambda *args: None)
+        self.assertTrue(self.run_loop(self.tv.connect("192.0.2.5")))
+
+    def tearDown(self):
+        self.run_loop(self.tv.disconnect())
+        websocket.create_async_connection = self.create_async_connection
+        lgtv.neighbor_table = self.neighbor_table
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_loop(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def testConnect(self):
+        self.assertTrue(self.tv.is_connected())
+        self.assertEqual(self.tv.pairing_key, "KEY")
+        self.assertEqual(self.fake.requests[0], ('register', None))
+
+    def testRecordMAC(self):
+        lookups = []
+        lgtv.neighbor_table = lambda: lookups.append(1) or {"192.0.2.5": "aa:bb:cc:dd:ee:05"}
+        for _ in range(2):
+            self.run_loop(self.tv.disconnect())
+            self.assertTrue(self.run_loop(self.tv.connect("192.0.2.5")))
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(self.tv.discovered.macs(), {"aa:bb:cc:dd:ee:05": "192.0.2.5"})
+
+    def testCommandsAtOnce(self):
+        self.fake.reorder = 2
+        results = self.run_loop(self.tv._send_commands([("ssap://audio/getVolume", None),
+                                                        ("ssap://tv/getCurrentChannel", None)]))
+        self.assertEqual(results[0], (True, {'returnValue': True, 'volume': 11}))
+        self.assertEqual(results[1], (True, {'returnValue': True}))
+
+    def testSet3DMode(self):
+        self.assertEqual(self.run_loop(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM)), (True, ""))
+        self.assertEqual(self.fake.mode, Display3dMode.TOP_BOTTOM)
+        self.assertTrue(self.fake.wait(lambda: not self.fake.menu_open))
+        self.assertEqual(self.run_loop(self.tv.get_3D_Mode()), Display3dMode.TOP_BOTTOM)
+
+    def testCancelClosesMenu(self):
+        # arrows are ignored, the switch waits for their report
+        self.fake.menu_settle = 60
+        task = self.loop.create_task(self.tv.set_3D_Mode(Display3dMode.LINE_INTERLEAVE_HALF))
+        self.run_loop(asyncio.sleep(0.5))
+        self.assertTrue(self.fake.menu_open)
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, self.run_loop, task)
+        self.assertTrue(self.fake.wait(lambda: not self.fake.menu_open))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+#
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV import discovery
+from resources.lib.LGTV.discovery import DiscoveredTV, DiscoveryCache, SSDPDiscovery, SSDPListener, \
+    confirm_webos, local_ipv4_addresses, neighbor_table, parse_ssdp_headers, probe_webos, subnet_hosts, sweep_webos
+
+RESPONSE = (b"HTTP/1.1 200 OK\r\n"
+            b"CACHE-CONTROL: max-age=1800\r\n"
+            b"LOCATION: http://192.168.1.5:1870/\r\n"
+            b"SERVER: WebOS/1.5 UPnP/1.0 webOSTV/1.0\r\n"
+            b"ST: urn:dial-multiscreen-org:service:dial:1\r\n"
+            b"USN: uuid:0a1b2c::urn:dial-multiscreen-org:service:dial:1\r\n\r\n")
+
+
+class DiscoveryTest(unittest.TestCase):
+    def testParseHeaders(self):
+        headers = parse_ssdp_headers(RESPONSE)
+        self.assertEqual(headers['server'], "WebOS/1.5 UPnP/1.0 webOSTV/1.0")
+        self.assertEqual(headers['location'], "http://192.168.1.5:1870/")
+        self.assertEqual(headers['usn'], "uuid:0a1b2c::urn:dial-multiscreen-org:service:dial:1")
+
+    def receive(self, data):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            receiver.bind(("127.0.0.1", 0))
+            receiver.settimeout(1)
+            sender.sendto(data, receiver.getsockname())
+            return SSDPDiscovery._receive(receiver, 0.5)
+        finally:
+            receiver.close()
+            sender.close()
+
+    def testReceive(self):
+        self.assertEqual(self.receive(RESPONSE), DiscoveredTV(
+            "127.0.0.1", "uuid:0a1b2c::urn:dial-multiscreen-org:service:dial:1",
+            "WebOS/1.5 UPnP/1.0 webOSTV/1.0", 0.5))
+
+    def testOtherDevicesAreIgnored(self):
+        self.assertIsNone(self.receive(RESPONSE.replace(b"WebOS", b"Linux")))
+
+    def testNeighborTable(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b"IP address       HW type     Flags       HW address            Mask     Device\n"
+                     b"192.168.1.1      0x1         0x2         AA:BB:CC:DD:EE:01     *        eth0\n"
+                     b"192.168.1.5      0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+                     b"192.168.1.6      0x1         0x6         aa:bb:cc:dd:ee:06     *        eth0\n")
+        os.close(fd)
+        proc_net_arp = discovery.PROC_NET_ARP
+        discovery.PROC_NET_ARP = path
+        try:
+            self.assertEqual(neighbor_table(), {"192.168.1.1": "aa:bb:cc:dd:ee:01", "192.168.1.6": "aa:bb:cc:dd:ee:06"})
+        finally:
+            discovery.PROC_NET_ARP = proc_net_arp
+            os.remove(path)
+
+    def testSubnetHosts(self):
+        hosts = subnet_hosts("192.168.1.5")
+        self.assertEqual(len(hosts), 253)
+        self.assertEqual(hosts[0], "192.168.1.1")
+        self.assertEqual(hosts[-1], "192.168.1.254")
+        self.assertNotIn("192.168.1.5", hosts)
+
+    def testLocalAddresses(self):
+        addresses = local_ipv4_addresses()
+        self.assertEqual(len(addresses), len(set(addresses)))
+        for address in addresses:
+            socket.inet_aton(address)
+            self.assertFalse(address.startswith("127."))
+
+
+class SSDPDiscoveryTest(unittest.TestCase):
+    # TVs at 127.0.0.3 and 127.0.0.2 answer every search, the second one
+    # 0.1 seconds later and on another interface
+    def setUp(self):
+        self.ssdp = SSDPDiscovery(log=lambda *args: None)
+        self.ssdp._open_sockets = self.open_sockets
+        self.ssdp._send_search = self.answer
+        self.opened = []
+        self.timers = []
+        self.tvs = {}
+        for ip in ("127.0.0.2", "127.0.0.3"):
+            self.tvs[ip] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.tvs[ip].bind((ip, 0))
+
+    def tearDown(self):
+        for timer in self.timers:
+            timer.cancel()
+            timer.join()
+        for sock in self.opened + list(self.tvs.values()):
+            sock.close()
+
+    def open_sockets(self):
+        # two interfaces
+        sockets = []
+        for _ in range(2):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            sockets.append(sock)
+        self.opened.extend(sockets)
+        return sockets
+
+    def answer(self, sockets, mx, try_no):
+        addresses = [sock.getsockname() for sock in sockets]
+        self.tvs["127.0.0.3"].sendto(RESPONSE, addresses[1])
+        timer = threading.Timer(0.1, self.tvs["127.0.0.2"].sendto, (RESPONSE, addresses[0]))
+        timer.start()
+        self.timers.append(timer)
+
+    def assertClosed(self):
+        for sock in self.opened:
+            try:
+                self.assertEqual(sock.fileno(), -1)
+            except socket.error:
+                # Python 2
+                pass
+
+    def testWindow(self):
+        start = time.time()
+        tvs = self.ssdp.discover(timeout=1, tries=2)
+        self.assertGreaterEqual(time.time() - start, 1)
+        # in order of response, repeated answers are dropped
+        self.assertEqual([tv.ip for tv in tvs], ["127.0.0.3", "127.0.0.2"])
+        self.assertLess(tvs[0].response_time, tvs[1].response_time)
+        self.assertClosed()
+
+    def testStopAt(self):
+        start = time.time()
+        tvs = self.ssdp.discover(timeout=3, tries=2, stop_at=["127.0.0.2"])
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([tv.ip for tv in tvs], ["127.0.0.3", "127.0.0.2"])
+        self.assertClosed()
+
+    def testLimit(self):
+        start = time.time()
+        tvs = self.ssdp.discover(timeout=3, tries=2, limit=1)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([tv.ip for tv in tvs], ["127.0.0.3"])
+        self.assertClosed()
+
+    def testClosedOnError(self):
+        def fail(sockets, mx, try_no):
+            raise socket.error("network is down")
+        self.ssdp._send_search = fail
+        self.assertRaises(socket.error, self.ssdp.discover, 1, 1)
+        self.assertEqual(len(self.opened), 2)
+        self.assertClosed()
+
+
+def notify(nts, server=None):
+    message = ("NOTIFY * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nNT: upnp:rootdevice\r\n"
+               "NTS: " + nts + "\r\nUSN: uuid:0a1b2c::upnp:rootdevice\r\n")
+    if server is not None:
+        message += "SERVER: " + server + "\r\n"
+    return (message + "\r\n").encode("utf8")
+
+
+class SSDPListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.listener = SSDPListener(lambda tv: self.events.append(("alive", tv.ip)),
+                                     lambda tv: self.events.append(("byebye", tv.ip)))
+
+    def testNotify(self):
+        self.listener._handle(notify("ssdp:alive", "WebOS/1.5 UPnP/1.0"), "192.168.1.5")
+        self.listener._handle(notify("ssdp:alive", "Linux/3.0 UPnP/1.0"), "192.168.1.6")
+        self.listener._handle(notify("ssdp:byebye"), "192.168.1.5")
+        self.listener._handle(RESPONSE, "192.168.1.5")
+        self.assertEqual(self.events, [("alive", "192.168.1.5"), ("byebye", "192.168.1.5")])
+
+    def testRepeatedNotify(self):
+        for _ in range(3):
+            self.listener._handle(notify("ssdp:alive", "WebOS/1.5 UPnP/1.0"), "192.168.1.5")
+        self.listener._handle(notify("ssdp:byebye"), "192.168.1.5")
+        # back online right away
+        self.listener._handle(notify("ssdp:alive", "WebOS/1.5 UPnP/1.0"), "192.168.1.5")
+        self.assertEqual(self.events, [("alive", "192.168.1.5"), ("byebye", "192.168.1.5"), ("alive", "192.168.1.5")])
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+    def testAdd(self):
+        cache = DiscoveryCache()
+        cache.add(DiscoveredTV("192.168.1.5", "uuid:a", "WebOS", 0.1))
+        cache.add(DiscoveredTV("192.168.1.6", "uuid:b", "WebOS", 0.1))
+        self.assertEqual(cache.ips(), ["192.168.1.6", "192.168.1.5"])
+        # the same TV got another IP
+        cache.add(DiscoveredTV("192.168.1.7", "uuid:a", "WebOS", 0.1))
+        self.assertEqual(cache.ips(), ["192.168.1.7", "192.168.1.6"])
+        cache.touch("192.168.1.6")
+        self.assertEqual(cache.ips(), ["192.168.1.6", "192.168.1.7"])
+
+    def testMAC(self):
+        cache = DiscoveryCache()
+        cache.add(DiscoveredTV("192.168.1.5", "uuid:a", "WebOS", 0.1))
+        cache.set_mac("192.168.1.5", "aa:bb:cc:dd:ee:05")
+        # DHCP moved the TV
+        cache.set_mac("192.168.1.7", "aa:bb:cc:dd:ee:05")
+        self.assertEqual(len(cache.entries), 1)
+        self.assertEqual(cache.entries[0]['usn'], "uuid:a")
+        self.assertEqual(cache.macs(), {"aa:bb:cc:dd:ee:05": "192.168.1.7"})
+        # unchanged
+        cache.changed = False
+        cache.set_mac("192.168.1.7", "aa:bb:cc:dd:ee:05")
+        self.assertFalse(cache.changed)
+        # found with SSDP again
+        cache.add(DiscoveredTV("192.168.1.8", "uuid:a", "WebOS", 0.1))
+        self.assertEqual(cache.macs(), {"aa:bb:cc:dd:ee:05": "192.168.1.8"})
+        # another device got the TV's old IP
+        cache.add(DiscoveredTV("192.168.1.8", "uuid:b", "WebOS", 0.1))
+        self.assertEqual(cache.macs(), {})
+
+    def testRoundTrip(self):
+        cache = DiscoveryCache()
+        cache.add(DiscoveredTV("192.168.1.5", "uuid:a", "WebOS", 0.1))
+        entries = cache.to_list()
+        entries.append({'ip': "192.168.1.8", 'seen': time.time() - DiscoveryCache.MAX_AGE - 1})
+        entries.append({'ip': "192.168.1.9"})
+        entries.append(None)
+        cache = DiscoveryCache.from_list(entries)
+        self.assertEqual(len(cache.entries), 2)
+        self.assertEqual(cache.ips(), ["192.168.1.5"])
+        self.assertEqual(DiscoveryCache.from_list("broken").entries, [])
+
+    def testProbe(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind(("127.0.0.1", 0))
+            server.listen(5)
+            port = server.getsockname()[1]
+            self.assertEqual(probe_webos(["127.0.0.2", "127.0.0.1"], 1, port), "127.0.0.1")
+            self.assertEqual(probe_webos(["127.0.0.1", "127.0.0.2"], 1, port), "127.0.0.1")
+        finally:
+            server.close()
+        self.assertIsNone(probe_webos(["127.0.0.1"], 1, port))
+        self.assertIsNone(probe_webos([], 1, port))
+
+    def testSweep(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind(("127.0.0.3", 0))
+            server.listen(5)
+            port = server.getsockname()[1]
+            ips = ["127.0.0.%d" % i for i in range(2, 12)]
+            progress = []
+            self.assertEqual(sweep_webos(ips, 0.5, 4, lambda done, total: progress.append((done, total)), port),
+                             ["127.0.0.3"])
+            self.assertEqual(progress, [(i, 10) for i in range(1, 11)])
+            # cancelled
+            self.assertEqual(sweep_webos(ips, 0.5, 1, lambda done, total: True, port), [])
+            # no WebSocket server
+            self.assertFalse(confirm_webos("127.0.0.3", 0.5, port))
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
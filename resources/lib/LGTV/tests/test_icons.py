@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+
+import os
+import shutil
+import sys
+import tempfile
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV.icons import Icon, IconRegistry
+from resources.lib.LGTV.lgtv import LGTV
+
+
+class IconRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def icon_file(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def testEncodesOnce(self):
+        registry = IconRegistry()
+        path = self.icon_file("kodi.PNG", b"icon")
+        icon = registry.get(path)
+        self.assertEqual(icon, Icon("aWNvbg==", "png"))
+        self.assertIs(registry.get(path), icon)
+
+    def testChangedFile(self):
+        registry = IconRegistry()
+        path = self.icon_file("kodi.png", b"icon")
+        registry.get(path)
+        # different size, so also detected within the mtime resolution
+        self.icon_file("kodi.png", b"new icon")
+        self.assertEqual(registry.get(path).data, "bmV3IGljb24=")
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        registry = IconRegistry(max_icons=2)
+        first = self.icon_file("1.png", b"1")
+        second = self.icon_file("2.png", b"2")
+        icon = registry.get(first)
+        registry.get(second)
+        registry.get(first)
+        registry.get(self.icon_file("3.png", b"3"))
+        self.assertIs(registry.get(first), icon)
+        self.assertEqual(len(registry._icons), 2)
+
+    def testMissingFile(self):
+        with self.assertRaises((IOError, OSError)):
+            IconRegistry().get(os.path.join(self.dir, "missing.png"))
+
+    def testToastPayload(self):
+        lgtv = LGTV(log=lambda *args: None)
+        success, icon = lgtv.register_icon(self.icon_file("kodi.png", b"icon"))
+        self.assertTrue(success)
+        os.remove(os.path.join(self.dir, "kodi.png"))
+        # registered icons need no file
+        self.assertEqual(lgtv._toast_payload("msg", icon=icon),
+                         (True, {'message': "msg", 'iconData': "aWNvbg==", 'iconExtension': "png"}))
+
+        success, result = lgtv._toast_payload("msg", icon_file=os.path.join(self.dir, "kodi.png"))
+        self.assertFalse(success)
+        self.assertTrue(result.startswith("Encoding icon failed"))
+
+
+if __name__ == "__main__":
+    unittest.main()
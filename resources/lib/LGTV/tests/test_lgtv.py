@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+#
+
+import socket
+import sys
+import threading
+import time
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV import discovery, lgtv, websocket
+from resources.lib.LGTV.discovery import DiscoveredTV
+from resources.lib.LGTV.enums import Display3dMode, RemoteButton
+from resources.lib.LGTV.keymanager import DummyKeyManager
+from resources.lib.LGTV.lgtv import LGTV, _PendingResponse
+from resources.lib.LGTV.tests.faketv import STATUS_3D, FakeTV
+
+VOLUME = "ssap://audio/getVolume"
+CHANNEL = "ssap://tv/getCurrentChannel"
+SET_3D_PATTERN = "ssap://com.webos.service.tv.display/set3DPattern"
+SET_3D_ON = "ssap://com.webos.service.tv.display/set3DOn"
+MAC_5 = "aa:bb:cc:dd:ee:05"
+MAC_6 = "aa:bb:cc:dd:ee:06"
+
+
+class PendingResponseTest(unittest.TestCase):
+    def testResult(self):
+        waiter = _PendingResponse()
+        self.assertFalse(waiter.done())
+        threading.Timer(0.1, waiter.set_result, ({'id': "1"},)).start()
+        self.assertEqual(waiter.result(2), {'id': "1"})
+        self.assertTrue(waiter.done())
+
+    def testTimeout(self):
+        start = time.time()
+        self.assertIsNone(_PendingResponse().result(0.1))
+        self.assertLess(time.time() - start, 1)
+
+
+class LGTVTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeTV()
+        self.create_connection = websocket.create_connection
+        websocket.create_connection = self.fake.create_connection
+        self.tv = LGTV(log=lambda *args: None)
+        self.assertTrue(self.tv.connect("192.0.2.5"))
+
+    def tearDown(self):
+        self.tv.disconnect()
+        websocket.create_connection = self.create_connection
+
+    def testConnect(self):
+        self.assertTrue(self.tv.is_connected())
+        self.assertEqual(self.tv.pairing_key, "KEY")
+        self.assertTrue(self.tv._reader.is_alive())
+
+    def testReorderedResponses(self):
+        self.fake.reorder = 2
+        results = self.tv._send_commands([(VOLUME, None), (CHANNEL, None)])
+        self.assertEqual(results, [(True, {'returnValue': True, 'volume': 11}), (True, {'returnValue': True})])
+
+    def testRequestsFromThreads(self):
+        # both requests are in flight at once, the TV answers the second first
+        self.fake.reorder = 2
+        results = {}
+        threads = [threading.Thread(target=lambda uri=uri: results.update({uri: self.tv._send_command(uri)}))
+                   for uri in (VOLUME, CHANNEL)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results[VOLUME], (True, {'returnValue': True, 'volume': 11}))
+        self.assertEqual(results[CHANNEL], (True, {'returnValue': True}))
+
+    def testTimeout(self):
+        self.tv.response_timeout = 0.2
+        self.fake.ignored.add(CHANNEL)
+        success, result = self.tv._send_command(CHANNEL)
+        self.assertFalse(success)
+        self.assertIn("No response", result)
+        self.assertEqual(self.tv._pending, {})
+        # the connection is still usable
+        self.assertEqual(self.tv._send_command(VOLUME)[0], True)
+
+    def testConnectionClosedWhilePending(self):
+        self.fake.ignored.add(CHANNEL)
+        responses = []
+        thread = threading.Thread(target=lambda: responses.extend(
+            self.tv._exchange([self.tv._make_request(CHANNEL)])))
+        thread.start()
+        time.sleep(0.2)
+        start = time.time()
+        self.fake.close()
+        thread.join(5)
+        self.assertEqual(responses, [None])
+        self.assertLess(time.time() - start, 2)
+        self.assertFalse(self.tv.is_connected())
+        # the next command reconnects
+        self.assertEqual(self.tv._send_command(VOLUME)[0], True)
+
+    def testSubscribe(self):
+        updates = []
+        changed = threading.Event()
+
+        def on_update(success, payload):
+            updates.append((success, payload['status3D']['pattern']))
+            changed.set()
+
+        success, subscription = self.tv.subscribe(STATUS_3D, on_update)
+        self.assertTrue(success)
+        # the first response is delivered as well
+        self.assertEqual(updates, [(True, '2d')])
+        changed.clear()
+        self.fake.set_mode(Display3dMode.TOP_BOTTOM)
+        self.assertTrue(changed.wait(2))
+        self.assertEqual(updates[-1], (True, 'top_bottom'))
+
+        self.assertEqual(self.tv.unsubscribe(subscription), (True, ""))
+        self.assertFalse(self.tv.unsubscribe(subscription)[0])
+        # the unsubscribe message is processed before the next request
+        self.tv._send_command(VOLUME)
+        self.assertIn(('unsubscribe', None), self.fake.requests)
+
+    def testSubscribeFails(self):
+        self.fake.push = False
+        success, result = self.tv.subscribe(STATUS_3D, lambda success, payload: None)
+        self.assertFalse(success)
+        self.assertEqual(self.tv._subscriptions, {})
+        self.assertFalse(self.tv._watch_3D_Mode())
+
+    def testPushed3DStatus(self):
+        self.assertTrue(self.tv._watch_3D_Mode())
+        reports = self.tv._3D_Mode_reports
+        self.fake.set_mode(Display3dMode.CHECK_BOARD)
+        self.assertTrue(self.fake.wait(lambda: self.tv._3D_Mode_reports > reports))
+        self.assertEqual(self.tv._reported_3D_Mode, Display3dMode.CHECK_BOARD)
+        # pushed modes are cached
+        requests = len(self.fake.requests)
+        self.assertEqual(self.tv.get_3D_Mode(), Display3dMode.CHECK_BOARD)
+        self.assertEqual(len(self.fake.requests), requests)
+
+    def testSubscriptionsEndWithConnection(self):
+        self.assertTrue(self.tv._watch_3D_Mode())
+        self.fake.close()
+        self.assertTrue(self.fake.wait(lambda: not self.tv.is_connected()))
+        # subscribes again after reconnecting
+        self.assertTrue(self.tv._watch_3D_Mode())
+        self.assertEqual(self.fake.requests.count(('subscribe', STATUS_3D)), 2)
+
+    def wait_for_top_bottom(self):
+        # switches the fake TV 0.2 seconds from now
+        since = self.tv._3D_Mode_reports
+        threading.Timer(0.2, self.fake.set_mode, (Display3dMode.TOP_BOTTOM,)).start()
+        start = time.time()
+        mode = self.tv._wait_for_3D_Mode(lambda m: m == Display3dMode.TOP_BOTTOM, 2, since)
+        return mode, time.time() - start
+
+    def testWaitForPushed3DMode(self):
+        self.assertTrue(self.tv._watch_3D_Mode())
+        requests = len(self.fake.requests)
+        mode, duration = self.wait_for_top_bottom()
+        self.assertEqual(mode, Display3dMode.TOP_BOTTOM)
+        self.assertLess(duration, 1)
+        # nothing was polled
+        self.assertEqual(len(self.fake.requests), requests)
+
+    def testWaitForPolled3DMode(self):
+        # no push arrives
+        self.fake.push = False
+        self.assertFalse(self.tv._watch_3D_Mode())
+        requests = len(self.fake.requests)
+        mode, duration = self.wait_for_top_bottom()
+        self.assertEqual(mode, Display3dMode.TOP_BOTTOM)
+        self.assertLess(duration, 1)
+        self.assertGreater(self.fake.requests[requests:].count(('request', STATUS_3D)), 1)
+
+    def testWaitTimesOut(self):
+        self.assertTrue(self.tv._watch_3D_Mode())
+        start = time.time()
+        mode = self.tv._wait_for_3D_Mode(lambda m: m == Display3dMode.TOP_BOTTOM, 0.3, self.tv._3D_Mode_reports)
+        self.assertEqual(mode, Display3dMode.OFF)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        # polled once more after the timeout
+        self.assertEqual(self.fake.requests[-1], ('request', STATUS_3D))
+
+    def testOldReportsDoNotCount(self):
+        self.assertTrue(self.tv._watch_3D_Mode())
+        since = self.tv._3D_Mode_reports
+        self.fake.set_mode(Display3dMode.TOP_BOTTOM)
+        self.assertEqual(self.tv._wait_for_3D_Mode(lambda m: m == Display3dMode.TOP_BOTTOM, 2, since),
+                         Display3dMode.TOP_BOTTOM)
+        # reported before since, waits for another report
+        since = self.tv._3D_Mode_reports
+        start = time.time()
+        self.tv._wait_for_3D_Mode(lambda m: m == Display3dMode.TOP_BOTTOM, 0.3, since)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def testSet3DMode(self):
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM), (True, ""))
+        self.assertEqual(self.fake.mode, Display3dMode.TOP_BOTTOM)
+        self.assertTrue(self.fake.wait(lambda: not self.fake.menu_open))
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.CHECK_BOARD), (True, ""))
+        self.assertEqual(self.fake.mode, Display3dMode.CHECK_BOARD)
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.OFF)[0], True)
+        self.assertEqual(self.fake.mode, Display3dMode.OFF)
+
+    def testWaitsForMenuToSettle(self):
+        # arrows pressed within a second after opening the menu are lost
+        self.fake.menu_settle = 1
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM), (True, ""))
+        # the first try worked
+        self.assertEqual(self.fake.buttons.count(RemoteButton.MODE_3D), 1)
+        self.assertLess(self.tv.timings.menu_settle, 1.5)
+        self.assertFalse(self.tv.timings.failed_menu_settle)
+
+    def record_writes(self):
+        # button names of each write to the pointer socket
+        self.assertTrue(self.tv._connect_input_pointer())
+        writes = []
+        send_many = self.tv.pointer_socket.send_many
+
+        def record(payloads):
+            writes.append([payload.split("name:", 1)[1].strip() for payload in payloads])
+            return send_many(payloads)
+        self.tv.pointer_socket.send_many = record
+        return writes
+
+    def testSendButtonsAtOnce(self):
+        writes = self.record_writes()
+        sequence = [RemoteButton.MODE_3D, [RemoteButton.RIGHT, RemoteButton.RIGHT], RemoteButton.LEFT]
+        self.assertEqual(self.tv.send_buttons(sequence), (True, ""))
+        self.assertEqual(writes, [[RemoteButton.MODE_3D, RemoteButton.RIGHT, RemoteButton.RIGHT, RemoteButton.LEFT]])
+        self.assertTrue(self.fake.wait(lambda: len(self.fake.buttons) == 4))
+
+    def testSendButtonsPaced(self):
+        writes = self.record_writes()
+        sequence = [RemoteButton.MODE_3D, [RemoteButton.RIGHT, RemoteButton.RIGHT], RemoteButton.LEFT, []]
+        start = time.time()
+        self.assertEqual(self.tv.send_buttons(sequence, pacing=0.1), (True, ""))
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        # a step is a button or a list of buttons sent with one write, empty
+        # steps are skipped
+        self.assertEqual(writes, [[RemoteButton.MODE_3D], [RemoteButton.RIGHT, RemoteButton.RIGHT], [RemoteButton.LEFT]])
+        self.assertTrue(self.fake.wait(lambda: len(self.fake.buttons) == 4))
+        self.assertEqual(self.fake.buttons, [RemoteButton.MODE_3D, RemoteButton.RIGHT, RemoteButton.RIGHT,
+                                             RemoteButton.LEFT])
+
+    def direct_requests(self):
+        return [r for r in self.fake.requests if r[1] in (SET_3D_PATTERN, SET_3D_ON)]
+
+    def testSet3DModeDirectly(self):
+        self.fake.direct_3D_uris.add(SET_3D_PATTERN)
+        self.fake.set_mode(Display3dMode.SIDE_SIDE_HALF)
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM), (True, ""))
+        self.assertEqual(self.fake.mode, Display3dMode.TOP_BOTTOM)
+        self.assertEqual(self.fake.buttons, [])
+        self.assertEqual(self.tv.timings.direct_3D_uri, SET_3D_PATTERN)
+
+    def testDirect3DFallback(self):
+        # set3DOn ignores the pattern
+        self.fake.set_mode(Display3dMode.SIDE_SIDE_HALF)
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM), (True, ""))
+        self.assertEqual(self.fake.mode, Display3dMode.TOP_BOTTOM)
+        self.assertEqual(self.tv.timings.direct_3D_uri, "")
+        self.assertEqual(self.tv.timings.failed_direct_3D_uris, [SET_3D_PATTERN, SET_3D_ON])
+        # not probed again
+        requests = len(self.direct_requests())
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.SIDE_SIDE_HALF), (True, ""))
+        self.assertEqual(len(self.direct_requests()), requests)
+
+    def testDirect3DProbeTimeout(self):
+        self.fake.ignored.add(SET_3D_PATTERN)
+        self.fake.direct_3D_uris.add(SET_3D_ON)
+        self.fake.set_mode(Display3dMode.SIDE_SIDE_HALF)
+        start = time.time()
+        self.assertEqual(self.tv.set_3D_Mode(Display3dMode.TOP_BOTTOM), (True, ""))
+        self.assertLess(time.time() - start, self.tv.response_timeout)
+        self.assertEqual(self.tv.timings.direct_3D_uri, SET_3D_ON)
+        self.assertEqual(self.tv.timings.failed_direct_3D_uris, [SET_3D_PATTERN])
+
+    def testDirect3DProbeCutShort(self):
+        # the 3D mode cannot be queried after the first probe
+        self.fake.direct_3D_uris.add(SET_3D_PATTERN)
+        self.tv._wait_for_3D_Mode = lambda accept, timeout, since: Display3dMode.ERROR
+        reported = self.tv._set_3D_Mode_directly(Display3dMode.TOP_BOTTOM, Display3dMode.SIDE_SIDE_HALF, 1)
+        self.assertEqual(reported, Display3dMode.ERROR)
+        self.assertEqual(self.tv.timings.failed_direct_3D_uris, [SET_3D_PATTERN])
+        # the others are probed next time
+        self.assertIsNone(self.tv.timings.direct_3D_uri)
+        self.assertEqual([e[0] for e in self.tv._direct_3D_endpoints(Display3dMode.TOP_BOTTOM,
+                                                                      Display3dMode.SIDE_SIDE_HALF)], [SET_3D_ON])
+
+
+class FakeSSDPListener(object):
+    # announcements are delivered by calling on_alive directly
+    def __init__(self, on_alive, on_byebye, log):
+        self.on_alive = on_alive
+        self.on_byebye = on_byebye
+
+    def start(self):
+        return True
+
+    def stop(self):
+        pass
+
+
+class ListeningTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeTV()
+        self.create_connection = websocket.create_connection
+        self.ssdp_listener = lgtv.SSDPListener
+        websocket.create_connection = self.fake.create_connection
+        lgtv.SSDPListener = FakeSSDPListener
+        self.tv = LGTV(log=lambda *args: None)
+
+    def tearDown(self):
+        self.tv.stop_listening()
+        self.tv.disconnect()
+        websocket.create_connection = self.create_connection
+        lgtv.SSDPListener = self.ssdp_listener
+
+    def testConnectsWhenTVComesOnline(self):
+        # the TV was off when listening started
+        self.assertTrue(self.tv.start_listening("192.0.2.5"))
+        self.assertFalse(self.tv.is_connected())
+        self.tv._listener.on_alive(DiscoveredTV("192.0.2.9", "uuid:b", "WebOS/1.5 UPnP/1.0", 0))
+        self.assertFalse(self.tv.is_connected())
+        self.tv._listener.on_alive(DiscoveredTV("192.0.2.5", "uuid:a", "WebOS/1.5 UPnP/1.0", 0))
+        self.assertTrue(self.tv.is_connected())
+        # ready for the first 3D switch
+        self.assertIn(('subscribe', STATUS_3D), self.fake.requests)
+
+        self.tv._listener.on_byebye(DiscoveredTV("192.0.2.5", "uuid:a", "", 0))
+        self.assertFalse(self.tv.is_connected())
+
+
+class CountingKeyManager(DummyKeyManager):
+    def __init__(self):
+        self.saved_discovered = []
+
+    def save_discovered(self, tvs):
+        self.saved_discovered.append(tvs)
+
+
+class RecordMACTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeTV()
+        self.create_connection = websocket.create_connection
+        self.neighbor_table = lgtv.neighbor_table
+        websocket.create_connection = self.fake.create_connection
+        self.lookups = 0
+        self.table = {"192.0.2.5": "aa:bb:cc:dd:ee:05"}
+        lgtv.neighbor_table = self.read_table
+        self.key_manager = CountingKeyManager()
+        self.tv = LGTV(self.key_manager, log=lambda *args: None)
+
+    def tearDown(self):
+        self.tv.disconnect()
+        websocket.create_connection = self.create_connection
+        lgtv.neighbor_table = self.neighbor_table
+
+    def read_table(self):
+        self.lookups += 1
+        return dict(self.table)
+
+    def testLookedUpOnce(self):
+        for _ in range(3):
+            self.assertTrue(self.tv.connect("192.0.2.5"))
+            self.tv.disconnect()
+        self.assertEqual(self.lookups, 1)
+        self.assertEqual(self.tv.discovered.macs(), {"aa:bb:cc:dd:ee:05": "192.0.2.5"})
+        self.assertEqual(len(self.key_manager.saved_discovered), 1)
+
+    def testLookedUpUntilFound(self):
+        self.table = {}
+        self.assertTrue(self.tv.connect("192.0.2.5"))
+        self.tv.disconnect()
+        self.table = {"192.0.2.5": "aa:bb:cc:dd:ee:05"}
+        self.assertTrue(self.tv.connect("192.0.2.5"))
+        self.assertEqual(self.lookups, 2)
+        self.assertEqual(len(self.key_manager.saved_discovered), 1)
+
+    def testUnchangedIsNotSaved(self):
+        # known from an earlier run, looked up again in case the IP went
+        # to another device
+        self.tv._discovery_cache().set_mac("192.0.2.5", "aa:bb:cc:dd:ee:05")
+        self.tv.discovered.changed = False
+        self.assertTrue(self.tv.connect("192.0.2.5"))
+        self.assertEqual(self.lookups, 1)
+        self.assertEqual(self.key_manager.saved_discovered, [])
+
+
+class StubSSDPDiscovery(object):
+    # answers with the TVs in found, must not be used if found is None
+    found = None
+
+    def __init__(self, log):
+        pass
+
+    def discover(self, timeout, tries, stop_at=None, limit=None):
+        if self.found is None:
+            raise AssertionError("SSDP was used")
+        return list(self.found)
+
+
+class DiscoverIPTest(unittest.TestCase):
+    def setUp(self):
+        self.patched = (lgtv.probe_webos, lgtv.SSDPDiscovery, discovery.neighbor_table)
+        # IPs accepting connections
+        self.alive = set()
+        self.table = {}
+        lgtv.probe_webos = lambda ips, timeout: next((ip for ip in ips if ip in self.alive), None)
+        lgtv.SSDPDiscovery = StubSSDPDiscovery
+        discovery.neighbor_table = lambda: dict(self.table)
+        self.tv = LGTV(log=lambda *args: None)
+        self.cache = self.tv._discovery_cache()
+
+    def tearDown(self):
+        lgtv.probe_webos, lgtv.SSDPDiscovery, discovery.neighbor_table = self.patched
+        StubSSDPDiscovery.found = None
+
+    def listen(self):
+        # a TV at 127.0.0.1, probed for real
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(5)
+        port = server.getsockname()[1]
+        lgtv.probe_webos = lambda ips, timeout: discovery.probe_webos(ips, timeout, port)
+        return server
+
+    def testReachableCachedTVSkipsSSDP(self):
+        old = time.time() - 3600
+        self.cache.entries = [{'ip': ip, 'usn': '', 'server': '', 'mac': '', 'seen': old}
+                              for ip in ("127.0.0.2", "127.0.0.1")]
+        server = self.listen()
+        try:
+            self.assertEqual(self.tv.discover_ip(probe_timeout=1), "127.0.0.1")
+        finally:
+            server.close()
+        self.assertEqual(self.cache.ips()[0], "127.0.0.1")
+        self.assertGreater(self.cache.entries[0]['seen'], old)
+
+    def testOtherCachedTVIsNotTaken(self):
+        # the configured TV is off, another one found before is on
+        self.cache.add(DiscoveredTV("127.0.0.1", "uuid:b", "WebOS", 0))
+        StubSSDPDiscovery.found = [DiscoveredTV("127.0.0.2", "uuid:a", "WebOS", 0.1)]
+        server = self.listen()
+        try:
+            self.assertEqual(self.tv.discover_ip(host="127.0.0.2", probe_timeout=0.5), "127.0.0.2")
+        finally:
+            server.close()
+
+    def testMovedTVIsFound(self):
+        # both TVs got another IP, the stale entry of the old IP is ignored
+        self.cache.set_mac("192.0.2.6", MAC_6)
+        self.cache.set_mac("192.0.2.5", MAC_5)
+        self.table = {"192.0.2.5": MAC_5, "192.0.2.8": MAC_6, "192.0.2.7": MAC_5}
+        self.alive = set(["192.0.2.7", "192.0.2.8"])
+        self.assertEqual(self.tv.discover_ip(host="192.0.2.5"), "192.0.2.7")
+        self.assertEqual(self.cache.macs(), {MAC_5: "192.0.2.7", MAC_6: "192.0.2.6"})
+        self.assertNotIn("192.0.2.5", self.cache.ips())
+
+
+if __name__ == "__main__":
+    unittest.main()
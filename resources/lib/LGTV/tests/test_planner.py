@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+
+import sys
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV.enums import Display3dMode, TransitionStep
+from resources.lib.LGTV.planner import TransitionPlanner
+from resources.lib.LGTV.timings import MenuTimings
+
+OFF = Display3dMode.OFF
+DISABLE = TransitionStep.DISABLE_3D
+ENABLE = TransitionStep.ENABLE_3D
+MENU = TransitionStep.OPEN_MENU
+LEFT = TransitionStep.LEFT
+RIGHT = TransitionStep.RIGHT
+CLOSE = TransitionStep.CLOSE_MENU
+
+
+class CostModelTest(unittest.TestCase):
+    def testPatterns(self):
+        for mode in range(Display3dMode.OFF, Display3dMode.LINE_INTERLEAVE_HALF + 1):
+            self.assertEqual(Display3dMode.from_string(Display3dMode.to_pattern(mode)), mode)
+
+    def testPlanCost(self):
+        planner = TransitionPlanner()
+        costs = MenuTimings(menu_open=0.5, arrow_press=0.1, arrow_pacing=0.0, mode_switch=0.8).step_costs()
+        state = (Display3dMode.TOP_BOTTOM, False, Display3dMode.TOP_BOTTOM)
+        self.assertAlmostEqual(planner.cost(state, [DISABLE, MENU, LEFT, CLOSE], costs),
+                               0.8 + 0.5 + 0.1 + MenuTimings.CLICK_COST)
+        # arrows only work in the menu
+        self.assertIsNone(planner.cost(state, [LEFT], costs))
+
+
+class TransitionPlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.costs = MenuTimings().step_costs()
+
+    def state(self, mode, menu_open=False, last_3D_mode=None):
+        if mode != OFF:
+            last_3D_mode = mode
+        return (mode, menu_open, last_3D_mode)
+
+    def testAlreadyThere(self):
+        planner = TransitionPlanner()
+        self.assertEqual(planner.plan(self.state(OFF), OFF, self.costs), [])
+        self.assertEqual(planner.plan(self.state(Display3dMode.TOP_BOTTOM), Display3dMode.TOP_BOTTOM, self.costs), [])
+
+    def testDisable(self):
+        planner = TransitionPlanner()
+        self.assertEqual(planner.plan(self.state(Display3dMode.TOP_BOTTOM), OFF, self.costs), [DISABLE])
+
+    def testBetween3DModesWithOffOnCycle(self):
+        # without menu_from_3D, the 3D button only opens the menu from 2D
+        planner = TransitionPlanner()
+        plan = planner.plan(self.state(Display3dMode.SIDE_SIDE_HALF), Display3dMode.FRAME_SEQUENTIAL, self.costs)
+        self.assertEqual(plan, [DISABLE, MENU, RIGHT, RIGHT, RIGHT, CLOSE])
+
+    def testBetween3DModesWithoutOffOnCycle(self):
+        planner = TransitionPlanner(menu_from_3D=True)
+        plan = planner.plan(self.state(Display3dMode.SIDE_SIDE_HALF), Display3dMode.FRAME_SEQUENTIAL, self.costs)
+        self.assertEqual(plan, [MENU, RIGHT, RIGHT, RIGHT, CLOSE])
+
+    def testWrapAround(self):
+        first, last = Display3dMode.CONVERT_2D_TO_3D, Display3dMode.LINE_INTERLEAVE_HALF
+        planner = TransitionPlanner(menu_from_3D=True)
+        self.assertEqual(planner.plan(self.state(first), last, self.costs), [MENU] + [RIGHT] * 6 + [CLOSE])
+        self.assertIsNone(planner.apply(self.state(first, True), LEFT))
+
+        planner.wrap_around = True
+        self.assertEqual(planner.plan(self.state(first), last, self.costs), [MENU, LEFT, CLOSE])
+        self.assertEqual(planner.apply(self.state(last, True), RIGHT), self.state(first, True))
+
+    def testFromOpenMenu(self):
+        # planning again after arrows got lost
+        planner = TransitionPlanner()
+        plan = planner.plan(self.state(Display3dMode.TOP_BOTTOM, True), Display3dMode.SIDE_SIDE_HALF, self.costs)
+        self.assertEqual(plan, [LEFT, CLOSE])
+
+    def testFromOffWithKnownLastMode(self):
+        planner = TransitionPlanner()
+        state = self.state(OFF, last_3D_mode=Display3dMode.CHECK_BOARD)
+        self.assertEqual(planner.plan(state, Display3dMode.CHECK_BOARD, self.costs), [ENABLE])
+        self.assertEqual(planner.plan(state, Display3dMode.TOP_BOTTOM, self.costs), [MENU, LEFT, CLOSE])
+
+        # opening and closing the menu is cheaper than a slow ssap switch
+        costs = MenuTimings(mode_switch=2.0).step_costs()
+        self.assertEqual(planner.plan(state, Display3dMode.CHECK_BOARD, costs), [MENU, CLOSE])
+
+    def testFromOffWithUnknownLastMode(self):
+        # the plan ends with the step revealing the last 3D mode
+        planner = TransitionPlanner()
+        self.assertEqual(planner.plan(self.state(OFF), Display3dMode.CHECK_BOARD, self.costs), [MENU])
+        self.assertEqual(planner.apply(self.state(OFF), MENU), (None, True, None))
+
+        # unless opening the menu is much slower than probing via ssap
+        costs = MenuTimings(menu_open=3.0, mode_switch=0.1).step_costs()
+        self.assertEqual(planner.plan(self.state(OFF), Display3dMode.CHECK_BOARD, costs), [ENABLE])
+
+    def testPlansAreCheapest(self):
+        # never worse than the fixed off/on cycle used before
+        planner = TransitionPlanner(wrap_around=True, menu_from_3D=True)
+        modes = range(Display3dMode.CONVERT_2D_TO_3D, Display3dMode.LINE_INTERLEAVE_HALF + 1)
+        for current_mode in modes:
+            for mode in modes:
+                state = self.state(current_mode)
+                plan = planner.plan(state, mode, self.costs)
+                delta = mode - current_mode
+                fixed = [DISABLE, MENU] + [LEFT if delta < 0 else RIGHT] * abs(delta) + [CLOSE]
+                self.assertLessEqual(planner.cost(state, plan, self.costs),
+                                     planner.cost(state, fixed, self.costs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+
+import sys
+import time
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV.state import StateCache
+
+
+class StateCacheTest(unittest.TestCase):
+    def testGetSet(self):
+        state = StateCache()
+        self.assertIsNone(state.get(StateCache.VOLUME))
+        state.set(StateCache.VOLUME, 11)
+        self.assertEqual(state.get(StateCache.VOLUME), 11)
+        # falsy values are values, too
+        state.set(StateCache.MODE_3D, 0)
+        self.assertEqual(state.get(StateCache.MODE_3D), 0)
+
+    def testTTL(self):
+        state = StateCache(ttl=0.05)
+        state.set(StateCache.VOLUME, 11)
+        time.sleep(0.1)
+        self.assertIsNone(state.get(StateCache.VOLUME))
+
+        state.ttl = 0
+        state.set(StateCache.VOLUME, 11)
+        time.sleep(0.01)
+        self.assertIsNone(state.get(StateCache.VOLUME))
+
+    def testInvalidate(self):
+        state = StateCache()
+        state.set(StateCache.VOLUME, 11)
+        state.set(StateCache.INPUT, "HDMI_1")
+        state.set(StateCache.MODE_3D, 2)
+        state.invalidate(StateCache.INPUT, StateCache.MODE_3D)
+        self.assertEqual(state.get(StateCache.VOLUME), 11)
+        self.assertIsNone(state.get(StateCache.INPUT))
+        self.assertIsNone(state.get(StateCache.MODE_3D))
+
+        state.clear()
+        self.assertIsNone(state.get(StateCache.VOLUME))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+
+import sys
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+from resources.lib.LGTV.enums import TransitionStep
+from resources.lib.LGTV.timings import MenuTimings
+
+DISABLE = TransitionStep.DISABLE_3D
+ENABLE = TransitionStep.ENABLE_3D
+MENU = TransitionStep.OPEN_MENU
+LEFT = TransitionStep.LEFT
+RIGHT = TransitionStep.RIGHT
+CLOSE = TransitionStep.CLOSE_MENU
+
+
+class MenuTimingsTest(unittest.TestCase):
+    def testStepCosts(self):
+        timings = MenuTimings(menu_open=0.5, arrow_press=0.1, arrow_pacing=0.05, mode_switch=0.8)
+        costs = timings.step_costs()
+        self.assertEqual(costs[DISABLE], 0.8)
+        self.assertEqual(costs[ENABLE], 0.8)
+        self.assertEqual(costs[MENU], 0.5)
+        self.assertAlmostEqual(costs[LEFT], 0.15)
+        self.assertAlmostEqual(costs[RIGHT], 0.15)
+        self.assertEqual(costs[CLOSE], MenuTimings.CLICK_COST)
+
+    def testModeSwitchIsLearned(self):
+        timings = MenuTimings(mode_switch=0.5)
+        timings.record_mode_switch(1.0)
+        self.assertEqual(timings.step_costs()[ENABLE], 1.0)
+        self.assertTrue(timings.changed)
+
+        restored = MenuTimings.from_dict(timings.to_dict())
+        self.assertEqual(restored.mode_switch, 1.0)
+        # timings stored before mode_switch existed
+        self.assertEqual(MenuTimings.from_dict({'menu_open': 1.0}).mode_switch, MenuTimings().mode_switch)
+
+    def testDirect3DUriIsRemembered(self):
+        timings = MenuTimings()
+        self.assertNotIn('direct_3D_uri', timings.to_dict())
+        self.assertIsNone(MenuTimings.from_dict(timings.to_dict()).direct_3D_uri)
+
+        # "" means the TV has no such endpoint
+        timings.record_direct_3D_uri("")
+        self.assertTrue(timings.changed)
+        self.assertEqual(MenuTimings.from_dict(timings.to_dict()).direct_3D_uri, "")
+
+    def testDirect3DFailuresAreRemembered(self):
+        timings = MenuTimings()
+        timings.record_direct_3D_failure("ssap://a")
+        timings.record_direct_3D_failure("ssap://a")
+        self.assertTrue(timings.changed)
+        restored = MenuTimings.from_dict(timings.to_dict())
+        self.assertEqual(restored.failed_direct_3D_uris, ["ssap://a"])
+        # probing everything again forgets them
+        restored.record_direct_3D_uri(None)
+        self.assertEqual(restored.failed_direct_3D_uris, [])
+        self.assertNotIn('failed_direct_3D_uris', restored.to_dict())
+
+    def testStartsWithOldDelays(self):
+        # what used to be hard-coded: 1.5 seconds after the 3D button and
+        # 0.25 seconds between arrows
+        timings = MenuTimings()
+        self.assertEqual(timings.menu_settle, 1.5)
+        self.assertEqual(timings.arrow_pacing, 0.25)
+        # timings stored before menu_settle existed
+        restored = MenuTimings.from_dict({'menu_open': 1.0, 'arrow_pacing': 0.0})
+        self.assertEqual(restored.menu_settle, 1.5)
+
+    def testMenuSettleIsLearned(self):
+        timings = MenuTimings()
+        for _ in range(30):
+            timings.record_menu_settle(True)
+        self.assertEqual(timings.menu_settle, 0.0)
+        self.assertTrue(timings.changed)
+
+        timings = MenuTimings(menu_settle=0.4)
+        timings.record_menu_settle(False)
+        self.assertEqual(timings.menu_settle, 0.8)
+        # never learns down to what failed before
+        for _ in range(30):
+            timings.record_menu_settle(True)
+        self.assertAlmostEqual(timings.menu_settle, 0.5)
+
+        restored = MenuTimings.from_dict(timings.to_dict())
+        self.assertAlmostEqual(restored.menu_settle, 0.5)
+        self.assertAlmostEqual(restored.failed_menu_settle, 0.4)
+
+    def testMenuSettleIsCapped(self):
+        timings = MenuTimings(menu_settle=0.0)
+        timings.record_menu_settle(False)
+        self.assertEqual(timings.menu_settle, MenuTimings.MIN_DELAY)
+        for _ in range(10):
+            timings.record_menu_settle(False)
+        self.assertEqual(timings.menu_settle, MenuTimings.MAX_MENU_DELAY)
+
+    def testArrowPacingIsLearned(self):
+        timings = MenuTimings()
+        timings.record_arrow_sequence(True)
+        self.assertAlmostEqual(timings.arrow_pacing, 0.2)
+        for _ in range(30):
+            timings.record_arrow_sequence(True)
+        self.assertEqual(timings.arrow_pacing, 0.0)
+
+        # backs off to at least the press duration
+        timings.record_arrow_sequence(False)
+        self.assertEqual(timings.arrow_pacing, timings.arrow_press)
+        timings.record_arrow_sequence(False)
+        self.assertEqual(timings.arrow_pacing, 2 * timings.arrow_press)
+        for _ in range(30):
+            timings.record_arrow_sequence(True)
+        self.assertAlmostEqual(timings.arrow_pacing, timings.arrow_press * MenuTimings.FAILED_PACING_MARGIN)
+
+    def testSuccessAtZeroIsNoChange(self):
+        timings = MenuTimings(arrow_pacing=0.0, menu_settle=0.0)
+        timings.record_arrow_sequence(True)
+        timings.record_menu_settle(True)
+        self.assertFalse(timings.changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+from .enums import TransitionStep
+
+
+class MenuTimings(object):
+    # Timing of the 3D menu of one TV in seconds, learned while switching
+    # 3D modes. Estimates follow slower measurements at once but faster
+    # ones only slowly, so the delays derived from them shrink only as far
+    # as they keep working.
+
+    # deadlines are the estimated durations times MARGIN
+    MARGIN = 2.0
+    # weight of a faster measurement in the estimate
+    SMOOTHING = 0.3
+    MIN_DELAY = 0.1
+    MAX_MENU_DELAY = 3.0
+    MAX_ARROW_DELAY = 1.0
+    # menu settle time and pacing between arrow presses shrink by this
+    # factor per success, but stay this much above a value that failed
+    PACING_DECAY = 0.8
+    FAILED_PACING_MARGIN = 1.25
+    # closing the menu is not waited for
+    CLICK_COST = 0.05
+
+    def __init__(self, menu_open=0.75, arrow_press=0.125, arrow_pacing=0.25, mode_switch=0.75, menu_settle=1.5):
+        # type: (float, float, float, float, float) -> None
+        # defaults result in the delays that used to be hard-coded
+        self.menu_open = menu_open          # type: float
+        self.arrow_press = arrow_press      # type: float
+        self.arrow_pacing = arrow_pacing    # type: float
+        # the menu ignores arrows for a while after it opened
+        self.menu_settle = menu_settle      # type: float
+        # last menu_settle and arrow_pacing that lost presses, 0 if none
+        self.failed_menu_settle = 0.0       # type: float
+        self.failed_arrow_pacing = 0.0      # type: float
+        # 3D on/off via ssap until reported
+        self.mode_switch = mode_switch      # type: float
+        # ssap URI setting the 3D pattern directly, "" if the TV has none,
+        # None if not probed yet (see LGTV.DIRECT_3D_ENDPOINTS)
+        self.direct_3D_uri = None           # type: str
+        # URIs that did not set the 3D pattern when probed
+        self.failed_direct_3D_uris = []     # type: list
+        self.changed = False                # type: bool
+
+    @classmethod
+    def from_dict(cls, d):
+        # type: (dict) -> MenuTimings
+        # tolerates missing or broken values of older versions
+        timings = cls()
+        for name in ('menu_open', 'arrow_press', 'arrow_pacing', 'mode_switch', 'menu_settle',
+                     'failed_menu_settle', 'failed_arrow_pacing'):
+            try:
+                value = float(d[name])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if value >= 0:
+                setattr(timings, name, value)
+        if isinstance(d.get('direct_3D_uri'), (type(""), type(u""))):
+            timings.direct_3D_uri = d['direct_3D_uri']
+        if isinstance(d.get('failed_direct_3D_uris'), list):
+            timings.failed_direct_3D_uris = [uri for uri in d['failed_direct_3D_uris']
+                                             if isinstance(uri, (type(""), type(u"")))]
+        return timings
+
+    def to_dict(self):
+        # type: () -> dict
+        d = {
+            'menu_open': round(self.menu_open, 3),
+            'arrow_press': round(self.arrow_press, 3),
+            'arrow_pacing': round(self.arrow_pacing, 3),
+            'mode_switch': round(self.mode_switch, 3),
+            'menu_settle': round(self.menu_settle, 3),
+            'failed_menu_settle': round(self.failed_menu_settle, 3),
+            'failed_arrow_pacing': round(self.failed_arrow_pacing, 3)
+        }
+        if self.direct_3D_uri is not None:
+            d['direct_3D_uri'] = self.direct_3D_uri
+        if self.failed_direct_3D_uris:
+            d['failed_direct_3D_uris'] = list(self.failed_direct_3D_uris)
+        return d
+
+    def step_costs(self):
+        # type: () -> dict
+        # expected duration of each TransitionStep, see TransitionPlanner
+        arrow = self.arrow_press + self.arrow_pacing
+        return {
+            TransitionStep.DISABLE_3D: self.mode_switch,
+            TransitionStep.ENABLE_3D: self.mode_switch,
+            TransitionStep.OPEN_MENU: self.menu_open,
+            TransitionStep.LEFT: arrow,
+            TransitionStep.RIGHT: arrow,
+            TransitionStep.CLOSE_MENU: self.CLICK_COST
+        }
+
+    def menu_delay(self):
+        # type: () -> float
+        # longest wait for the 3D menu to open
+        return self._clamp(self.menu_open * self.MARGIN, self.MAX_MENU_DELAY)
+
+    def arrow_delay(self):
+        # type: () -> float
+        # longest wait for one arrow press to be reported
+        return self._clamp(self.arrow_press * self.MARGIN, self.MAX_ARROW_DELAY)
+
+    def record_menu_open(self, duration):
+        # type: (float) -> ()
+        self.menu_open = self._estimate(self.menu_open, duration)
+
+    def record_direct_3D_uri(self, uri):
+        # type: (str) -> ()
+        # None probes all URIs again
+        if uri is None and self.failed_direct_3D_uris:
+            self.failed_direct_3D_uris = []
+            self.changed = True
+        if uri != self.direct_3D_uri:
+            self.direct_3D_uri = uri
+            self.changed = True
+
+    def record_direct_3D_failure(self, uri):
+        # type: (str) -> ()
+        # probing uri did not set the 3D pattern, do not probe it again
+        if uri not in self.failed_direct_3D_uris:
+            self.failed_direct_3D_uris.append(uri)
+            self.changed = True
+
+    def record_mode_switch(self, duration):
+        # type: (float) -> ()
+        self.mode_switch = self._estimate(self.mode_switch, duration)
+
+    def record_arrow_press(self, duration):
+        # type: (float) -> ()
+        self.arrow_press = self._estimate(self.arrow_press, duration)
+
+    def record_lost_press(self):
+        # type: () -> ()
+        # a press was not reported within arrow_delay(), wait longer next time
+        self.arrow_press = min(self.arrow_press * 2, self.MAX_ARROW_DELAY / self.MARGIN)
+        self.changed = True
+
+    def record_menu_settle(self, success):
+        # type: (bool) -> ()
+        # The first arrow pressed menu_settle seconds after the menu opened
+        # was (not) registered.
+        if success:
+            self.menu_settle = self._shrink(self.menu_settle, self.failed_menu_settle)
+        else:
+            self.failed_menu_settle = self.menu_settle
+            self.menu_settle = min(max(2 * self.menu_settle, self.MIN_DELAY), self.MAX_MENU_DELAY)
+            self.changed = True
+
+    def record_arrow_sequence(self, success):
+        # type: (bool) -> ()
+        # Arrow presses sent in a row were (not) all registered. Pacing
+        # starts as slow as it used to be hard-coded, shrinks while
+        # sequences keep succeeding and backs off after a failure.
+        if success:
+            self.arrow_pacing = self._shrink(self.arrow_pacing, self.failed_arrow_pacing)
+        else:
+            self.failed_arrow_pacing = self.arrow_pacing
+            self.arrow_pacing = min(max(2 * self.arrow_pacing, self.arrow_press), self.MAX_ARROW_DELAY)
+            self.changed = True
+
+    def _shrink(self, delay, failed_delay):
+        # type: (float, float) -> float
+        # next delay after delay worked, 0 once it gets negligible
+        new_delay = max(delay * self.PACING_DECAY, failed_delay * self.FAILED_PACING_MARGIN)
+        if new_delay < self.MIN_DELAY / 2:
+            new_delay = 0.0
+        if new_delay != delay:
+            self.changed = True
+        return new_delay
+
+    def _estimate(self, estimate, duration):
+        # type: (float, float) -> float
+        if duration > estimate:
+            new_estimate = duration
+        else:
+            new_estimate = estimate + self.SMOOTHING * (duration - estimate)
+        if new_estimate != estimate:
+            self.changed = True
+        return new_estimate
+
+    def _clamp(self, delay, max_delay):
+        # type: (float, float) -> float
+        return min(max(delay, self.MIN_DELAY), max_delay)
@@ -19,7 +19,12 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
     Boston, MA  02110-1335  USA
 
 """
+import six
+
 from ._core import *
 from ._app import WebSocketApp
 
+if six.PY3:
+    from ._asyncio import AsyncWebSocket, create_async_connection
+
 __version__ = "0.37.0"
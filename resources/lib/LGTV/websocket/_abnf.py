@@ -20,11 +20,55 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
 
 """
 import six
-import array
+import binascii
 import struct
 import os
+import threading
+import zlib
 from ._exceptions import *
-from ._utils import validate_utf8
+from ._utils import NoLock, validate_utf8, utf8_validator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# payloads of at least this many bytes are masked with numpy (if installed),
+# below that the setup cost of numpy arrays outweighs its speed.
+_NUMPY_MASK_THRESHOLD = 4096
+
+
+def _tile_mask_key(_m, length):
+    q, r = divmod(length, 4)
+    return _m * q + _m[:r]
+
+if six.PY3:
+    def _mask_words(_m, _d):
+        # xor the whole payload as one big integer, which CPython does
+        # a machine word at a time.
+        length = len(_d)
+        if not length:
+            return b""
+        value = int.from_bytes(_d, "big") ^ int.from_bytes(_tile_mask_key(_m, length), "big")
+        return value.to_bytes(length, "big")
+else:
+    def _mask_words(_m, _d):
+        length = len(_d)
+        if not length:
+            return ""
+        value = int(binascii.hexlify(_d), 16) ^ int(binascii.hexlify(_tile_mask_key(_m, length)), 16)
+        return binascii.unhexlify("%0*x" % (2 * length, value))
+
+
+def _mask_numpy(_m, _d):
+    words = len(_d) // 4
+    # both key and data are read in native byte order, so byte i of the
+    # payload is still xor'ed with byte i % 4 of the key.
+    masked = numpy.frombuffer(_d, dtype=numpy.uint32, count=words) ^ numpy.frombuffer(_m, dtype=numpy.uint32)[0]
+    masked = masked.tobytes()
+    if len(_d) > words * 4:
+        masked += _mask_words(_m, _d[words * 4:])
+    return masked
 
 try:
     # If wsaccel is available we use compiled routines to mask data.
@@ -36,13 +80,41 @@ try:
 except ImportError:
     # wsaccel is not available, we rely on python implementations.
     def _mask(_m, _d):
-        for i in range(len(_d)):
-            _d[i] ^= _m[i % 4]
+        if numpy is not None and len(_d) >= _NUMPY_MASK_THRESHOLD:
+            return _mask_numpy(_m, _d)
+        return _mask_words(_m, _d)
 
-        if six.PY3:
-            return _d.tobytes()
-        else:
-            return _d.tostring()
+class mask_key_pool(object):
+    """
+    mask key generator which hands out keys from a pool of random bytes.
+    The pool is refilled in batches, so getting a key usually does not
+    cost a system call like os.urandom(4) does.
+    Instances can be passed to WebSocket.set_mask_key.
+    """
+    def __init__(self, pool_size=4096, lock=None, random_bytes=os.urandom):
+        """
+        pool_size: number of random bytes fetched at once.
+        lock: lock to make the pool thread-safe, e.g. threading.Lock().
+        random_bytes: source of randomness, takes a length like os.urandom.
+        """
+        self.pool_size = pool_size
+        self.lock = lock if lock is not None else NoLock()
+        self.random_bytes = random_bytes
+        self.pool = six.b("")
+        self.pos = 0
+
+    def __call__(self, length):
+        with self.lock:
+            if self.pos + length > len(self.pool):
+                self.pool = self.random_bytes(max(self.pool_size, length))
+                self.pos = 0
+            start = self.pos
+            self.pos += length
+            return self.pool[start:self.pos]
+
+# shared by all frames which are not sent through a WebSocket with its own
+# mask key generator.
+_default_mask_key_pool = mask_key_pool(lock=threading.Lock())
 
 # closing frame status codes.
 STATUS_NORMAL = 1000
@@ -70,6 +142,17 @@ VALID_CLOSE_STATUS = (
     STATUS_UNEXPECTED_CONDITION,
     )
 
+# precompiled structs to encode and decode frame headers
+_HEADER_STRUCT = struct.Struct("!BB")
+_LENGTH_16_STRUCT = struct.Struct("!H")
+_LENGTH_63_STRUCT = struct.Struct("!Q")
+# complete headers by length encoding, without and with mask key
+_HEADER_STRUCTS = (
+    (_HEADER_STRUCT, struct.Struct("!BB4s")),
+    (struct.Struct("!BBH"), struct.Struct("!BBH4s")),
+    (struct.Struct("!BBQ"), struct.Struct("!BBQ4s")),
+    )
+
 class ABNF(object):
     """
     ABNF frame class.
@@ -119,14 +202,16 @@ class ABNF(object):
         if data == None:
             data = ""
         self.data = data
-        self.get_mask_key = os.urandom
+        self.get_mask_key = _default_mask_key_pool
 
-    def validate(self, skip_utf8_validation=False):
+    def validate(self, skip_utf8_validation=False, rsv1_allowed=False):
         """
         validate the ABNF frame.
         skip_utf8_validation: skip utf8 validation.
+        rsv1_allowed: rsv1 is used by a negotiated extension (permessage-deflate).
         """
-        if self.rsv1 or self.rsv2 or self.rsv3:
+        rsv1_allowed = rsv1_allowed and self.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY)
+        if (self.rsv1 and not rsv1_allowed) or self.rsv2 or self.rsv3:
             raise WebSocketProtocolException("rsv is not implemented, yet")
 
         if self.opcode not in ABNF.OPCODES:
@@ -178,6 +263,14 @@ class ABNF(object):
         """
         format this object to string(byte array) to send data to server.
         """
+        return six.b("").join(self.format_parts())
+
+    def format_parts(self):
+        """
+        format this object like format(), but return the frame header
+        (including the mask key) and the payload as separate buffers.
+        The caller can send them without concatenating them first.
+        """
         if any(x not in (0, 1) for x in [self.fin, self.rsv1, self.rsv2, self.rsv3]):
             raise ValueError("not 0 or 1")
         if self.opcode not in ABNF.OPCODES:
@@ -186,39 +279,33 @@ class ABNF(object):
         if length >= ABNF.LENGTH_63:
             raise ValueError("data is too long")
 
-        frame_header = chr(self.fin << 7
-                           | self.rsv1 << 6 | self.rsv2 << 5 | self.rsv3 << 4
-                           | self.opcode)
+        b1 = (self.fin << 7
+              | self.rsv1 << 6 | self.rsv2 << 5 | self.rsv3 << 4
+              | self.opcode)
         if length < ABNF.LENGTH_7:
-            frame_header += chr(self.mask << 7 | length)
-            frame_header = six.b(frame_header)
+            header_structs = _HEADER_STRUCTS[0]
+            header_args = [b1, self.mask << 7 | length]
         elif length < ABNF.LENGTH_16:
-            frame_header += chr(self.mask << 7 | 0x7e)
-            frame_header = six.b(frame_header)
-            frame_header += struct.pack("!H", length)
+            header_structs = _HEADER_STRUCTS[1]
+            header_args = [b1, self.mask << 7 | 0x7e, length]
         else:
-            frame_header += chr(self.mask << 7 | 0x7f)
-            frame_header = six.b(frame_header)
-            frame_header += struct.pack("!Q", length)
+            header_structs = _HEADER_STRUCTS[2]
+            header_args = [b1, self.mask << 7 | 0x7f, length]
 
         if not self.mask:
-            return frame_header + self.data
-        else:
-            mask_key = self.get_mask_key(4)
-            return frame_header + self._get_masked(mask_key)
-
-    def _get_masked(self, mask_key):
-        s = ABNF.mask(mask_key, self.data)
+            return [header_structs[0].pack(*header_args), self.data]
 
+        mask_key = self.get_mask_key(4)
         if isinstance(mask_key, six.text_type):
             mask_key = mask_key.encode('utf-8')
-
-        return mask_key + s
+        header_args.append(mask_key)
+        return [header_structs[1].pack(*header_args), ABNF.mask(mask_key, self.data)]
 
     @staticmethod
     def mask(mask_key, data):
         """
         mask or unmask data. Just do xor for each byte
+        (in practice, for whole words at once).
 
         mask_key: 4 byte string(byte).
 
@@ -233,128 +320,155 @@ class ABNF(object):
         if isinstance(data, six.text_type):
             data = six.b(data)
 
-        _m = array.array("B", mask_key)
-        _d = array.array("B", data)
-        return _mask(_m, _d)
+        return _mask(mask_key, data)
 
-class frame_buffer(object):
-    _HEADER_MASK_INDEX = 5
-    _HEADER_LENGHT_INDEX = 6
+# first header byte of text/binary/continuation frames without rsv bits.
+# These frames need no further validation.
+_PLAIN_DATA_FRAME_HEADERS = frozenset(
+    fin << 7 | opcode
+    for fin in (0, 1)
+    for opcode in (ABNF.OPCODE_CONT, ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY))
+
+def format_frames(frames, get_mask_key=None, deflate=None):
+    """
+    format frames to be sent to the server, in this order.
+
+    get_mask_key: mask key generator to use instead of the frames' own one.
+    deflate: permessage_deflate instance, if negotiated.
 
-    def __init__(self, recv_fn, skip_utf8_validation):
-        self.recv = recv_fn
+    return value: list of buffers (header and payload for each frame).
+    """
+    parts = []
+    for frame in frames:
+        if get_mask_key:
+            frame.get_mask_key = get_mask_key
+        if deflate is not None:
+            frame = deflate.compress(frame)
+        parts.extend(frame.format_parts())
+    return parts
+
+class frame_buffer(object):
+    # the receive buffer starts with this size and is shrunk back to it
+    # once it is empty and has grown beyond _MAX_IDLE_BUFFER_SIZE for a
+    # big frame.
+    _INITIAL_BUFFER_SIZE = 16384
+    _MAX_IDLE_BUFFER_SIZE = 1 << 18
+
+    def __init__(self, recv_into_fn, skip_utf8_validation):
+        self.recv_into = recv_into_fn
         self.skip_utf8_validation = skip_utf8_validation
+        # permessage_deflate instance, if negotiated
+        self.deflate = None
         # Buffers over the packets from the layer beneath until desired amount
-        # bytes of bytes are received.
-        self.recv_buffer = []
-        self.clear()
-
-    def clear(self):
-        self.header = None
-        self.length = None
-        self.mask = None
-
-    def has_received_header(self):
-        return  self.header is None
-
-    def recv_header(self):
-        header = self.recv_strict(2)
-        b1 = header[0]
-
-        if six.PY2:
-            b1 = ord(b1)
-
-        fin = b1 >> 7 & 1
-        rsv1 = b1 >> 6 & 1
-        rsv2 = b1 >> 5 & 1
-        rsv3 = b1 >> 4 & 1
-        opcode = b1 & 0xf
-        b2 = header[1]
-
-        if six.PY2:
-            b2 = ord(b2)
-
-        has_mask = b2 >> 7 & 1
-        length_bits = b2 & 0x7f
-
-        self.header = (fin, rsv1, rsv2, rsv3, opcode, has_mask, length_bits)
-
-    def has_mask(self):
-        if not self.header:
-            return False
-        return self.header[frame_buffer._HEADER_MASK_INDEX]
-
-
-    def has_received_length(self):
-        return self.length is None
-
-    def recv_length(self):
-        bits = self.header[frame_buffer._HEADER_LENGHT_INDEX]
-        length_bits = bits & 0x7f
-        if length_bits == 0x7e:
-            v = self.recv_strict(2)
-            self.length = struct.unpack("!H", v)[0]
-        elif length_bits == 0x7f:
-            v = self.recv_strict(8)
-            self.length = struct.unpack("!Q", v)[0]
-        else:
-            self.length = length_bits
+        # bytes of bytes are received. Bytes in recv_buffer[read_pos:write_pos]
+        # have been received but not consumed yet.
+        self.recv_buffer = bytearray(frame_buffer._INITIAL_BUFFER_SIZE)
+        self.read_pos = 0
+        self.write_pos = 0
 
-    def has_received_mask(self):
-        return self.mask is None
+    def recv_frame(self):
+        # The header is decoded straight from the receive buffer. Nothing
+        # is consumed until the whole frame has been received, so after a
+        # timeout the next call simply decodes the same header again.
+        self._fill(2)
+        b1, b2 = _HEADER_STRUCT.unpack_from(self.recv_buffer, self.read_pos)
+        has_mask = b2 >> 7
+        length = b2 & 0x7f
+        if length == 0x7e:
+            header_length = 4
+        elif length == 0x7f:
+            header_length = 10
+        else:
+            header_length = 2
+        if has_mask:
+            header_length += 4
 
-    def recv_mask(self):
-        self.mask = self.recv_strict(4) if self.has_mask() else ""
+        if header_length > 2:
+            self._fill(header_length)
+            if length == 0x7e:
+                length = _LENGTH_16_STRUCT.unpack_from(self.recv_buffer, self.read_pos + 2)[0]
+            elif length == 0x7f:
+                length = _LENGTH_63_STRUCT.unpack_from(self.recv_buffer, self.read_pos + 2)[0]
 
-    def recv_frame(self):
-        # Header
-        if self.has_received_header():
-            self.recv_header()
-        (fin, rsv1, rsv2, rsv3, opcode, has_mask, _) = self.header
-
-        # Frame length
-        if self.has_received_length():
-            self.recv_length()
-        length = self.length
-
-        # Mask
-        if self.has_received_mask():
-            self.recv_mask()
-        mask = self.mask
-
-        # Payload
+        self._fill(header_length + length)
+        if has_mask:
+            mask_end = self.read_pos + header_length
+            mask = bytes(self.recv_buffer[mask_end - 4:mask_end])
+        self.read_pos += header_length
         payload = self.recv_strict(length)
+
+        if b1 in _PLAIN_DATA_FRAME_HEADERS and not has_mask:
+            # fast path: what the TV sends all the time
+            return ABNF(b1 >> 7, 0, 0, 0, b1 & 0xf, 0, payload)
+
         if has_mask:
             payload = ABNF.mask(mask, payload)
 
-        # Reset for next frame
-        self.clear()
-
-        frame = ABNF(fin, rsv1, rsv2, rsv3, opcode, has_mask, payload)
-        frame.validate(self.skip_utf8_validation)
+        frame = ABNF(b1 >> 7, b1 >> 6 & 1, b1 >> 5 & 1, b1 >> 4 & 1, b1 & 0xf, has_mask, payload)
+        frame.validate(self.skip_utf8_validation, self.deflate is not None)
 
         return frame
 
+    def feed(self, data):
+        """
+        append data that has been received by other means (e.g. along
+        with the handshake response) to the buffer.
+        """
+        if not data:
+            return
+        if self.write_pos + len(data) > len(self.recv_buffer):
+            self._make_room(self.write_pos - self.read_pos + len(data))
+        self.recv_buffer[self.write_pos:self.write_pos + len(data)] = data
+        self.write_pos += len(data)
+
+    def has_buffered_data(self):
+        return self.write_pos > self.read_pos
+
     def recv_strict(self, bufsize):
-        shortage = bufsize - sum(len(x) for x in self.recv_buffer)
+        self._fill(bufsize)
+        start = self.read_pos
+        self.read_pos += bufsize
+        data = memoryview(self.recv_buffer)[start:self.read_pos].tobytes()
+
+        if self.read_pos == self.write_pos:
+            # everything consumed, start over at the front of the buffer
+            self.read_pos = self.write_pos = 0
+            if len(self.recv_buffer) > frame_buffer._MAX_IDLE_BUFFER_SIZE:
+                self.recv_buffer = bytearray(frame_buffer._INITIAL_BUFFER_SIZE)
+
+        return data
+
+    def _fill(self, bufsize):
+        """
+        make sure that at least bufsize unconsumed bytes are buffered.
+        """
+        shortage = bufsize - (self.write_pos - self.read_pos)
+        if shortage <= 0:
+            return
+        if self.write_pos + shortage > len(self.recv_buffer):
+            self._make_room(bufsize)
+
+        # Only receive as much as is missing, data that is left in the
+        # socket stays visible to select() callers like WebSocketApp.
+        view = memoryview(self.recv_buffer)
         while shortage > 0:
-            # Limit buffer size that we pass to socket.recv() to avoid
-            # fragmenting the heap -- the number of bytes recv() actually
-            # reads is limited by socket buffer and is relatively small,
-            # yet passing large numbers repeatedly causes lots of large
-            # buffers allocated and then shrunk, which results in fragmentation.
-            bytes = self.recv(min(16384, shortage))
-            self.recv_buffer.append(bytes)
-            shortage -= len(bytes)
-
-        unified = six.b("").join(self.recv_buffer)
-
-        if shortage == 0:
-            self.recv_buffer = []
-            return unified
+            n = self.recv_into(view[self.write_pos:], shortage)
+            self.write_pos += n
+            shortage -= n
+
+    def _make_room(self, bufsize):
+        # Move unconsumed bytes to the front of the buffer, growing it if
+        # needed. The buffer is never resized in place since memoryviews
+        # of it might still exist.
+        pending = memoryview(self.recv_buffer)[self.read_pos:self.write_pos]
+        if bufsize > len(self.recv_buffer):
+            buffer = bytearray(max(bufsize, 2 * len(self.recv_buffer)))
+            buffer[:len(pending)] = pending
+            self.recv_buffer = buffer
         else:
-            self.recv_buffer = [unified[bufsize:]]
-            return unified[:bufsize]
+            self.recv_buffer[:len(pending)] = pending.tobytes()
+        self.read_pos = 0
+        self.write_pos = len(pending)
 
 
 class continuous_frame(object):
@@ -363,6 +477,11 @@ class continuous_frame(object):
         self.skip_utf8_validation = skip_utf8_validation
         self.cont_data = None
         self.recving_frames = None
+        # text messages are validated fragment by fragment as they arrive
+        self.utf8_validator = utf8_validator()
+        # permessage_deflate instance, if negotiated
+        self.deflate = None
+        self.compressed = False
 
     def validate(self, frame):
         if not self.recving_frames and frame.opcode == ABNF.OPCODE_CONT:
@@ -371,12 +490,25 @@ class continuous_frame(object):
             raise WebSocketProtocolException("Illegal frame")
 
     def add(self, frame):
+        if frame.opcode != ABNF.OPCODE_CONT:
+            # first frame of a message tells whether it is compressed
+            self.compressed = self.deflate is not None and frame.rsv1
+        if self.compressed:
+            frame.data = self.deflate.decompress(frame.data, frame.fin)
+
         if self.cont_data:
-            self.cont_data[1] += frame.data
+            self.cont_data[1].append(frame.data)
         else:
             if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
                 self.recving_frames = frame.opcode
-            self.cont_data = [frame.opcode, frame.data]
+            self.cont_data = [frame.opcode, [frame.data]]
+            self.utf8_validator.reset()
+
+        if not self.fire_cont_frame and self.cont_data[0] == ABNF.OPCODE_TEXT and not self.skip_utf8_validation \
+                and not self.utf8_validator.validate(frame.data, frame.fin):
+            self.cont_data = None
+            self.recving_frames = None
+            raise WebSocketPayloadException("cannot decode: " + repr(frame.data))
 
         if frame.fin:
             self.recving_frames = None
@@ -387,8 +519,69 @@ class continuous_frame(object):
     def extract(self, frame):
         data = self.cont_data
         self.cont_data = None
-        frame.data = data[1]
-        if not self.fire_cont_frame and data[0] == ABNF.OPCODE_TEXT and not self.skip_utf8_validation and not validate_utf8(frame.data):
-            raise WebSocketPayloadException("cannot decode: " + repr(frame.data))
+        frame.data = six.b("").join(data[1])
 
         return [data[0], frame]
+
+
+class permessage_deflate(object):
+    """
+    permessage-deflate extension (RFC 7692).
+    Created with the extension parameters the server agreed to during the
+    handshake. Compresses outgoing and decompresses incoming messages,
+    keeping the compression context between messages unless the server
+    asked for no context takeover.
+    """
+    # messages shorter than this are sent uncompressed, deflate would
+    # barely save anything.
+    MIN_COMPRESS_SIZE = 64
+
+    _TAIL = six.b("\x00\x00\xff\xff")
+
+    def __init__(self, params):
+        """
+        params: dict of extension parameters sent by the server.
+        """
+        self.server_no_context_takeover = "server_no_context_takeover" in params
+        self.client_no_context_takeover = "client_no_context_takeover" in params
+        self.client_max_window_bits = int(params.get("client_max_window_bits") or zlib.MAX_WBITS)
+        self.compressor = None
+        self.decompressor = None
+
+    def compress(self, frame):
+        """
+        compress the payload of frame if it is a complete text or binary
+        message. Sets rsv1 of compressed frames.
+        """
+        if frame.opcode not in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY) or not frame.fin or frame.rsv1:
+            return frame
+        # zlib can't produce streams for 256 byte windows, send those uncompressed.
+        if self.client_max_window_bits < 9 or len(frame.data) < self.MIN_COMPRESS_SIZE:
+            return frame
+
+        if self.compressor is None or self.client_no_context_takeover:
+            self.compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -self.client_max_window_bits)
+        data = self.compressor.compress(frame.data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(self._TAIL):
+            data = data[:-len(self._TAIL)]
+        frame.data = data
+        frame.rsv1 = 1
+        return frame
+
+    def decompress(self, data, fin):
+        """
+        decompress the next fragment of a compressed message.
+        fin: True for the last fragment.
+        """
+        if self.decompressor is None:
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            data = self.decompressor.decompress(data)
+            if fin:
+                data += self.decompressor.decompress(self._TAIL)
+        except zlib.error as e:
+            raise WebSocketPayloadException("cannot decompress: " + str(e))
+        if fin and self.server_no_context_takeover:
+            self.decompressor = None
+        return data
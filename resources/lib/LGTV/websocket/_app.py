@@ -188,7 +188,10 @@ class WebSocketApp(object):
                 thread.start()
 
             while self.sock.connected:
-                r, w, e = select.select((self.sock.sock, ), (), (), ping_timeout)
+                if self.sock.has_buffered_data():
+                    r = True
+                else:
+                    r, w, e = select.select((self.sock.sock, ), (), (), ping_timeout)
                 if not self.keep_running:
                     break
 
@@ -0,0 +1,342 @@
+"""
+websocket - WebSocket client library for Python
+
+Copyright (C) 2010 Hiroki Ohtani(liris)
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor,
+    Boston, MA  02110-1335  USA
+
+"""
+
+"""
+asyncio based WebSocket client (Python 3.5+ only).
+"""
+import asyncio
+import struct
+
+from ._abnf import *
+from ._exceptions import *
+from ._handshake import _get_handshake_headers, _check_resp_headers
+from ._http import _parse_headers, _MAX_HEADER_SIZE
+from ._logging import *
+from ._ssl_compat import *
+from ._url import parse_url
+
+__all__ = ["AsyncWebSocket", "create_async_connection"]
+
+
+class _NeedMoreData(Exception):
+    pass
+
+
+def _need_more_data(buffer, nbytes):
+    # frame_buffer's source of data: the buffer is only filled from the
+    # stream reader, so ask the caller to read more.
+    raise _NeedMoreData()
+
+
+class AsyncWebSocket(object):
+    """
+    asyncio WebSocket interface.
+    Same handshake (no Origin header) and framing as WebSocket, with
+    coroutines instead of blocking calls, so one event loop can drive
+    several connections. Proxies are not supported.
+
+    >>> ws = await create_async_connection("ws://echo.websocket.org/")
+    >>> await ws.send("Hello, Server")
+    >>> await ws.recv()
+    'Hello, Server'
+    >>> await ws.close()
+
+    get_mask_key: a callable to produce new mask keys, see
+      WebSocket.set_mask_key. Defaults to a mask_key_pool.
+    fire_cont_frame: fire recv event for each cont frame. default is False
+    skip_utf8_validation: skip utf8 validation.
+
+    Only one coroutine may receive at a time.
+    """
+
+    def __init__(self, get_mask_key=None, fire_cont_frame=False,
+                 skip_utf8_validation=False):
+        self.reader = None
+        self.writer = None
+        self.handshake_response = None
+        self.connected = False
+        self.get_mask_key = get_mask_key if get_mask_key is not None else mask_key_pool()
+        self.frame_buffer = frame_buffer(_need_more_data, skip_utf8_validation)
+        self.cont_frame = continuous_frame(fire_cont_frame, skip_utf8_validation)
+        # permessage_deflate instance, if compression has been negotiated
+        self.deflate = None
+
+    def set_mask_key(self, func):
+        """
+        set function to create mask key, see WebSocket.set_mask_key.
+        """
+        self.get_mask_key = func
+
+    @property
+    def subprotocol(self):
+        if self.handshake_response:
+            return self.handshake_response.subprotocol
+        return None
+
+    @property
+    def status(self):
+        if self.handshake_response:
+            return self.handshake_response.status
+        return None
+
+    @property
+    def headers(self):
+        if self.handshake_response:
+            return self.handshake_response.headers
+        return None
+
+    async def connect(self, url, timeout=None, **options):
+        """
+        Connect to url (ws://host:port/resource or wss://...).
+
+        timeout: timeout for connecting and the handshake in seconds.
+                 None waits forever.
+
+        options: "header", "cookie", "host", "subprotocols" and
+                 "enable_compression" like WebSocket.connect.
+                 "socket" - pre-initialized stream socket.
+                 "ssl" - ssl.SSLContext for wss:// urls.
+        """
+        hostname, port, resource, is_secure = parse_url(url)
+        sock = options.pop("socket", None)
+        ssl_context = options.pop("ssl", None)
+        if is_secure:
+            if not HAVE_SSL:
+                raise WebSocketException("SSL not available.")
+            if ssl_context is None:
+                ssl_context = ssl.create_default_context()
+        else:
+            ssl_context = None
+
+        try:
+            await asyncio.wait_for(
+                self._connect(sock, hostname, port, resource, ssl_context, options), timeout)
+        except asyncio.TimeoutError:
+            await self.shutdown()
+            raise WebSocketTimeoutException("Handshake timed out")
+        except:
+            await self.shutdown()
+            raise
+
+    async def _connect(self, sock, hostname, port, resource, ssl_context, options):
+        server_hostname = hostname if ssl_context is not None else None
+        if sock is not None:
+            self.reader, self.writer = await asyncio.open_connection(
+                sock=sock, ssl=ssl_context, server_hostname=server_hostname, limit=_MAX_HEADER_SIZE)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(
+                hostname, port, ssl=ssl_context, limit=_MAX_HEADER_SIZE)
+
+        headers, key = _get_handshake_headers(resource, hostname, port, options)
+        header_str = "\r\n".join(headers)
+        self.writer.write(header_str.encode("utf-8"))
+        dump("request header", header_str)
+
+        try:
+            block = await self.reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            raise WebSocketConnectionClosedException("Connection is already closed.")
+        except asyncio.LimitOverrunError:
+            raise WebSocketException("Headers are too long")
+        status, resp = _parse_headers(block[:-4])
+        # data after the headers stays in the stream reader
+        self.handshake_response = _check_resp_headers(status, resp, key, b"", options)
+
+        if self.handshake_response.deflate_params is not None:
+            self.deflate = permessage_deflate(self.handshake_response.deflate_params)
+        self.frame_buffer.deflate = self.cont_frame.deflate = self.deflate
+        self.connected = True
+
+    async def send(self, payload, opcode=ABNF.OPCODE_TEXT):
+        """
+        Send the data as string, see WebSocket.send.
+        """
+        return await self.send_frames([ABNF.create_frame(payload, opcode)])
+
+    async def send_binary(self, payload):
+        return await self.send(payload, ABNF.OPCODE_BINARY)
+
+    async def send_many(self, payloads, opcode=ABNF.OPCODE_TEXT):
+        """
+        Send several messages with a single write, see WebSocket.send_many.
+        """
+        return await self.send_frames([ABNF.create_frame(payload, opcode) for payload in payloads])
+
+    async def send_frames(self, frames):
+        """
+        Send data frames created by ABNF.create_frame.
+        """
+        if self.writer is None:
+            raise WebSocketConnectionClosedException("socket is already closed.")
+        # formatting and writing happen without yielding to the event loop,
+        # so frames of concurrent senders are never interleaved.
+        parts = format_frames(frames, self.get_mask_key, self.deflate)
+        if isEnabledForTrace():
+            trace("send: " + repr(b"".join(parts)))
+        self.writer.writelines(parts)
+        await self.writer.drain()
+        return sum(len(part) for part in parts)
+
+    async def ping(self, payload=""):
+        """
+        send ping data.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        await self.send(payload, ABNF.OPCODE_PING)
+
+    async def pong(self, payload):
+        """
+        send pong data.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        await self.send(payload, ABNF.OPCODE_PONG)
+
+    async def recv(self):
+        """
+        Receive string data(byte array) from the server, see WebSocket.recv.
+        """
+        opcode, data = await self.recv_data()
+        if opcode == ABNF.OPCODE_TEXT:
+            return data.decode("utf-8")
+        elif opcode == ABNF.OPCODE_BINARY:
+            return data
+        else:
+            return ''
+
+    async def recv_data(self, control_frame=False):
+        """
+        Receive data with operation code, see WebSocket.recv_data.
+        """
+        opcode, frame = await self.recv_data_frame(control_frame)
+        return opcode, frame.data
+
+    async def recv_data_frame(self, control_frame=False):
+        """
+        Receive data with operation code, see WebSocket.recv_data_frame.
+        """
+        while True:
+            frame = await self.recv_frame()
+            if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY, ABNF.OPCODE_CONT):
+                self.cont_frame.validate(frame)
+                self.cont_frame.add(frame)
+
+                if self.cont_frame.is_fire(frame):
+                    return self.cont_frame.extract(frame)
+
+            elif frame.opcode == ABNF.OPCODE_CLOSE:
+                await self.send_close()
+                return (frame.opcode, frame)
+            elif frame.opcode == ABNF.OPCODE_PING:
+                if len(frame.data) < 126:
+                    await self.pong(frame.data)
+                else:
+                    raise WebSocketProtocolException("Ping message is too long")
+                if control_frame:
+                    return (frame.opcode, frame)
+            elif frame.opcode == ABNF.OPCODE_PONG:
+                if control_frame:
+                    return (frame.opcode, frame)
+
+    async def recv_frame(self):
+        """
+        receive data as frame from server.
+        """
+        while True:
+            try:
+                return self.frame_buffer.recv_frame()
+            except _NeedMoreData:
+                pass
+            # nothing is consumed from the frame buffer until a frame is
+            # complete, so the frame is decoded again once more data is in.
+            if self.reader is None:
+                raise WebSocketConnectionClosedException("socket is already closed.")
+            data = await self.reader.read(65536)
+            if not data:
+                self.connected = False
+                raise WebSocketConnectionClosedException("Connection is already closed.")
+            self.frame_buffer.feed(data)
+
+    async def send_close(self, status=STATUS_NORMAL, reason=b""):
+        """
+        send close data to the server.
+        """
+        if status < 0 or status >= ABNF.LENGTH_16:
+            raise ValueError("code is invalid range")
+        self.connected = False
+        await self.send(struct.pack('!H', status) + reason, ABNF.OPCODE_CLOSE)
+
+    async def close(self, status=STATUS_NORMAL, reason=b"", timeout=3):
+        """
+        Close the connection, waiting up to timeout seconds for the
+        server's close frame.
+        """
+        if self.connected:
+            if status < 0 or status >= ABNF.LENGTH_16:
+                raise ValueError("code is invalid range")
+
+            try:
+                self.connected = False
+                await self.send(struct.pack('!H', status) + reason, ABNF.OPCODE_CLOSE)
+                try:
+                    frame = await asyncio.wait_for(self.recv_frame(), timeout)
+                    if isEnabledForError():
+                        recv_status = struct.unpack("!H", frame.data)[0]
+                        if recv_status != STATUS_NORMAL:
+                            error("close status: " + repr(recv_status))
+                except:
+                    pass
+            except:
+                pass
+
+        await self.shutdown()
+
+    async def shutdown(self):
+        "close the connection immediately."
+        writer = self.writer
+        self.reader = self.writer = None
+        self.connected = False
+        if writer is not None:
+            writer.close()
+            if hasattr(writer, "wait_closed"):
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+
+async def create_async_connection(url, timeout=None, class_=AsyncWebSocket, **options):
+    """
+    connect to url and return an AsyncWebSocket, the coroutine counterpart
+    of create_connection.
+
+    timeout: timeout for connecting and the handshake in seconds.
+    class_: class to instantiate, compatible with AsyncWebSocket.
+    options: "get_mask_key", "fire_cont_frame" and "skip_utf8_validation"
+             are passed to class_, all others to connect().
+    """
+    websock = class_(get_mask_key=options.pop("get_mask_key", None),
+                     fire_cont_frame=options.pop("fire_cont_frame", False),
+                     skip_utf8_validation=options.pop("skip_utf8_validation", False))
+    await websock.connect(url, timeout=timeout, **options)
+    return websock
@@ -72,7 +72,7 @@ class WebSocket(object):
     >>> ws.close()
 
     get_mask_key: a callable to produce new mask keys, see the set_mask_key
-      function's docstring for more details
+      function's docstring for more details. Defaults to a mask_key_pool.
     sockopt: values for socket.setsockopt.
         sockopt must be tuple and each element is argument of sock.setsockopt.
     sslopt: dict object for ssl socket option.
@@ -92,10 +92,16 @@ class WebSocket(object):
         self.sock = None
 
         self.connected = False
+        if get_mask_key is None:
+            # mask keys are taken from a pool of random bytes, it needs
+            # a lock if frames are sent from several threads.
+            get_mask_key = mask_key_pool(lock=threading.Lock() if enable_multithread else None)
         self.get_mask_key = get_mask_key
         # These buffer over the build-up of a single frame.
-        self.frame_buffer = frame_buffer(self._recv, skip_utf8_validation)
+        self.frame_buffer = frame_buffer(self._recv_into, skip_utf8_validation)
         self.cont_frame = continuous_frame(fire_cont_frame, skip_utf8_validation)
+        # permessage_deflate instance, if compression has been negotiated
+        self.deflate = None
 
         if enable_multithread:
             self.lock = threading.Lock()
@@ -209,6 +215,8 @@ class WebSocket(object):
                                      default is None
                  "subprotocols" - array of available sub protocols.
                                   default is None.
+                 "enable_compression" - offer permessage-deflate compression.
+                                        default is False.
                  "socket" - pre-initialized stream socket.
 
         """
@@ -217,6 +225,11 @@ class WebSocket(object):
 
         try:
             self.handshake_response = handshake(self.sock, *addrs, **options)
+            if self.handshake_response.deflate_params is not None:
+                self.deflate = permessage_deflate(self.handshake_response.deflate_params)
+            self.frame_buffer.deflate = self.cont_frame.deflate = self.deflate
+            # frames the server sent right after its handshake response
+            self.frame_buffer.feed(self.handshake_response.leftover)
             self.connected = True
         except:
             if self.sock:
@@ -253,18 +266,32 @@ class WebSocket(object):
         >>> ws.send_frame(frame)
 
         """
-        if self.get_mask_key:
-            frame.get_mask_key = self.get_mask_key
-        data = frame.format()
-        length = len(data)
-        trace("send: " + repr(data))
+        return self.send_frames([frame])
 
+    def send_many(self, payloads, opcode=ABNF.OPCODE_TEXT):
+        """
+        Send several messages at once, i.e. with a single write to the socket.
+
+        payloads: list of payloads, see send().
+
+        opcode: operation code to send. Please see OPCODE_XXX.
+        """
+        frames = [ABNF.create_frame(payload, opcode) for payload in payloads]
+        return self.send_frames(frames)
+
+    def send_frames(self, frames):
+        """
+        Send several data frames with a single write to the socket.
+
+        frames: list of frames created by ABNF.create_frame
+        """
         with self.lock:
-            while data:
-                l = self._send(data)
-                data = data[l:]
+            # frames have to be compressed in the order they are sent
+            parts = format_frames(frames, self.get_mask_key, self.deflate)
+            if isEnabledForTrace():
+                trace("send: " + repr(six.b("").join(parts)))
 
-        return length
+            return self._send_parts(parts)
 
     def send_binary(self, payload):
         return self.send(payload, ABNF.OPCODE_BINARY)
@@ -351,6 +378,13 @@ class WebSocket(object):
                 if control_frame:
                     return (frame.opcode, frame)
 
+    def has_buffered_data(self):
+        """
+        return True if data has been received from the server, but not
+        returned yet. select() on the socket does not report this data.
+        """
+        return self.frame_buffer.has_buffered_data()
+
     def recv_frame(self):
         """
         receive data as frame from server.
@@ -424,6 +458,9 @@ class WebSocket(object):
     def _send(self, data):
         return send(self.sock, data)
 
+    def _send_parts(self, parts):
+        return send_parts(self.sock, parts)
+
     def _recv(self, bufsize):
         try:
             return recv(self.sock, bufsize)
@@ -434,6 +471,16 @@ class WebSocket(object):
             self.connected = False
             raise
 
+    def _recv_into(self, buffer, nbytes):
+        try:
+            return recv_into(self.sock, buffer, nbytes)
+        except WebSocketConnectionClosedException:
+            if self.sock:
+                self.sock.close()
+            self.sock = None
+            self.connected = False
+            raise
+
 
 def create_connection(url, timeout=None, class_=WebSocket, **options):
     """
@@ -473,6 +520,8 @@ def create_connection(url, timeout=None, class_=WebSocket, **options):
              "sslopt" -> ssl option
              "subprotocols" - array of available sub protocols.
                               default is None.
+             "enable_compression" - offer permessage-deflate compression.
+                                    default is False.
              "skip_utf8_validation" - skip utf8 validation.
              "socket" - pre-initialized stream socket.
     """
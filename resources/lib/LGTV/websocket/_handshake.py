@@ -50,11 +50,22 @@ else:
 VERSION = 13
 
 
+# offered when compression is enabled; we let the server choose the
+# window size for our messages.
+_DEFLATE_OFFER = "permessage-deflate; client_max_window_bits"
+_DEFLATE_PARAMS = ("server_no_context_takeover", "client_no_context_takeover",
+                   "server_max_window_bits", "client_max_window_bits")
+
+
 class handshake_response(object):
-    def __init__(self, status, headers, subprotocol):
+    def __init__(self, status, headers, subprotocol, leftover=six.b(""), deflate_params=None):
         self.status = status
         self.headers = headers
         self.subprotocol = subprotocol
+        # permessage-deflate parameters, None if not negotiated
+        self.deflate_params = deflate_params
+        # data received right after the response headers
+        self.leftover = leftover
 
 
 def handshake(sock, hostname, port, resource, **options):
@@ -64,12 +75,19 @@ def handshake(sock, hostname, port, resource, **options):
     send(sock, header_str)
     dump("request header", header_str)
 
-    status, resp = _get_resp_headers(sock)
+    status, resp, leftover = read_headers_buffered(sock)
+    return _check_resp_headers(status, resp, key, leftover, options)
+
+
+def _check_resp_headers(status, resp, key, leftover, options, success_status=101):
+    if status != success_status:
+        raise WebSocketBadStatusException("Handshake status %d", status)
     success, subproto = _validate(resp, key, options.get("subprotocols"))
     if not success:
         raise WebSocketException("Invalid WebSocket Header")
+    deflate_params = _get_deflate_params(resp, options.get("enable_compression"))
 
-    return handshake_response(status, resp, subproto)
+    return handshake_response(status, resp, subproto, leftover, deflate_params)
 
 
 def _get_handshake_headers(resource, host, port, options):
@@ -96,6 +114,9 @@ def _get_handshake_headers(resource, host, port, options):
     headers.append("Sec-WebSocket-Key: %s" % key)
     headers.append("Sec-WebSocket-Version: %s" % VERSION)
 
+    if options.get("enable_compression"):
+        headers.append("Sec-WebSocket-Extensions: %s" % _DEFLATE_OFFER)
+
     subprotocols = options.get("subprotocols")
     if subprotocols:
         headers.append("Sec-WebSocket-Protocol: %s" % ",".join(subprotocols))
@@ -117,12 +138,6 @@ def _get_handshake_headers(resource, host, port, options):
     return headers, key
 
 
-def _get_resp_headers(sock, success_status=101):
-    status, resp_headers = read_headers(sock)
-    if status != success_status:
-        raise WebSocketBadStatusException("Handshake status %d", status)
-    return status, resp_headers
-
 _HEADERS_TO_CHECK = {
     "upgrade": "websocket",
     "connection": "upgrade",
@@ -163,6 +178,33 @@ def _validate(headers, key, subprotocols):
         return False, None
 
 
+def _get_deflate_params(headers, offered):
+    extensions = headers.get("sec-websocket-extensions")
+    if not extensions:
+        return None
+    if not offered or "," in extensions:
+        raise WebSocketException("Unexpected extension: " + extensions)
+
+    params = [p.strip() for p in extensions.split(";")]
+    if params[0] != "permessage-deflate":
+        raise WebSocketException("Unexpected extension: " + extensions)
+
+    result = {}
+    for param in params[1:]:
+        key, _, value = param.partition("=")
+        key = key.strip()
+        value = value.strip().strip('"') or None
+        if key not in _DEFLATE_PARAMS or key in result:
+            raise WebSocketException("Invalid permessage-deflate parameter: " + param)
+        if key.endswith("_max_window_bits"):
+            if not value or not value.isdigit() or not 8 <= int(value) <= 15:
+                raise WebSocketException("Invalid permessage-deflate parameter: " + param)
+        elif value is not None:
+            raise WebSocketException("Invalid permessage-deflate parameter: " + param)
+        result[key] = value
+    return result
+
+
 def _create_sec_websocket_key():
     randomness = os.urandom(16)
     return base64encode(randomness).decode('utf-8').strip()
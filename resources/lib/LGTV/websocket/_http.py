@@ -37,7 +37,12 @@ from ._socket import*
 from ._exceptions import *
 from ._ssl_compat import *
 
-__all__ = ["proxy_info", "connect", "read_headers"]
+__all__ = ["proxy_info", "connect", "read_headers", "read_headers_buffered"]
+
+# size of the blocks read while looking for the end of the headers
+_HEADER_READ_SIZE = 4096
+# give up if the headers don't end within this many bytes
+_MAX_HEADER_SIZE = 65536
 
 class proxy_info(object):
     def __init__(self, **options):
@@ -203,15 +208,36 @@ def _tunnel(sock, host, port, auth):
     return sock
 
 def read_headers(sock):
+    """
+    read HTTP status and headers from sock.
+    return value: tuple of status code and dict of (lower case) headers.
+    Raises WebSocketException if the peer sent more than the headers.
+    """
+    status, headers, leftover = read_headers_buffered(sock)
+    if leftover:
+        raise WebSocketException("Unexpected data after headers")
+    return status, headers
+
+def read_headers_buffered(sock):
+    """
+    read HTTP status and headers from sock in blocks instead of byte by byte.
+    return value: tuple of status code, dict of (lower case) headers and
+    the bytes received after the headers (e.g. the first WebSocket frames).
+    """
+    block, leftover = _recv_header_block(sock)
+    status, headers = _parse_headers(block)
+    return status, headers, leftover
+
+def _parse_headers(block):
+    # parse status line and headers (without the terminating empty line)
     status = None
     headers = {}
     trace("--- response header ---")
 
-    while True:
-        line = recv_line(sock)
+    for line in block.split(six.b("\n")):
         line = line.decode('utf-8').strip()
         if not line:
-            break
+            continue
         trace(line)
         if not status:
 
@@ -228,3 +254,17 @@ def read_headers(sock):
     trace("-----------------------")
 
     return status, headers
+
+def _recv_header_block(sock):
+    # returns everything up to the empty line ending the headers and
+    # everything received after it.
+    received = six.b("")
+    while True:
+        # the end marker might be split between two blocks
+        start = max(0, len(received) - 3)
+        received += recv(sock, _HEADER_READ_SIZE)
+        end = received.find(six.b("\r\n\r\n"), start)
+        if end >= 0:
+            return received[:end], received[end + 4:]
+        if len(received) > _MAX_HEADER_SIZE:
+            raise WebSocketException("Headers are too long")
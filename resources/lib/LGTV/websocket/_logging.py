@@ -26,7 +26,7 @@ _logger = logging.getLogger('websocket')
 _traceEnabled = False
 
 __all__ = ["enableTrace", "dump", "error", "debug", "trace",
-           "isEnabledForError", "isEnabledForDebug"]
+           "isEnabledForError", "isEnabledForDebug", "isEnabledForTrace"]
 
 
 def enableTrace(tracable):
@@ -69,3 +69,7 @@ def isEnabledForError():
 
 def isEnabledForDebug():
     return _logger.isEnabledFor(logging.DEBUG)
+
+
+def isEnabledForTrace():
+    return _traceEnabled
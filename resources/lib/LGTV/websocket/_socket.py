@@ -40,7 +40,11 @@ if hasattr(socket, "TCP_KEEPCNT"):
 _default_timeout = None
 
 __all__ = ["DEFAULT_SOCKET_OPTION", "sock_opt", "setdefaulttimeout", "getdefaulttimeout",
-           "recv", "recv_line", "send"]
+           "recv", "recv_into", "recv_line", "send", "send_parts"]
+
+# maximum number of buffers passed to one sendmsg() call (IOV_MAX is
+# at least 1024 on Linux and BSDs).
+_MAX_IOV = 512
 
 class sock_opt(object):
     def __init__(self, sockopt, sslopt):
@@ -91,6 +95,39 @@ def recv(sock, bufsize):
     return bytes
 
 
+def recv_into(sock, buffer, nbytes):
+    """
+    receive up to nbytes into buffer (a writable buffer, e.g. a memoryview
+    of a bytearray), return the number of bytes received.
+    """
+    if not sock:
+        raise WebSocketConnectionClosedException("socket is already closed.")
+
+    try:
+        if hasattr(sock, "recv_into"):
+            n = sock.recv_into(buffer, nbytes)
+        else:
+            # socket-like objects which only implement recv
+            bytes = sock.recv(nbytes)
+            n = len(bytes) if bytes else 0
+            if n:
+                buffer[:n] = bytes
+    except socket.timeout as e:
+        message = extract_err_message(e)
+        raise WebSocketTimeoutException(message)
+    except SSLError as e:
+        message = extract_err_message(e)
+        if message == "The read operation timed out":
+            raise WebSocketTimeoutException(message)
+        else:
+            raise
+
+    if not n:
+        raise WebSocketConnectionClosedException("Connection is already closed.")
+
+    return n
+
+
 def recv_line(sock):
     line = []
     while True:
@@ -108,8 +145,53 @@ def send(sock, data):
     if not sock:
         raise WebSocketConnectionClosedException("socket is already closed.")
 
+    return _send_call(sock.send, data)
+
+
+def send_parts(sock, parts):
+    """
+    send all buffers in parts (e.g. frame header and payload) as one
+    stream, return the number of bytes sent.
+    Uses scatter/gather I/O if the socket supports it, so the buffers are
+    neither concatenated nor re-sliced after partial sends.
+    """
+    if not sock:
+        raise WebSocketConnectionClosedException("socket is already closed.")
+
+    if not _can_sendmsg(sock):
+        data = six.b("").join(parts)
+        total = len(data)
+        sent = _send_call(sock.send, data)
+        if sent < total:
+            view = memoryview(data)
+            while sent < total:
+                sent += _send_call(sock.send, view[sent:])
+        return total
+
+    views = [memoryview(part) for part in parts if len(part)]
+    total = sum(len(view) for view in views)
+    while views:
+        sent = _send_call(sock.sendmsg, views[:_MAX_IOV])
+        # drop buffers which have been sent completely
+        i = 0
+        while i < len(views) and sent >= len(views[i]):
+            sent -= len(views[i])
+            i += 1
+        del views[:i]
+        if sent:
+            views[0] = views[0][sent:]
+
+    return total
+
+
+def _can_sendmsg(sock):
+    # SSL sockets have sendmsg(), but it raises NotImplementedError.
+    return hasattr(sock, "sendmsg") and not (HAVE_SSL and isinstance(sock, ssl.SSLSocket))
+
+
+def _send_call(func, data):
     try:
-        return sock.send(data)
+        return func(data)
     except socket.timeout as e:
         message = extract_err_message(e)
         raise WebSocketTimeoutException(message)
@@ -20,9 +20,10 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
 
 """
 
+import codecs
 import six
 
-__all__ = ["NoLock", "validate_utf8", "extract_err_message"]
+__all__ = ["NoLock", "validate_utf8", "utf8_validator", "extract_err_message"]
 
 class NoLock(object):
     def __enter__(self):
@@ -31,6 +32,71 @@ class NoLock(object):
     def __exit__(self, type, value, traceback):
         pass
 
+# UTF-8 validator
+# python implementation of http://bjoern.hoehrmann.de/utf-8/decoder/dfa/
+
+_UTF8_ACCEPT = 0
+_UTF8_REJECT = 12
+
+_UTF8D = [
+    # The first part of the table maps bytes to character classes that
+    # to reduce the size of the transition table and create bitmasks.
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
+    1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,  9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,
+    7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,  7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,
+    8,8,2,2,2,2,2,2,2,2,2,2,2,2,2,2,  2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,
+    10,3,3,3,3,3,3,3,3,3,3,3,3,4,3,3, 11,6,6,6,5,8,8,8,8,8,8,8,8,8,8,8,
+
+    # The second part is a transition table that maps a combination
+    # of a state of the automaton and a character class to a state.
+    0,12,24,36,60,96,84,12,12,12,48,72, 12,12,12,12,12,12,12,12,12,12,12,12,
+    12, 0,12,12,12,12,12, 0,12, 0,12,12, 12,24,12,12,12,12,12,24,12,24,12,12,
+    12,12,12,12,12,12,12,24,12,12,12,12, 12,24,12,12,12,12,12,12,12,24,12,12,
+    12,12,12,12,12,12,12,36,12,36,12,12, 12,36,12,12,12,12,12,36,12,36,12,12,
+    12,36,12,12,12,12,12,12,12,12,12,12, ]
+
+def _decode(state, codep, ch):
+    tp = _UTF8D[ch]
+
+    codep = (ch & 0x3f ) | (codep << 6) if (state != _UTF8_ACCEPT)  else (0xff >> tp) & (ch)
+    state = _UTF8D[256 + state + tp]
+
+    return state, codep;
+
+def _validate_utf8_dfa(utfbytes, final=True):
+    state = _UTF8_ACCEPT
+    codep = 0
+    for i in utfbytes:
+        if six.PY2:
+            i = ord(i)
+        state, codep = _decode(state, codep, i)
+        if state == _UTF8_REJECT:
+            return False
+
+    return state == _UTF8_ACCEPT or not final
+
+# Python 2's codec accepts encoded surrogates (e.g. "\xed\xa0\x80"),
+# which are invalid UTF-8. All of them start with "\xed".
+try:
+    codecs.utf_8_decode(six.b("\xed\xa0\x80"), "strict", True)
+    _DECODER_ACCEPTS_SURROGATES = True
+except UnicodeDecodeError:
+    _DECODER_ACCEPTS_SURROGATES = False
+
+def _validate_utf8_decode(utfbytes):
+    # let the C implementation of the utf-8 codec do the work and only
+    # fall back to the DFA where the codec is not strict enough.
+    try:
+        codecs.utf_8_decode(utfbytes, "strict", True)
+    except UnicodeDecodeError:
+        return False
+    if _DECODER_ACCEPTS_SURROGATES and six.b("\xed") in utfbytes:
+        return _validate_utf8_dfa(utfbytes)
+    return True
+
 try:
     # If wsaccel is available we use compiled routines to validate UTF-8
     # strings.
@@ -40,51 +106,8 @@ try:
         return Utf8Validator().validate(utfbytes)[0]
 
 except ImportError:
-    # UTF-8 validator
-    # python implementation of http://bjoern.hoehrmann.de/utf-8/decoder/dfa/
-
-    _UTF8_ACCEPT = 0
-    _UTF8_REJECT = 12
-
-    _UTF8D = [
-        # The first part of the table maps bytes to character classes that
-        # to reduce the size of the transition table and create bitmasks.
-        0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
-        0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
-        0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
-        0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
-        1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,  9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,
-        7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,  7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,
-        8,8,2,2,2,2,2,2,2,2,2,2,2,2,2,2,  2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,
-        10,3,3,3,3,3,3,3,3,3,3,3,3,4,3,3, 11,6,6,6,5,8,8,8,8,8,8,8,8,8,8,8,
-
-        # The second part is a transition table that maps a combination
-        # of a state of the automaton and a character class to a state.
-        0,12,24,36,60,96,84,12,12,12,48,72, 12,12,12,12,12,12,12,12,12,12,12,12,
-        12, 0,12,12,12,12,12, 0,12, 0,12,12, 12,24,12,12,12,12,12,24,12,24,12,12,
-        12,12,12,12,12,12,12,24,12,12,12,12, 12,24,12,12,12,12,12,12,12,24,12,12,
-        12,12,12,12,12,12,12,36,12,36,12,12, 12,36,12,12,12,12,12,36,12,36,12,12,
-        12,36,12,12,12,12,12,12,12,12,12,12, ]
-
-    def _decode(state, codep, ch):
-        tp = _UTF8D[ch]
-
-        codep = (ch & 0x3f ) | (codep << 6) if (state != _UTF8_ACCEPT)  else (0xff >> tp) & (ch)
-        state = _UTF8D[256 + state + tp]
-
-        return state, codep;
-
-    def _validate_utf8(utfbytes):
-        state = _UTF8_ACCEPT
-        codep = 0
-        for i in utfbytes:
-            if six.PY2:
-                i = ord(i)
-            state, codep = _decode(state, codep, i)
-            if state == _UTF8_REJECT:
-                return False
-
-        return True
+    Utf8Validator = None
+    _validate_utf8 = _validate_utf8_decode
 
 def validate_utf8(utfbytes):
     """
@@ -94,6 +117,51 @@ def validate_utf8(utfbytes):
     """
     return _validate_utf8(utfbytes)
 
+class utf8_validator(object):
+    """
+    incremental utf8 validator.
+    The byte string is passed chunk by chunk (e.g. the fragments of a
+    message), a code point may be split between two chunks.
+    """
+    def __init__(self):
+        if Utf8Validator is not None:
+            self._validator = Utf8Validator()
+        else:
+            self._decoder = codecs.getincrementaldecoder("utf-8")("strict")
+
+    def reset(self):
+        """
+        forget all state, start validating a new byte string.
+        """
+        if Utf8Validator is not None:
+            self._validator.reset()
+        else:
+            self._decoder.reset()
+
+    def validate(self, utfbytes, final=True):
+        """
+        validate next chunk of utf8 byte string.
+        utfbytes: chunk to check.
+        final: if True, this is the last chunk of the byte string.
+        return value: if the byte string up to this chunk is valid utf8
+        (and complete, if final is set), return true. Otherwise, return false.
+        """
+        if Utf8Validator is not None:
+            valid, ends_on_codepoint = self._validator.validate(utfbytes)[:2]
+            return valid and (ends_on_codepoint or not final)
+
+        pending = self._decoder.getstate()[0]
+        try:
+            self._decoder.decode(utfbytes, final)
+        except UnicodeDecodeError:
+            return False
+        if _DECODER_ACCEPTS_SURROGATES:
+            # pending bytes of the last chunk start at a code point boundary
+            surrogate = six.b("\xed")
+            if surrogate in pending or surrogate in utfbytes:
+                return _validate_utf8_dfa(pending + utfbytes, final)
+        return True
+
 def extract_err_message(exception):
     if exception.args:
         return exception.args[0]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+
+import six
+import sys
+sys.path[0:0] = [""]
+
+import socket
+import threading
+
+if sys.version_info[0] == 2 and sys.version_info[1] < 7:
+    import unittest2 as unittest
+else:
+    import unittest
+
+if six.PY3:
+    import asyncio
+
+# websocket-client
+import websocket as ws
+from websocket.tests.test_websocket import serve_handshake, server_frame, recv_all, TRACABLE
+
+
+def serve_in_thread(server, extra=six.b(""), extensions=None):
+    request = []
+    thread = threading.Thread(target=lambda: request.append(
+        serve_handshake(server, extra=extra, extensions=extensions)))
+    thread.start()
+    return thread, request
+
+
+@unittest.skipUnless(six.PY3, "asyncio is not available")
+class AsyncWebSocketTest(unittest.TestCase):
+    def setUp(self):
+        ws.enableTrace(TRACABLE)
+        self.loop = asyncio.new_event_loop()
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.loop.close()
+
+    def run_loop(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def connect_pair(self, extra=six.b(""), extensions=None, **options):
+        client, server = socket.socketpair()
+        self.sockets.append(server)
+        thread, request = serve_in_thread(server, extra, extensions)
+        try:
+            sock = self.run_loop(ws.create_async_connection(
+                "ws://tv:3000", timeout=5, socket=client, **options))
+        finally:
+            thread.join()
+        return sock, server, request[0]
+
+    def testConnect(self):
+        sock, server, request = self.connect_pair()
+        self.assertTrue(sock.connected)
+        self.assertEqual(sock.status, 101)
+        self.assertNotIn(six.b("Origin:"), request)
+        self.run_loop(sock.shutdown())
+        self.assertFalse(sock.connected)
+
+    def testConnectWithEarlyFrame(self):
+        # a frame sent right behind the handshake response must not be lost
+        sock, server, request = self.connect_pair(extra=server_frame(six.u("early")))
+        self.assertEqual(self.run_loop(sock.recv()), six.u("early"))
+        self.run_loop(sock.shutdown())
+
+    def testHandshakeTimeout(self):
+        client, server = socket.socketpair()
+        self.sockets.append(server)
+        with self.assertRaises(ws.WebSocketTimeoutException):
+            self.run_loop(ws.create_async_connection(
+                "ws://tv:3000", timeout=0.1, socket=client))
+
+    def testSendRecv(self):
+        sock, server, request = self.connect_pair()
+        self.run_loop(sock.send_many([six.u("one"), six.u("two")]))
+        data = recv_all(server)
+        frame_buffer = ws.frame_buffer(lambda buf, n: 0, True)
+        frame_buffer.feed(data)
+        self.assertEqual(frame_buffer.recv_frame().data, six.b("one"))
+        self.assertEqual(frame_buffer.recv_frame().data, six.b("two"))
+
+        # a fragmented message split across several reads
+        payload = server_frame(six.u("Hello, ") + six.u("こんにちは"))
+        def feed():
+            for i in range(len(payload)):
+                server.send(payload[i:i + 1])
+        thread = threading.Thread(target=feed)
+        thread.start()
+        self.assertEqual(self.run_loop(sock.recv()), six.u("Hello, こんにちは"))
+        thread.join()
+        self.run_loop(sock.shutdown())
+
+    def testPingPong(self):
+        sock, server, request = self.connect_pair()
+        server.sendall(server_frame(six.b("ping"), opcode=ws.ABNF.OPCODE_PING) +
+                       server_frame(six.u("text")))
+        self.assertEqual(self.run_loop(sock.recv()), six.u("text"))
+        frame_buffer = ws.frame_buffer(lambda buf, n: 0, True)
+        frame_buffer.feed(recv_all(server))
+        pong = frame_buffer.recv_frame()
+        self.assertEqual(pong.opcode, ws.ABNF.OPCODE_PONG)
+        self.assertEqual(pong.data, six.b("ping"))
+        self.run_loop(sock.shutdown())
+
+    def testServerClosed(self):
+        sock, server, request = self.connect_pair()
+        server.shutdown(socket.SHUT_WR)
+        with self.assertRaises(ws.WebSocketConnectionClosedException):
+            self.run_loop(sock.recv())
+        self.assertFalse(sock.connected)
+        self.run_loop(sock.shutdown())
+
+    def testCompression(self):
+        sock, server, request = self.connect_pair(
+            extensions="permessage-deflate; client_max_window_bits=15",
+            enable_compression=True)
+        self.assertIsNotNone(sock.deflate)
+        deflate = ws.permessage_deflate({"client_max_window_bits": 15})
+        server.sendall(server_frame(six.u("x") * 1000, deflate=deflate))
+        self.assertEqual(self.run_loop(sock.recv()), six.u("x") * 1000)
+        self.run_loop(sock.shutdown())
+
+    def testConcurrentConnections(self):
+        # one event loop drives several connections at once
+        pairs = [self.connect_pair() for i in range(3)]
+        # no async def, this module is imported on Python 2 as well
+        received = [self.loop.create_task(sock.recv()) for sock, server, request in pairs]
+
+        for i, (sock, server, request) in enumerate(reversed(pairs)):
+            server.sendall(server_frame(six.u("message %d") % i))
+        self.assertEqual(self.run_loop(asyncio.gather(*received)),
+                         [six.u("message 2"), six.u("message 1"), six.u("message 0")])
+
+        for sock, server, request in pairs:
+            self.run_loop(sock.shutdown())
+
+    def testClose(self):
+        sock, server, request = self.connect_pair()
+        server.sendall(server_frame(six.b("\x03\xe8"), opcode=ws.ABNF.OPCODE_CLOSE))
+        self.run_loop(sock.close())
+        self.assertFalse(sock.connected)
+        self.assertIsNone(sock.writer)
+        frame_buffer = ws.frame_buffer(lambda buf, n: 0, True)
+        frame_buffer.feed(recv_all(server))
+        self.assertEqual(frame_buffer.recv_frame().opcode, ws.ABNF.OPCODE_CLOSE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,11 @@ else:
     import unittest
 
 import uuid
+import timeit
+import json
+import threading
+import hashlib
+import struct
 
 if six.PY3:
     from base64 import decodebytes as base64decode
@@ -34,13 +39,20 @@ import websocket as ws
 from websocket._handshake import _create_sec_websocket_key
 from websocket._url import parse_url, get_proxy_info
 from websocket._utils import validate_utf8
+from websocket import _utils
 from websocket._handshake import _validate as _validate_header
-from websocket._http import read_headers
+from websocket._http import read_headers, read_headers_buffered
+from websocket._socket import recv_line
+from websocket import _abnf
+from websocket import _handshake
 
 
 # Skip test to access the internet.
 TEST_WITH_INTERNET = os.environ.get('TEST_WITH_INTERNET', '0') == '1'
 
+# Skip benchmarks, they only print timings.
+TEST_BENCHMARK = os.environ.get('TEST_BENCHMARK', '0') == '1'
+
 # Skip Secure WebSocket test.
 TEST_SECURE_WS = True
 TRACABLE = False
@@ -50,6 +62,11 @@ def create_mask_key(n):
     return "abcd"
 
 
+def mask_bytewise(mask_key, data):
+    mask_key = bytearray(mask_key)
+    return bytes(bytearray(b ^ mask_key[i % 4] for i, b in enumerate(bytearray(data))))
+
+
 class SockMock(object):
     def __init__(self):
         self.data = []
@@ -75,6 +92,39 @@ class SockMock(object):
         pass
 
 
+class SendmsgSockMock(SockMock):
+    """ Sends at most chunk_size bytes per sendmsg() call.
+    """
+    def __init__(self, chunk_size):
+        SockMock.__init__(self)
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = six.b("").join(memoryview(b).tobytes() for b in buffers)[:self.chunk_size]
+        self.sent.append(data)
+        return len(data)
+
+
+class StreamSockMock(object):
+    """ Serves a byte stream in chunks of at most chunk_size bytes.
+    """
+    def __init__(self, stream, chunk_size=4096):
+        self.stream = stream
+        self.pos = 0
+        self.chunk_size = chunk_size
+
+    def recv(self, bufsize):
+        bufsize = min(bufsize, self.chunk_size)
+        data = self.stream[self.pos:self.pos + bufsize]
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
 class HeaderSockMock(SockMock):
 
     def __init__(self, fname):
@@ -84,6 +134,66 @@ class HeaderSockMock(SockMock):
             self.add_packet(f.read())
 
 
+def serve_handshake(server, extra=six.b(""), extensions=None):
+    """ Answer the handshake request read from server, followed by extra.
+    """
+    request = six.b("")
+    while six.b("\r\n\r\n") not in request:
+        request += server.recv(4096)
+    for line in request.decode("utf-8").split("\r\n"):
+        if line.lower().startswith("sec-websocket-key:"):
+            key = line.split(":", 1)[1].strip()
+    accept = base64.b64encode(hashlib.sha1(
+        (key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode("utf-8")).digest())
+    server.sendall(six.b("HTTP/1.1 101 Switching Protocols\r\n"
+                         "Upgrade: websocket\r\n"
+                         "Connection: Upgrade\r\n"
+                         "Sec-WebSocket-Accept: ") + accept + six.b("\r\n") +
+                   (six.b("Sec-WebSocket-Extensions: %s\r\n" % extensions) if extensions else six.b("")) +
+                   six.b("\r\n") + extra)
+    return request
+
+
+def connect_pair(extensions=None, **options):
+    """ Connect a WebSocket to a stand-in server at the other end of a
+    socketpair, return the WebSocket, the server socket and the request.
+    """
+    client, server = socket.socketpair()
+    request = []
+    thread = threading.Thread(target=lambda: request.append(serve_handshake(server, extensions=extensions)))
+    thread.start()
+    sock = ws.WebSocket()
+    try:
+        sock.connect("ws://tv:3000", socket=client, **options)
+    finally:
+        thread.join()
+    return sock, server, request[0]
+
+
+def server_frame(payload, deflate=None, opcode=ws.ABNF.OPCODE_TEXT):
+    """ Encode payload like a server would (unmasked, maybe compressed).
+    """
+    frame = ws.ABNF.create_frame(payload, opcode)
+    frame.mask = 0
+    if deflate is not None:
+        frame = deflate.compress(frame)
+    return frame.format()
+
+
+def recv_all(sock, timeout=0.2):
+    sock.settimeout(timeout)
+    data = []
+    try:
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+    except socket.timeout:
+        pass
+    return six.b("").join(data)
+
+
 class WebSocketTest(unittest.TestCase):
     def setUp(self):
         ws.enableTrace(TRACABLE)
@@ -231,6 +341,36 @@ class WebSocketTest(unittest.TestCase):
         HeaderSockMock("data/header02.txt")
         self.assertRaises(ws.WebSocketException, read_headers, HeaderSockMock("data/header02.txt"))
 
+    def testReadHeaderBuffered(self):
+        s = SockMock()
+        s.add_packet(six.b("HTTP/1.1 101 WebSocket Protocol Handshake\r\nConnection: Upgrade\r"))
+        s.add_packet(six.b("\n\r"))
+        s.add_packet(six.b("\n\x81\x02hi\x81"))
+        status, header, leftover = read_headers_buffered(s)
+        self.assertEqual(status, 101)
+        self.assertEqual(header, {"connection": "upgrade"})
+        self.assertEqual(leftover, six.b("\x81\x02hi\x81"))
+
+        s.add_packet(six.b("HTTP/1.1 200 OK\r\n\r\nfoo"))
+        self.assertRaises(ws.WebSocketException, read_headers, s)
+
+    def testConnectWithEarlyFrame(self):
+        sock = ws.WebSocket()
+        client, server = socket.socketpair()
+        frame = ws.ABNF.create_frame("early", ws.ABNF.OPCODE_TEXT)
+        frame.mask = 0
+        thread = threading.Thread(target=serve_handshake, args=(server, frame.format()))
+        thread.start()
+        try:
+            sock.connect("ws://tv:3000", socket=client)
+            thread.join()
+            self.assertTrue(sock.has_buffered_data())
+            self.assertEqual(sock.recv(), "early")
+            self.assertFalse(sock.has_buffered_data())
+        finally:
+            client.close()
+            server.close()
+
     def testSend(self):
         # TODO: add longer frame data
         sock = ws.WebSocket()
@@ -247,6 +387,54 @@ class WebSocketTest(unittest.TestCase):
 
         sock.send("x" * 127)
 
+    def testSendParts(self):
+        frame = ws.ABNF.create_frame("x" * 1000, ws.ABNF.OPCODE_TEXT)
+        frame.get_mask_key = create_mask_key
+        expected = frame.format()
+
+        sock = ws.WebSocket()
+        sock.set_mask_key(create_mask_key)
+        s = sock.sock = SendmsgSockMock(300)
+        self.assertEqual(sock.send("x" * 1000), len(expected))
+        self.assertEqual(six.b("").join(s.sent), expected)
+        self.assertEqual(s.calls, 4)
+
+    @unittest.skipUnless(hasattr(socket, "socketpair"), "socketpair() is not available")
+    def testSendLargeFrame(self):
+        sock = ws.WebSocket()
+        sock.set_mask_key(create_mask_key)
+        sock.sock, server = socket.socketpair()
+        payload = os.urandom(1 << 20)
+        received = []
+
+        def read():
+            while True:
+                data = server.recv(65536)
+                if not data:
+                    break
+                received.append(data)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            sock.send_binary(payload)
+            sock.sock.shutdown(socket.SHUT_WR)
+            reader.join()
+        finally:
+            sock.sock.close()
+            server.close()
+        data = six.b("").join(received)
+        self.assertEqual(data[:2], six.b("\x82\xff"))
+        self.assertEqual(ws.ABNF.mask("abcd", data[14:]), payload)
+
+    def testSendMany(self):
+        sock = ws.WebSocket()
+        sock.set_mask_key(create_mask_key)
+        s = sock.sock = SockMock()
+        sock.send_many(["Hello", "Hello"])
+        self.assertEqual(len(s.sent), 1)
+        self.assertEqual(s.sent[0], six.b("\x81\x85abcd)\x07\x0f\x08\x0e") * 2)
+
     def testRecv(self):
         # TODO: add longer frame data
         sock = ws.WebSocket()
@@ -294,6 +482,44 @@ class WebSocketTest(unittest.TestCase):
         with self.assertRaises(ws.WebSocketConnectionClosedException):
             data = sock.frame_buffer.recv_strict(1)
 
+    def testInternalRecvBuffer(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        big = os.urandom(2 * sock.frame_buffer._MAX_IDLE_BUFFER_SIZE)
+        s.add_packet(six.b("ab") + big[:100])
+        s.add_packet(big[100:] + six.b("cd"))
+        self.assertEqual(sock.frame_buffer.recv_strict(1), six.b("a"))
+        self.assertEqual(sock.frame_buffer.recv_strict(1), six.b("b"))
+        self.assertEqual(sock.frame_buffer.recv_strict(len(big)), big)
+        self.assertEqual(sock.frame_buffer.recv_strict(2), six.b("cd"))
+        # buffer is shrunk again after receiving a big chunk of data
+        self.assertEqual(len(sock.frame_buffer.recv_buffer), sock.frame_buffer._INITIAL_BUFFER_SIZE)
+
+    def testRecvStream(self):
+        sock = ws.WebSocket()
+        sock.sock, server = socket.socketpair()
+        messages = [u"m%d" % i for i in range(50)] + [u"y" * 300, u"x" * 70000, u"done"]
+        stream = six.b("")
+        for message in messages:
+            frame = ws.ABNF.create_frame(message, ws.ABNF.OPCODE_TEXT)
+            frame.mask = 0
+            stream += frame.format()
+        server.sendall(stream)
+        try:
+            for message in messages:
+                self.assertEqual(sock.recv(), message)
+        finally:
+            sock.sock.close()
+            server.close()
+
+    def testRecvInvalidFrame(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        # RSV1 set although no extension was negotiated
+        s.add_packet(six.b("\xc1\x02hi"))
+        with self.assertRaises(ws.WebSocketProtocolException):
+            sock.recv()
+
     def testRecvTimeout(self):
         sock = ws.WebSocket()
         s = sock.sock = SockMock()
@@ -363,6 +589,30 @@ class WebSocketTest(unittest.TestCase):
         sock.recv()
         self.assertEqual(sock.connected, False)
 
+    def testRecvWithSplitCodePoint(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        # OPCODE=TEXT, FIN=0, MSG="K\xc3" (first half of "\xc3\x9c")
+        s.add_packet(six.b("\x01\x02K\xc3"))
+        # OPCODE=CONT, FIN=1, MSG="\x9cche"
+        s.add_packet(six.b("\x80\x04\x9cche"))
+        data = sock.recv()
+        # Python 2 returns the UTF-8 encoded str
+        self.assertEqual(data, u"K\u00dcche" if six.PY3 else u"K\u00dcche".encode("utf-8"))
+
+    def testRecvInvalidUtf8Fragment(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        # OPCODE=TEXT, FIN=0, MSG="\xff" is rejected before the rest arrives
+        s.add_packet(six.b("\x01\x01\xff"))
+        with self.assertRaises(ws.WebSocketPayloadException):
+            sock.recv()
+
+        # OPCODE=TEXT, FIN=1, MSG ends within a code point
+        s.add_packet(six.b("\x81\x02K\xc3"))
+        with self.assertRaises(ws.WebSocketPayloadException):
+            sock.recv()
+
     def testRecvContFragmentation(self):
         sock = ws.WebSocket()
         s = sock.sock = SockMock()
@@ -561,6 +811,320 @@ class UtilsTest(unittest.TestCase):
         state = validate_utf8(six.b(''))
         self.assertEqual(state, True)
 
+    def testUtf8ValidatorImplementations(self):
+        cases = [
+            (six.b('\xf0\x90\x80\x80'), True),
+            (u"Ünïcödé – 総合".encode("utf-8"), True),
+            (six.b('\xed\x9f\xbf'), True),            # U+D7FF, last code point before surrogates
+            (six.b('\xed\xa0\x80'), False),           # encoded surrogate
+            (six.b('\xc0\xaf'), False),                # overlong encoding
+            (six.b('\xf4\x90\x80\x80'), False),      # beyond U+10FFFF
+            (six.b('abc\xce'), False),                  # truncated sequence
+            (six.b('\xff'), False),
+        ]
+        for data, valid in cases:
+            self.assertEqual(_utils._validate_utf8_dfa(data), valid, repr(data))
+            self.assertEqual(_utils._validate_utf8_decode(data), valid, repr(data))
+
+    def testUtf8IncrementalValidator(self):
+        validator = _utils.utf8_validator()
+        data = u"Ünïcödé – 総合 \U0001f600".encode("utf-8")
+        for i in range(len(data) + 1):
+            validator.reset()
+            self.assertTrue(validator.validate(data[:i], False))
+            self.assertTrue(validator.validate(data[i:], True))
+
+        validator.reset()
+        self.assertTrue(validator.validate(six.b("abc\xed"), False))
+        self.assertFalse(validator.validate(six.b("\xa0\x80"), True))
+
+        validator.reset()
+        self.assertTrue(validator.validate(six.b("abc\xce"), False))
+        self.assertFalse(validator.validate(six.b(""), True))
+
+        validator.reset()
+        self.assertFalse(validator.validate(six.b("\xc0\xaf"), False))
+
+
+class MaskTest(unittest.TestCase):
+    MASK_KEY = six.b("\x17\x98p\x84")
+
+    def testMask(self):
+        for length in (0, 1, 3, 4, 5, 125, 126, 4095, 4096, 4099, 70000):
+            data = os.urandom(length)
+            expected = mask_bytewise(self.MASK_KEY, data)
+            self.assertEqual(ws.ABNF.mask(self.MASK_KEY, data), expected)
+            self.assertEqual(_abnf._mask_words(self.MASK_KEY, data), expected)
+            # masking is its own inverse
+            self.assertEqual(ws.ABNF.mask(self.MASK_KEY, expected), data)
+
+    def testMaskText(self):
+        self.assertEqual(ws.ABNF.mask("abcd", "Hello"), six.b(")\x07\x0f\x08\x0e"))
+        self.assertEqual(ws.ABNF.mask("abcd", None), six.b(""))
+
+    @unittest.skipUnless(_abnf.numpy is not None, "numpy is not installed")
+    def testMaskNumpy(self):
+        for length in (4, 5, 4096, 4099, 70000):
+            data = os.urandom(length)
+            self.assertEqual(_abnf._mask_numpy(self.MASK_KEY, data),
+                             mask_bytewise(self.MASK_KEY, data))
+
+
+class DeflateTest(unittest.TestCase):
+    MESSAGE = json.dumps({"type": "response", "id": "3f2a1c_7", "payload": {"devices": [
+        {"id": "HDMI_%d" % i, "label": "HDMI %d" % i, "favorite": False,
+         "icon": "http://tv:3000/resources/inputs/hdmi.png"} for i in range(1, 5)]}})
+
+    def testDeflateParams(self):
+        get_params = _handshake._get_deflate_params
+        self.assertEqual(get_params({}, True), None)
+        self.assertEqual(get_params({"sec-websocket-extensions": "permessage-deflate"}, True), {})
+        self.assertEqual(get_params({"sec-websocket-extensions":
+                                     "permessage-deflate; server_no_context_takeover; client_max_window_bits=10"}, True),
+                         {"server_no_context_takeover": None, "client_max_window_bits": "10"})
+        for value in ("permessage-deflate; client_max_window_bits=16", "permessage-deflate; foo",
+                      "permessage-deflate; server_no_context_takeover=1", "x-webkit-deflate-frame",
+                      "permessage-deflate, permessage-deflate"):
+            self.assertRaises(ws.WebSocketException, get_params, {"sec-websocket-extensions": value}, True)
+        # not offered
+        self.assertRaises(ws.WebSocketException, get_params, {"sec-websocket-extensions": "permessage-deflate"}, False)
+
+    def testNotOffered(self):
+        sock, server, request = connect_pair()
+        server.close()
+        self.assertFalse(six.b("Sec-WebSocket-Extensions") in request)
+        self.assertEqual(sock.deflate, None)
+
+    def testNotAccepted(self):
+        sock, server, request = connect_pair(enable_compression=True)
+        try:
+            self.assertTrue(six.b("Sec-WebSocket-Extensions: permessage-deflate") in request)
+            self.assertEqual(sock.deflate, None)
+            sock.send(self.MESSAGE)
+            self.assertEqual(recv_all(server)[0], 0x81 if six.PY3 else "\x81")
+        finally:
+            server.close()
+
+    def testCompressedMessages(self):
+        sock, server, _ = connect_pair("permessage-deflate", enable_compression=True)
+        server_deflate = ws.permessage_deflate({})
+        try:
+            self.assertNotEqual(sock.deflate, None)
+            # context is kept between messages, second one is tiny
+            first = server_frame(self.MESSAGE, server_deflate)
+            second = server_frame(self.MESSAGE, server_deflate)
+            self.assertTrue(len(second) < len(first) < len(self.MESSAGE))
+            server.sendall(first + second + server_frame("short"))
+            self.assertEqual(sock.recv(), self.MESSAGE)
+            self.assertEqual(sock.recv(), self.MESSAGE)
+            self.assertEqual(sock.recv(), "short")
+
+            sock.send(self.MESSAGE)
+            sock.send(self.MESSAGE)
+            sock.ping("ping")
+            # read what the client sent with a WebSocket using the same parameters
+            receiver = ws.WebSocket()
+            receiver.sock = SockMock()
+            receiver.sock.add_packet(recv_all(server))
+            receiver.frame_buffer.deflate = receiver.cont_frame.deflate = ws.permessage_deflate({})
+            self.assertEqual(receiver.recv(), self.MESSAGE)
+            self.assertEqual(receiver.recv(), self.MESSAGE)
+            opcode, frame = receiver.recv_data_frame(True)
+            self.assertEqual((opcode, frame.rsv1, frame.data), (ws.ABNF.OPCODE_PING, 0, six.b("ping")))
+        finally:
+            server.close()
+
+    def testCompressedFragments(self):
+        sock, server, _ = connect_pair("permessage-deflate; server_no_context_takeover", enable_compression=True)
+        try:
+            compressed = server_frame(self.MESSAGE, ws.permessage_deflate({}))
+            # split the compressed payload (header is 4 bytes) into a text and a continuation frame
+            payload = compressed[4:]
+            half = len(payload) // 2
+            server.sendall(six.b("\x41") + six.int2byte(half) + payload[:half] +
+                           six.b("\x80") + six.int2byte(len(payload) - half) + payload[half:])
+            self.assertEqual(sock.recv(), self.MESSAGE)
+            # no context takeover: the same message compresses the same way again
+            server.sendall(compressed)
+            self.assertEqual(sock.recv(), self.MESSAGE)
+        finally:
+            server.close()
+
+    def testInvalidCompressedData(self):
+        sock, server, _ = connect_pair("permessage-deflate", enable_compression=True)
+        try:
+            server.sendall(six.b("\xc1\x03\xff\xff\xff"))
+            self.assertRaises(ws.WebSocketPayloadException, sock.recv)
+        finally:
+            server.close()
+
+    def testRsv1WithoutDeflate(self):
+        sock, server, _ = connect_pair()
+        try:
+            server.sendall(server_frame(self.MESSAGE, ws.permessage_deflate({})))
+            self.assertRaises(ws.WebSocketProtocolException, sock.recv)
+        finally:
+            server.close()
+
+
+class MaskKeyPoolTest(unittest.TestCase):
+    def testPool(self):
+        calls = []
+
+        def random_bytes(n):
+            calls.append(n)
+            return os.urandom(n)
+
+        pool = ws.mask_key_pool(pool_size=8, random_bytes=random_bytes)
+        k1, k2, k3 = pool(4), pool(4), pool(4)
+        self.assertEqual([len(k) for k in (k1, k2, k3)], [4, 4, 4])
+        self.assertEqual(calls, [8, 8])
+        self.assertEqual(len(pool(16)), 16)
+        self.assertEqual(calls, [8, 8, 16])
+
+    def testThreadSafe(self):
+        counter = [0]
+
+        def random_bytes(n):
+            # unique, recognizable keys
+            start = counter[0]
+            counter[0] += n // 4
+            return six.b("").join(struct.pack("!I", i) for i in range(start, start + n // 4))
+
+        pool = ws.mask_key_pool(pool_size=64, lock=threading.Lock(), random_bytes=random_bytes)
+        keys = []
+
+        def take():
+            for _ in range(1000):
+                keys.append(pool(4))
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(keys)), 4000)
+
+    def testWebSocketUsesPool(self):
+        self.assertTrue(isinstance(ws.WebSocket().get_mask_key, ws.mask_key_pool))
+        self.assertTrue(isinstance(ws.WebSocket(enable_multithread=True).get_mask_key.lock, type(threading.Lock())))
+        sock = ws.WebSocket()
+        sock.set_mask_key(create_mask_key)
+        self.assertEqual(sock.get_mask_key, create_mask_key)
+
+
+@unittest.skipUnless(TEST_BENCHMARK, "Benchmarks are disabled")
+class BenchmarkTest(unittest.TestCase):
+    def report(self, name, size, **timings):
+        print("\n%s (%d bytes): %s" % (name, size, ", ".join(
+            "%s %.1f us" % (k, v * 1e6) for k, v in sorted(timings.items()))))
+
+    def measure(self, func, number=200):
+        return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+    def testMask(self):
+        mask_key = os.urandom(4)
+        # ssap command, toast with base64 icon, big toast icon
+        for size in (200, 8 * 1024, 64 * 1024):
+            data = os.urandom(size)
+            timings = {
+                "bytewise": self.measure(lambda: mask_bytewise(mask_key, data), 5),
+                "words": self.measure(lambda: _abnf._mask_words(mask_key, data)),
+                "mask": self.measure(lambda: ws.ABNF.mask(mask_key, data)),
+            }
+            if _abnf.numpy is not None:
+                timings["numpy"] = self.measure(lambda: _abnf._mask_numpy(mask_key, data))
+            self.report("mask", size, **timings)
+
+
+    def testRecvFrames(self):
+        response = json.dumps({
+            "type": "response", "id": "3f2a1c_12",
+            "payload": {"status3D": {"status": True, "pattern": "side_side_half"}, "returnValue": True}})
+        frame = ws.ABNF.create_frame(response, ws.ABNF.OPCODE_TEXT)
+        frame.mask = 0
+        count = 2000
+        stream = frame.format() * count
+
+        def recv_frames():
+            sock = ws.WebSocket()
+            sock.sock = StreamSockMock(stream)
+            for _ in range(count):
+                sock.recv_frame()
+
+        seconds = self.measure(recv_frames, 5)
+        print("\nrecv_frame (%d bytes): %.0f frames/s" % (len(frame.format()), count / seconds))
+
+    def testReadHeaders(self):
+        path = os.path.join(os.path.dirname(__file__), "data/header01.txt")
+        with open(path, "rb") as f:
+            header = f.read()
+
+        def line_by_line(sock):
+            while recv_line(sock).strip():
+                pass
+
+        client, server = socket.socketpair()
+        try:
+            timings = {}
+            for name, read in (("recv_line", line_by_line), ("read_headers", read_headers)):
+                def roundtrip():
+                    server.sendall(header)
+                    read(client)
+                timings[name] = self.measure(roundtrip, 100)
+            self.report("read handshake response", len(header), **timings)
+        finally:
+            client.close()
+            server.close()
+
+    def testDeflateByteCount(self):
+        path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "media", "kodi.png")
+        with open(path, "rb") as f:
+            icon = base64.b64encode(f.read()).decode("utf-8")
+        toast = json.dumps({"id": "3f2a1c_3", "type": "request", "uri": "ssap://system.notifications/createToast",
+                            "payload": {"message": "Kodi connected", "iconData": icon, "iconExtension": "png"}})
+        inputs = json.dumps({"type": "response", "id": "3f2a1c_4", "payload": {"devices": [
+            {"id": "HDMI_%d" % i, "label": "HDMI %d" % i, "port": i, "appId": "com.webos.app.hdmi%d" % i,
+             "icon": "http://tv:3000/resources/inputs/hdmi.png", "modified": False, "connected": i == 1,
+             "favorite": False, "subList": [], "subCount": 0, "lastUniqueId": 0, "hdmiPlugIn": i == 1}
+            for i in range(1, 5)], "returnValue": True}})
+
+        for compression in (False, True):
+            sock, server, _ = connect_pair("permessage-deflate" if compression else None,
+                                           enable_compression=compression)
+            try:
+                deflate = ws.permessage_deflate({}) if compression else None
+                sent = sock.send(toast)
+                sent += sock.send(toast)
+                response = server_frame(inputs, deflate) + server_frame(inputs, deflate)
+                server.sendall(response)
+                sock.recv()
+                sock.recv()
+            finally:
+                server.close()
+            print("\npermessage-deflate %s: 2 toasts %d bytes sent, 2 input lists %d bytes received" % (
+                "on" if compression else "off", sent, len(response)))
+
+    def testUtf8Validation(self):
+        # typical ssap response and a large channel list
+        response = json.dumps({
+            "type": "response", "id": "3f2a1c_12",
+            "payload": {"status3D": {"status": True, "pattern": "side_side_half"}, "returnValue": True}})
+        channels = json.dumps({
+            "type": "response", "id": "3f2a1c_13",
+            "payload": {"channelList": [
+                {"channelId": "0_%d_%d_0_0_1_0" % (i, i), "channelNumber": str(i),
+                 "channelName": u"Kanal %d – Télé 総合" % i, "channelMode": "Satellite"}
+                for i in range(2000)]}}, ensure_ascii=False)
+        for payload in (response, channels):
+            data = payload.encode("utf-8")
+            number = 500 if len(data) < 1024 else 5
+            self.report("validate_utf8", len(data),
+                        dfa=self.measure(lambda: _utils._validate_utf8_dfa(data), number),
+                        decode=self.measure(lambda: _utils._validate_utf8_decode(data), number),
+                        validate_utf8=self.measure(lambda: validate_utf8(data), number))
+
+
 class ProxyInfoTest(unittest.TestCase):
     def setUp(self):
         self.http_proxy = os.environ.get("http_proxy", None)
@@ -1,3 +1,4 @@
+import json
 import xbmcaddon
 __addon__ = xbmcaddon.Addon()
 
@@ -10,3 +11,34 @@ class KodiKeyManager(object):
         # type: (str, str) -> ()
         if key != __addon__.getSetting('lg_pairing_key'):
             __addon__.setSetting('lg_pairing_key', key)
+
+    def load_timings(self, host):
+        # type: (str) -> dict
+        try:
+            return json.loads(__addon__.getSetting('lg_timings')).get(host)
+        except:
+            return None
+
+    def save_timings(self, host, timings):
+        # type: (str, dict) -> ()
+        # hidden setting with the timings of all TVs by host
+        try:
+            all_timings = json.loads(__addon__.getSetting('lg_timings'))
+        except:
+            all_timings = {}
+        if not isinstance(all_timings, dict):
+            all_timings = {}
+        all_timings[host] = timings
+        __addon__.setSetting('lg_timings', json.dumps(all_timings))
+
+    def load_discovered(self):
+        # type: () -> list
+        try:
+            return json.loads(__addon__.getSetting('lg_discovered'))
+        except:
+            return None
+
+    def save_discovered(self, tvs):
+        # type: (list) -> ()
+        # hidden setting with the TVs found before
+        __addon__.setSetting('lg_discovered', json.dumps(tvs))
@@ -25,6 +25,11 @@ def dialogOSD(message, header=__addonname__):
 def dialogYesNo(message, header=__addonname__):
     return OSD.yesno(header.encode('utf-8'), message.encode('utf-8'))
 
+def dialogProgress(message, header=__addonname__):
+    dialog = xbmcgui.DialogProgress()
+    dialog.create(header.encode('utf-8'), message.encode('utf-8'))
+    return dialog
+
 def notifyLog(message, level=xbmc.LOGNOTICE):
     xbmc.log('[%s %s] %s' % (__addonID__, __version__, message.encode('utf-8')), level)
 
@@ -2,6 +2,7 @@ import xbmc, xbmcaddon
 import os
 import sys
 from resources.lib import tools
+from resources.lib.keymanager import KodiKeyManager
 
 from resources.lib.LGTV.lgtv import LGTV
 
@@ -19,7 +20,22 @@ __IconDefault__ = xbmc.translatePath(os.path.join( __path__,'resources', 'media'
 def main():
     tools.notifyLog("Scanning for LG Smart TV Devices running WebOS...", level=xbmc.LOGDEBUG)
 
-    ip = LGTV(log=tools.simpleLog).discover_ip(tries=5)
+    dialog = tools.dialogProgress(__LS__(30052))
+
+    def progress(done, total):
+        # only called while sweeping the network, after SSDP found nothing
+        dialog.update(100 * done // total, __LS__(30053).encode('utf-8'))
+        return dialog.iscanceled()
+
+    try:
+        ip = LGTV(KodiKeyManager(), log=tools.simpleLog).discover_ip(tries=5, progress=progress)
+    finally:
+        cancelled = dialog.iscanceled()
+        dialog.close()
+
+    if cancelled:
+        tools.notifyLog("Scan cancelled.")
+        return
 
     if ip is None:
         tools.notifyLog("No LG Smart TV found.")